@@ -0,0 +1,62 @@
+"""Paginated Tapis file listings."""
+import logging
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _list_page(client, system, path, offset, limit):
+    return client.files.list(systemId=system,
+                             filePath=urllib.parse.quote(path),
+                             offset=offset,
+                             limit=limit)
+
+
+def iterate_listing(client, system, path, offset=0, page_size=None, prefetch=True):
+    """Iterate over every entry of a Tapis directory listing.
+
+    Each page is requested once. While the entries of page N are being
+    consumed, page N+1 is already requested in a background thread, so a
+    caller doing work per entry (e.g. a transfer) does not wait on the
+    listing between pages.
+
+    .. note::
+        Tapis lists the directory itself as ``.`` at offset 0. Pass
+        ``offset=1`` to skip it.
+
+    :param client: Tapis client.
+    :param str system: system id.
+    :param str path: directory path.
+    :param int offset: offset of the first entry.
+    :param int page_size: entries per request. Defaults to
+        ``settings.AGAVE_LISTING_PAGE_SIZE``.
+    :param bool prefetch: request the next page before the current one has
+        been consumed.
+
+    :rtype: generator of ``agavepy.agave.AttrDict``
+    """
+    page_size = page_size or getattr(settings, 'AGAVE_LISTING_PAGE_SIZE', 100)
+    if not prefetch:
+        while True:
+            page = _list_page(client, system, path, offset, page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            offset += page_size
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        page = _list_page(client, system, path, offset, page_size)
+        while True:
+            next_page = None
+            if len(page) == page_size:
+                offset += page_size
+                next_page = executor.submit(_list_page, client, system, path, offset, page_size)
+            yield from page
+            if next_page is None:
+                return
+            page = next_page.result()
+    finally:
+        executor.shutdown(wait=False)
@@ -0,0 +1,47 @@
+import json
+import threading
+from mock import MagicMock, call
+from django.test import TestCase, override_settings
+from designsafe.apps.api.agave.listing import iterate_listing
+
+
+class TestIterateListing(TestCase):
+
+    def setUp(self):
+        with open('designsafe/apps/api/fixtures/agave_agavefs_listing.json') as f:
+            fixture = json.load(f)
+        # 25 entries shaped like the fixture.
+        self.entries = [dict(fixture[i % len(fixture)], name='file{}'.format(i)) for i in range(25)]
+        self.client = MagicMock()
+        self.client.files.list.side_effect = lambda systemId, filePath, offset, limit: \
+            self.entries[offset:offset + limit]
+
+    def test_requests_each_page_once(self):
+        for prefetch in (True, False):
+            self.client.files.list.reset_mock()
+            listing = list(iterate_listing(self.client, 'test.system', 'ds_user/agavefs',
+                                           page_size=10, prefetch=prefetch))
+            self.assertEqual([f['name'] for f in listing], [f['name'] for f in self.entries])
+            self.assertEqual(self.client.files.list.call_args_list, [
+                call(systemId='test.system', filePath='ds_user/agavefs', offset=offset, limit=10)
+                for offset in (0, 10, 20)])
+
+    def test_prefetches_next_page(self):
+        requested = threading.Event()
+
+        def list_page(systemId, filePath, offset, limit):
+            if offset == 10:
+                requested.set()
+            return self.entries[offset:offset + limit]
+        self.client.files.list.side_effect = list_page
+
+        listing = iterate_listing(self.client, 'test.system', 'ds_user/agavefs', page_size=10)
+        next(listing)
+        # The second page is requested before the first one is consumed.
+        self.assertTrue(requested.wait(5))
+
+    @override_settings(AGAVE_LISTING_PAGE_SIZE=25)
+    def test_default_page_size(self):
+        listing = list(iterate_listing(self.client, 'test.system', 'ds_user/agavefs', offset=1))
+        self.assertEqual(len(listing), 24)
+        self.assertEqual(self.client.files.list.call_count, 1)
@@ -8,8 +8,10 @@ import logging
 import json
 from elasticsearch_dsl import Q
 import magic
+from designsafe.apps.api.agave import listing as agave_listing
 from designsafe.apps.data.models.elasticsearch import IndexedFile
-from designsafe.apps.data.tasks import agave_indexer
+from designsafe.libs.elasticsearch.pagination import paginate, next_cursor
+from designsafe.apps.data.tasks import schedule_agave_indexer
 
 logger = logging.getLogger(__name__)
 
@@ -67,28 +69,24 @@ def detail(client, system, path, *args, **kwargs):
     return {**dict(listing[0]), 'uuid': qs_json['associationIds']}
 
 
-def iterate_listing(client, system, path, limit=100):
+def iterate_listing(client, system, path, limit=None):
     """Iterate over a filesystem level yielding an attrdict for each file/folder
-        on the level.
+        on the level. The next page is requested while the current one is
+        being consumed.
         :param str client: an Agave client
         :param str system: system
         :param str path: path to walk
-        :param int limit: Number of docs to retrieve per API call
+        :param int limit: Number of docs to retrieve per API call. Defaults to
+            settings.AGAVE_LISTING_PAGE_SIZE
 
         :rtype agavepy.agave.AttrDict
     """
-    offset = 0
+    # Offset 1 skips the '.' entry for the directory itself.
+    for f in agave_listing.iterate_listing(client, system, path, offset=1, page_size=limit):
+        yield dict(f)
 
-    while True:
-        page = listing(client, system, path, offset, limit)['listing']
-        yield from page
-        offset += limit
-        if len(page) != limit:
-            # Break out of the loop if the listing is exhausted.
-            break
 
-
-def search(client, system, path, offset=0, limit=100, query_string='', **kwargs):
+def search(client, system, path, offset=0, limit=100, query_string='', cursor=None, **kwargs):
     """
     Perform a search for files using a query string.
 
@@ -104,6 +102,9 @@ def search(client, system, path, offset=0, limit=100, query_string='', **kwargs)
         Number of search results to return
     query_string: str
         Query string to pass to Elasticsearch
+    cursor: str
+        nextCursor returned with the previous page. Takes precedence over
+        offset.
 
     Returns
     -------
@@ -120,19 +121,16 @@ def search(client, system, path, offset=0, limit=100, query_string='', **kwargs)
                         "name._exact, name._pattern"],
                     default_operator='and')
 
-    if not path.startswith('/'):
-        path = '/' + path
-    if not path.endswith('/'):
-        path = path + '/'
     search = IndexedFile.search()
     search = search.query(ngram_query | match_query)
-    search = search.filter('prefix', **{'path._exact': path})
+    search = search.filter(IndexedFile.subtree_query(path, include_root=False))
     search = search.filter('term', **{'system._exact': system})
-    search = search.extra(from_=int(offset), size=int(limit))
+    search = search.sort('_score', 'path._exact')
+    search = paginate(search, offset, limit, cursor)
     res = search.execute()
     hits = [hit.to_dict() for hit in res]
 
-    return {'listing': hits, 'reachedEnd': len(hits) < int(limit)}
+    return {'listing': hits, 'reachedEnd': len(hits) < int(limit), 'nextCursor': next_cursor(res, limit)}
 
 
 def download(client, system, path, href, force=True, max_uses=3, lifetime=600, *args, **kwargs):
@@ -204,10 +202,7 @@ def mkdir(client, system, path, dir_name):
                                  filePath=urllib.parse.quote(path),
                                  body=body)
 
-    agave_indexer.apply_async(kwargs={'systemId': system,
-                                      'filePath': path,
-                                      'recurse': False},
-                              queue='indexing')
+    schedule_agave_indexer(system, path, recurse=False)
     return dict(result)
 
 
@@ -282,17 +277,10 @@ def move(client, src_system, src_path, dest_system, dest_path, file_name=None):
                             filePath=urllib.parse.quote(src_path))
 
     if os.path.dirname(src_path) != dest_path or src_path != dest_path:
-        agave_indexer.apply_async(kwargs={'systemId': src_system,
-                                          'filePath': os.path.dirname(src_path),
-                                          'recurse': False},
-                                  queue='indexing')
-    agave_indexer.apply_async(kwargs={'systemId': dest_system,
-                                      'filePath': os.path.dirname(full_dest_path),
-                                      'recurse': False}, routing_key='indexing')
+        schedule_agave_indexer(src_system, os.path.dirname(src_path), recurse=False)
+    schedule_agave_indexer(dest_system, os.path.dirname(full_dest_path), recurse=False)
     if move_result['nativeFormat'] == 'dir':
-        agave_indexer.apply_async(kwargs={'systemId': dest_system,
-                                          'filePath': full_dest_path, 'recurse': True},
-                                  queue='indexing')
+        schedule_agave_indexer(dest_system, full_dest_path, recurse=True)
 
     return move_result
 
@@ -358,9 +346,9 @@ def copy(client, src_system, src_path, dest_system, dest_path, file_name=None, *
             urlToIngest=src_url
         )
 
-    agave_indexer.apply_async(kwargs={'username': 'ds_admin', 'systemId': dest_system, 'filePath': os.path.dirname(full_dest_path), 'recurse': False}, queue='indexing')
+    schedule_agave_indexer(dest_system, os.path.dirname(full_dest_path), recurse=False, username='ds_admin')
     if copy_result['nativeFormat'] == 'dir':
-        agave_indexer.apply_async(kwargs={'systemId': dest_system, 'filePath': full_dest_path, 'recurse': True}, queue='indexing')
+        schedule_agave_indexer(dest_system, full_dest_path, recurse=True)
 
     return dict(copy_result)
 
@@ -393,16 +381,8 @@ def rename(client, system, path, new_name):
     body = {'action': 'rename', 'path': new_name}
     rename_result = client.files.manage(systemId=system, filePath=path, body=body)
 
-    agave_indexer.apply_async(kwargs={'systemId': system,
-                                      'filePath': os.path.dirname(path),
-                                      'recurse': False},
-                              queue='indexing'
-                              )
-    rename_result['nativeFormat'] == 'dir' and agave_indexer.apply_async(kwargs={'systemId': system,
-                                                                              'filePath': rename_result['path'],
-                                                                              'recurse': True},
-                                                                      queue='indexing'
-                                                                      )
+    schedule_agave_indexer(system, os.path.dirname(path), recurse=False)
+    rename_result['nativeFormat'] == 'dir' and schedule_agave_indexer(system, rename_result['path'], recurse=True)
 
     return dict(rename_result)
 
@@ -494,11 +474,7 @@ def upload(client, system, path, uploaded_file, webkit_relative_path=None, *args
                                    fileName=str(upload_name),
                                    fileToUpload=uploaded_file)
 
-    agave_indexer.apply_async(kwargs={'systemId': system,
-                                      'filePath': path,
-                                      'recurse': False},
-                              queue='indexing'
-                              )
+    schedule_agave_indexer(system, path, recurse=False)
 
     return dict(resp)
 
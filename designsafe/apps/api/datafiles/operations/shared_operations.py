@@ -9,6 +9,7 @@ import json
 from elasticsearch_dsl import Q
 import magic
 from designsafe.apps.data.models.elasticsearch import IndexedFile
+from designsafe.libs.elasticsearch.pagination import paginate, next_cursor
 from designsafe.apps.api.datafiles.operations.agave_operations import preview, copy, download, download_bytes, listing as agave_listing
 # from portal.libs.elasticsearch.indexes import IndexedFile
 # from portal.apps.search.tasks import agave_indexer, agave_listing_indexer
@@ -16,7 +17,7 @@ from designsafe.apps.api.datafiles.operations.agave_operations import preview, c
 logger = logging.getLogger(__name__)
 
 
-def listing(client, system, path, username, offset=0, limit=100, *args, **kwargs):
+def listing(client, system, path, username, offset=0, limit=100, cursor=None, *args, **kwargs):
     """
     Perform a Tapis file listing
 
@@ -32,6 +33,9 @@ def listing(client, system, path, username, offset=0, limit=100, *args, **kwargs
         Offset for pagination.
     limit: int
         Number of results to return.
+    cursor: str
+        nextCursor returned with the previous page. Takes precedence over
+        offset when listing shared data.
 
     Returns
     -------
@@ -42,28 +46,23 @@ def listing(client, system, path, username, offset=0, limit=100, *args, **kwargs
     if path:
         return agave_listing(client, system, path, offset, limit)
 
-    username_q = Q('term', **{'permissions.username': username})
-    world_q = Q('term', **{'permissions.username': 'WORLD'})
-    pems_filter = Q('bool', should=[username_q, world_q])
-
-    nested_filter = Q('nested')
-    nested_filter.path = 'permissions'
-    nested_filter.query = pems_filter
+    pems_filter = IndexedFile.pems_filter(username)
 
     file_path = '/'
-    home_filter = Q('prefix', **{'path._exact': '/' + username})
+    home_filter = IndexedFile.subtree_query(username)
     system_filter = Q('term', **{'system._exact': 'designsafe.storage.default'})
-    query = Q('bool', must_not=home_filter, filter=[nested_filter, system_filter])
+    query = Q('bool', must_not=home_filter, filter=[pems_filter, system_filter])
 
-    search = IndexedFile.search().filter(query).sort('name._exact').extra(from_=int(offset), size=int(limit))
+    search = IndexedFile.search().filter(query).sort('name._exact', 'path._exact')
+    search = paginate(search, offset, limit, cursor)
     res = search.execute()
 
     hits = [hit.to_dict() for hit in res]
 
-    return {'listing': hits, 'reachedEnd': len(hits) < int(limit)}
+    return {'listing': hits, 'reachedEnd': len(hits) < int(limit), 'nextCursor': next_cursor(res, limit)}
 
 
-def search(client, system, path, username, offset=0, limit=100, query_string='', **kwargs):
+def search(client, system, path, username, offset=0, limit=100, query_string='', cursor=None, **kwargs):
     """
     Perform a search for files using a query string.
 
@@ -79,6 +78,9 @@ def search(client, system, path, username, offset=0, limit=100, query_string='',
         Number of search results to return
     query_string: str
         Query string to pass to Elasticsearch
+    cursor: str
+        nextCursor returned with the previous page. Takes precedence over
+        offset.
 
     Returns
     -------
@@ -86,14 +88,6 @@ def search(client, system, path, username, offset=0, limit=100, query_string='',
         List of dicts containing file metadata from Elasticsearch
 
     """
-    # Add leading slash to match agave formatting.
-    if not path.startswith('/'):
-        path = '/' + path
-    # Add trailing slash so that prefix search in a folder doesn't return that folder.
-    if not path.endswith('/'):
-        path = path + '/'
-
-
     ngram_query = Q("query_string", query=query_string,
                     fields=["name"],
                     minimum_should_match='80%',
@@ -104,28 +98,23 @@ def search(client, system, path, username, offset=0, limit=100, query_string='',
                     default_operator='and')
 
 
-    username_q = Q('term', **{'permissions.username': username})
-    world_q = Q('term', **{'permissions.username': 'WORLD'})
-    pems_filter = Q('bool', should=[username_q, world_q])
-
-    nested_filter = Q('nested')
-    nested_filter.path = 'permissions'
-    nested_filter.query = pems_filter
+    pems_filter = IndexedFile.pems_filter(username)
 
-    home_filter = Q('prefix', **{'path._exact': '/' + username})
+    home_filter = IndexedFile.subtree_query(username)
     system_filter = Q('term', **{'system._exact': 'designsafe.storage.default'})
-    query = Q('bool', must_not=home_filter, filter=[nested_filter, system_filter])
+    query = Q('bool', must_not=home_filter, filter=[pems_filter, system_filter])
 
     search = IndexedFile.search().filter(query)
     search = search.query(ngram_query | match_query)
-    search = search.filter('prefix', **{'path._exact': path})
-    
+    # Match everything below the folder, but not the folder itself.
+    search = search.filter(IndexedFile.subtree_query(path, include_root=False))
+    search = search.sort('_score', 'path._exact')
 
-    search = search.extra(from_=int(offset), size=int(limit))
+    search = paginate(search, offset, limit, cursor)
     res = search.execute()
     hits = [hit.to_dict() for hit in res]
 
-    return {'listing': hits, 'reachedEnd': len(hits) < int(limit)}
+    return {'listing': hits, 'reachedEnd': len(hits) < int(limit), 'nextCursor': next_cursor(res, limit)}
 
 
 
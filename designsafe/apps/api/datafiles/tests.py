@@ -0,0 +1,85 @@
+from mock import patch, MagicMock
+import json
+from django.test import TestCase, RequestFactory, override_settings
+from django.contrib.auth.models import AnonymousUser
+from designsafe.apps.api.datafiles.views import SuggestFilesView
+
+
+@override_settings(AGAVE_STORAGE_SYSTEM='designsafe.storage.default')
+class TestSuggestFilesView(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.patch_suggest = patch('designsafe.apps.api.datafiles.views.IndexedFile.suggest')
+        self.mock_suggest = self.patch_suggest.start()
+        self.addCleanup(self.patch_suggest.stop)
+        self.mock_search = self.mock_suggest.return_value
+        hit = MagicMock()
+        hit.to_dict.return_value = {'name': 'data.csv', 'path': '/user/data.csv',
+                                    'system': 'designsafe.storage.default', 'type': 'file'}
+        self.mock_search.filter.return_value.execute.return_value = [hit]
+        self.mock_search.execute.return_value = [hit]
+
+    def _get(self, user, system, path='/', **params):
+        request = self.factory.get('/api/datafiles/suggest/', params)
+        request.user = user
+        request.session = MagicMock()
+        return SuggestFilesView.as_view()(request, system=system, path=path)
+
+    def test_home_directory_is_not_filtered(self):
+        user = MagicMock(is_authenticated=True, username='user')
+        response = self._get(user, 'designsafe.storage.default', '/user/data', q='dat', limit='500')
+        self.mock_suggest.assert_called_with('designsafe.storage.default', '/user/data', 'dat', 50)
+        self.assertEqual(self.mock_search.filter.call_count, 0)
+        self.assertEqual(json.loads(response.content)['suggestions'][0]['name'], 'data.csv')
+
+    def test_root_is_scoped_to_home_directory(self):
+        user = MagicMock(is_authenticated=True, username='user')
+        self._get(user, 'designsafe.storage.default', '/', q='dat')
+        self.mock_suggest.assert_called_with('designsafe.storage.default', '/user', 'dat', 10)
+        self.assertEqual(self.mock_search.filter.call_count, 0)
+
+    def test_other_directories_are_filtered_on_readers(self):
+        user = MagicMock(is_authenticated=True, username='user')
+        with patch('designsafe.apps.api.datafiles.views.IndexedFile.pems_filter') as mock_pems:
+            self._get(user, 'designsafe.storage.default', '/username2', q='dat')
+        mock_pems.assert_called_with('user')
+        self.mock_search.filter.assert_called_with(mock_pems.return_value)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    @patch('designsafe.apps.projects.models.elasticsearch.IndexedProject.search')
+    def test_project_members_only(self, mock_project_search):
+        from django.core.cache import cache
+        self.addCleanup(cache.clear)
+        mock_count = mock_project_search.return_value.filter.return_value.filter.return_value.count
+        user = MagicMock(is_authenticated=True, username='user')
+
+        mock_count.return_value = 1
+        response = self._get(user, 'project-1234', '/', q='dat')
+        self.assertEqual(response.status_code, 200)
+        self._get(user, 'project-1234', '/', q='data')
+        self.assertEqual(mock_count.call_count, 1)
+        self.assertEqual(self.mock_search.filter.call_count, 0)
+
+        mock_count.return_value = 0
+        response = self._get(user, 'project-5678', '/', q='dat')
+        self.assertEqual(response.status_code, 403)
+
+    def test_other_systems_are_refused(self):
+        user = MagicMock(is_authenticated=True, username='user')
+        response = self._get(user, 'other.system', '/', q='dat')
+        self.assertEqual(response.status_code, 403)
+
+    def test_public_system_is_not_filtered(self):
+        response = self._get(AnonymousUser(), 'designsafe.storage.community', q='dat')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.mock_search.filter.call_count, 0)
+
+    def test_private_system_needs_login(self):
+        response = self._get(AnonymousUser(), 'designsafe.storage.default', q='dat')
+        self.assertEqual(response.status_code, 403)
+
+    def test_empty_prefix(self):
+        response = self._get(AnonymousUser(), 'designsafe.storage.community', q=' ')
+        self.assertEqual(json.loads(response.content), {'suggestions': []})
+        self.assertEqual(self.mock_suggest.call_count, 0)
@@ -1,9 +1,14 @@
 from django.conf.urls import url
-from designsafe.apps.api.datafiles.views import DataFilesView, TransferFilesView
+from designsafe.apps.api.datafiles.views import DataFilesView, TransferFilesView, SuggestFilesView
 from django.http import JsonResponse
 
 urlpatterns = [
     url(r'^transfer/(?P<format>[\w.-]+)/$', TransferFilesView.as_view(), name='file_transfer'),
+    # File name typeahead:
+    #
+    #     GET     /suggest/<system_id>/<file_path>/?q=<typed text>
+    url(r'^suggest/(?P<system>[\w.-]+)/(?P<path>[ \S]+)/$', SuggestFilesView.as_view(), name='file_suggest'),
+    url(r'^suggest/(?P<system>[\w.-]+)/$', SuggestFilesView.as_view(), name='file_suggest'),
     # Browsing:
     #
     #     GET     /listing/<file_mgr_name>/<system_id>/<file_path>/
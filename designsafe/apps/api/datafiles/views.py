@@ -3,6 +3,8 @@ from django.core.urlresolvers import reverse
 from django.http import JsonResponse, HttpResponseForbidden, FileResponse
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from elasticsearch_dsl import Q
 from requests.exceptions import HTTPError
 from boxsdk.exception import BoxOAuthException
 from dropbox.exceptions import AuthError as DropboxAuthError
@@ -13,11 +15,15 @@ from designsafe.apps.api.exceptions import ApiException
 from designsafe.apps.api.datafiles.handlers import datafiles_get_handler, datafiles_post_handler, datafiles_put_handler, resource_unconnected_handler, resource_expired_handler
 from designsafe.apps.api.datafiles.operations.transfer_operations import transfer, transfer_folder
 from designsafe.apps.api.datafiles.notifications import notify
+from designsafe.apps.data.models.elasticsearch import IndexedFile
 # Create your views here.
 
 logger = logging.getLogger(__name__)
 metrics = logging.getLogger('metrics')
 
+SUGGEST_MAX_LIMIT = 50
+SUGGEST_MEMBERSHIP_TTL = 60
+
 
 def get_client(user, api):
     client_mappings = {
@@ -154,3 +160,65 @@ class TransferFilesView(BaseApiView):
             notify(request.user.username, 'transfer', 'Copy operation has failed.', 'ERROR', {})
             logger.info(exc)
             raise exc
+
+
+def _is_project_member(username, system):
+    """Whether a user is the PI, a co-PI or a team member of the project
+    behind a ``project-<uuid>`` system. Answers are cached briefly since
+    the typeahead asks on every keystroke."""
+    from designsafe.apps.projects.models.elasticsearch import IndexedProject
+    key = 'datafiles_suggest:member:{}:{}'.format(system, username)
+    member = cache.get(key)
+    if member is None:
+        search = IndexedProject.search()
+        search = search.filter('term', **{'uuid._exact': system.replace('project-', '', 1)})
+        search = search.filter(Q('term', **{'value.pi._exact': username}) |
+                               Q('term', **{'value.coPis._exact': username}) |
+                               Q('term', **{'value.teamMembers._exact': username}))
+        member = search.count() > 0
+        cache.set(key, member, SUGGEST_MEMBERSHIP_TTL)
+    return member
+
+
+class SuggestFilesView(BaseApiView):
+    """
+    File name typeahead for the data depot search box. Names are looked up
+    in the files index only, and scoped like the data depot searches:
+
+     - on ``settings.DATAFILES_SUGGEST_PUBLIC_SYSTEMS``, every file;
+     - on the default storage system, the user's home directory, or the
+       files shared with the user elsewhere;
+     - on ``project-<uuid>`` systems, every file for project members.
+
+        GET /suggest/<system_id>/<file_path>/?q=<typed text>&limit=<n>
+    """
+
+    def get(self, request, system, path='/'):
+        prefix = request.GET.get('q', '').strip()
+        try:
+            limit = min(max(int(request.GET.get('limit', 10)), 1), SUGGEST_MAX_LIMIT)
+        except ValueError:
+            raise ApiException(status=400, message='Invalid limit.')
+        if not prefix:
+            return JsonResponse({'suggestions': []})
+
+        path = '/' + path.strip('/')
+        pems_filter = None
+        if system not in settings.DATAFILES_SUGGEST_PUBLIC_SYSTEMS:
+            if not request.user.is_authenticated:
+                return JsonResponse({'message': 'Please log in to access this feature.'}, status=403)
+            username = request.user.username
+            home = '/' + username
+            if system == settings.AGAVE_STORAGE_SYSTEM:
+                if path == '/':
+                    path = home
+                elif path != home and not path.startswith(home + '/'):
+                    pems_filter = IndexedFile.pems_filter(username)
+            elif not system.startswith('project-') or not _is_project_member(username, system):
+                return HttpResponseForbidden()
+
+        search = IndexedFile.suggest(system, path, prefix, limit)
+        if pems_filter is not None:
+            search = search.filter(pems_filter)
+        res = search.execute()
+        return JsonResponse({'suggestions': [hit.to_dict() for hit in res]})
@@ -1,7 +1,8 @@
 from designsafe.apps.data.models.elasticsearch import IndexedPublication, IndexedPublicationLegacy
 from designsafe.apps.api.publications import search_utils
 from designsafe.libs.elasticsearch.exceptions import DocumentNotFound
-from django.contrib.auth import get_user_model
+from designsafe.libs.elasticsearch.pagination import paginate, next_cursor
+from designsafe.apps.api.users.utils import display_names
 from elasticsearch_dsl import Q
 import datetime
 import json
@@ -11,22 +12,23 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-def _get_user_by_username(hit, username):
+def _pi_names(hits):
+    """Display names of the PIs of hits without a users list, in one query."""
+    return display_names(h.project.value.pi for h in hits if not getattr(h, 'users', []))
+
+
+def _get_user_by_username(hit, username, names):
     users = getattr(hit, 'users', [])
     if not users:
-        try:
-            user_obj = get_user_model().objects.get(username=username)
-            return "{}, {}".format(user_obj.first_name, user_obj.last_name)
-        except:
-            return username
+        return names.get(username, username)
     user = next(_user for _user in users if _user['username'] == username)
     return "{}, {}".format(user['last_name'], user['first_name'])
 
 
-def listing(offset=0, limit=100, limit_fields=True, *args):
+def listing(offset=0, limit=100, limit_fields=True, cursor=None, *args):
     pub_query = IndexedPublication.search()
     pub_query = pub_query.filter(Q('term', status='published'))
-    pub_query = pub_query.extra(from_=offset, size=limit)
+    pub_query = paginate(pub_query, offset, limit, cursor)
     if limit_fields:
         pub_query = pub_query.source(includes=['project.value.title',
                                             'project.value.pi',
@@ -38,21 +40,23 @@ def listing(offset=0, limit=100, limit_fields=True, *args):
                                             'users',
                                             'system'])
     pub_query = pub_query.sort(
-        {'created': {'order': 'desc'}}
+        {'created': {'order': 'desc'}},
+        'projectId._exact'
     )
 
     res = pub_query.execute()
 
+    names = _pi_names(res.hits)
     hits = list(map(lambda h: {
         **h.to_dict(),
-        'pi': _get_user_by_username(h, h.project.value.pi)
+        'pi': _get_user_by_username(h, h.project.value.pi, names)
     },
         res.hits))
 
-    return {'listing': hits}
+    return {'listing': hits, 'nextCursor': next_cursor(res, limit)}
 
 
-def search(offset=0, limit=100, query_string='', limit_fields=True, *args):
+def search(offset=0, limit=100, query_string='', limit_fields=True, cursor=None, *args):
     query_dict = json.loads(urllib.parse.unquote(query_string))
 
     type_filters = query_dict['typeFilters']
@@ -116,7 +120,7 @@ def search(offset=0, limit=100, query_string='', limit_fields=True, *args):
 
     search = search.filter('bool', must=query_filters)
     search = search.filter(Q('term', status='published'))
-    search = search.extra(from_=offset, size=limit)
+    search = paginate(search, offset, limit, cursor)
     if limit_fields:
         search = search.source(includes=['project.value.title',
                                         'project.value.pi',
@@ -129,15 +133,17 @@ def search(offset=0, limit=100, query_string='', limit_fields=True, *args):
                                         'system'])
 
     search = search.sort(
-        {'created': {'order': 'desc'}})
+        {'created': {'order': 'desc'}},
+        'projectId._exact')
     res = search.execute()
+    names = _pi_names(res.hits)
     hits = list(map(lambda h: {
         **h.to_dict(),
-        'pi': _get_user_by_username(h, h.project.value.pi)
+        'pi': _get_user_by_username(h, h.project.value.pi, names)
     },
         res.hits))
 
-    return {'listing': hits}
+    return {'listing': hits, 'nextCursor': next_cursor(res, limit)}
 
 
 def neeslisting(offset=0, limit=100, limit_fields=True, *args):
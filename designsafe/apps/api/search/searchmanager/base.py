@@ -1,4 +1,5 @@
 from elasticsearch import TransportError, ConnectionTimeout
+from designsafe.libs.elasticsearch.pagination import scan
 
 class BaseSearchManager(object):
     """ Wraps elastic search result object
@@ -48,26 +49,13 @@ class BaseSearchManager(object):
 
         return res
 
-    def all(self):
-        res = self._search.execute()
-        if res.success() and res.hits.total.value:
-            res_offset = 0
-            page_size = len(res)
-            res_limit = page_size
-            while res_limit <= res.hits.total.value:
-                for doc in self._search[res_offset:res_limit]:
-                    yield self._doc_class(doc)
-
-                res_limit += page_size
-                res_offset += page_size
-
-            res_limit = res.hits.total.value - \
-                ((res.hits.total.value / page_size) * page_size)
-            if res_limit > 0:
-                res_offset -= page_size
-                res_limit += res_offset
-                for doc in self._search[res_offset:res_limit]:
-                    yield self._doc_class(doc)
+    def all(self, batch_size=1000, slices=None):
+        """Stream every hit of the search, in no particular order.
+
+        See :func:`designsafe.libs.elasticsearch.pagination.scan`.
+        """
+        for doc in scan(self._search, batch_size=batch_size, slices=slices):
+            yield self._doc_class(doc)
 
     def results(self, offset):
         res = self._search.execute()
@@ -86,10 +74,8 @@ class BaseSearchManager(object):
         for doc in self._search.execute():
             yield self._doc_class(doc)
 
-    def scan(self):
-        self._search.execute()
-        for doc in self._search.scan():
-            yield self._doc_class(doc)
+    def scan(self, batch_size=1000, slices=None):
+        return self.all(batch_size=batch_size, slices=slices)
 
     def __getitem__(self, index):
         return self._search.__getitem__(index)
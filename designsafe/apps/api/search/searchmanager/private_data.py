@@ -6,8 +6,9 @@
 import logging
 from designsafe.apps.api.search.searchmanager.base import BaseSearchManager
 from designsafe.apps.data.models.elasticsearch import IndexedFile
-from elasticsearch_dsl import Q, Search, Index
+from elasticsearch_dsl import Q, Search
 from django.conf import settings
+from designsafe.libs.elasticsearch.aliases import resolve_alias
 
 logger = logging.getLogger(__name__)
 
@@ -29,12 +30,12 @@ class PrivateDataSearchManager(BaseSearchManager):
 
     def construct_query(self, system, file_path=None):
 
-        files_index_name = list(Index(settings.ES_INDEX_PREFIX.format('files')).get_alias().keys())[0]
+        files_index_name = resolve_alias(settings.ES_INDEX_PREFIX.format('files'))
 
         if system == settings.AGAVE_STORAGE_SYSTEM:
-            storage_prefix_query = Q({'prefix': {'path._exact': '/' + self.username}})
+            storage_query = IndexedFile.subtree_query(self.username)
         else:
-            storage_prefix_query = Q({'prefix': {'path._exact': '/'}})
+            storage_query = IndexedFile.subtree_query('/')
 
         ngram_query = Q("query_string", query=self.query_string,
                         fields=["name"],
@@ -51,11 +52,11 @@ class PrivateDataSearchManager(BaseSearchManager):
             must=[
                 Q({'term': {'_index': files_index_name}}),
                 Q({'term': {'system._exact': system}}),
-                storage_prefix_query,
+                storage_query,
                 (ngram_query | match_query)
             ],
             must_not=[
-                Q({"prefix": {"path._exact": "/.Trash"}})
+                IndexedFile.subtree_query("/.Trash")
             ]
         )
 
@@ -7,13 +7,14 @@
 import logging
 from designsafe.apps.api.search.searchmanager.base import BaseSearchManager
 from designsafe.apps.data.models.elasticsearch import IndexedPublication
-from elasticsearch_dsl import Q, Search, Index
+from elasticsearch_dsl import Q, Search
 from django.conf import settings
 import urllib
 import json
 from functools import reduce
 from designsafe.libs.elasticsearch.docs.publications import BaseESPublication
 from designsafe.libs.elasticsearch.docs.publication_legacy import BaseESPublicationLegacy
+from designsafe.libs.elasticsearch.aliases import resolve_alias
 
 logger = logging.getLogger(__name__)
 
@@ -226,8 +227,8 @@ class PublicationsSearchManager(BaseSearchManager):
             "authors.lname",
             "name"
             ]
-        published_index_name = list(Index(settings.ES_INDEX_PREFIX.format('publications')).get_alias().keys())[0]
-        legacy_index_name = list(Index(settings.ES_INDEX_PREFIX.format('publications-legacy')).get_alias().keys())[0]
+        published_index_name = resolve_alias(settings.ES_INDEX_PREFIX.format('publications'))
+        legacy_index_name = resolve_alias(settings.ES_INDEX_PREFIX.format('publications-legacy'))
 
 
         ds_user_query = Q({"nested":
@@ -277,8 +278,9 @@ class PublicationsSearchManager(BaseSearchManager):
         listing_search = listing_search.extra(from_=offset, size=limit).source(includes=['project.value', 'created', 'projectId', 'users', 'system'])
         res = listing_search.execute()
         children = []
+        pi_names = BaseESPublication.pi_names(res)
         for hit in res:
-            hit_to_file = BaseESPublication.hit_to_file(hit)
+            hit_to_file = BaseESPublication.hit_to_file(hit, pi_names)
             children.append(hit_to_file)
         result = {
             'trail': [{'name': '$SEARCH', 'path': '/$SEARCH'}],
@@ -7,10 +7,11 @@
 import logging
 from designsafe.apps.api.search.searchmanager.base import BaseSearchManager
 from designsafe.apps.data.models.elasticsearch import IndexedPublication
-from elasticsearch_dsl import Q, Search, Index
+from elasticsearch_dsl import Q, Search
 from django.conf import settings
 from designsafe.libs.elasticsearch.docs.publications import BaseESPublication
 from designsafe.libs.elasticsearch.docs.publication_legacy import BaseESPublicationLegacy
+from designsafe.libs.elasticsearch.aliases import resolve_alias
 
 logger = logging.getLogger(__name__)
 
@@ -49,8 +50,8 @@ class PublicationsSiteSearchManager(BaseSearchManager):
             "authors.lname",
             "name"
             ]
-        published_index_name = list(Index(settings.ES_INDEX_PREFIX.format('publications')).get_alias().keys())[0]
-        legacy_index_name = list(Index(settings.ES_INDEX_PREFIX.format('publications-legacy')).get_alias().keys())[0]
+        published_index_name = resolve_alias(settings.ES_INDEX_PREFIX.format('publications'))
+        legacy_index_name = resolve_alias(settings.ES_INDEX_PREFIX.format('publications-legacy'))
         filter_queries = []
         if kwargs.get('type_filters'):
             for type_filter in kwargs['type_filters']:
@@ -100,10 +101,11 @@ class PublicationsSiteSearchManager(BaseSearchManager):
         listing_search = listing_search.extra(from_=offset, size=limit)
         res = listing_search.execute()
         children = []
+        pi_names = BaseESPublication.pi_names(res)
         for hit in res:
             try:
                 getattr(hit, 'projectId')
-                hit_to_file = BaseESPublication.hit_to_file(hit)
+                hit_to_file = BaseESPublication.hit_to_file(hit, pi_names)
                 children.append(hit_to_file)
             except AttributeError:
                 children.append(BaseESPublicationLegacy(**hit.to_dict()).to_file())
@@ -7,8 +7,9 @@
 import logging
 from designsafe.apps.api.search.searchmanager.base import BaseSearchManager
 from designsafe.apps.data.models.elasticsearch import IndexedFile
-from elasticsearch_dsl import Q, Search, Index
+from elasticsearch_dsl import Q, Search
 from django.conf import settings
+from designsafe.libs.elasticsearch.aliases import resolve_alias
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +29,7 @@ class PublishedDataSearchManager(BaseSearchManager):
 
     def construct_query(self, system=None, file_path=None):
 
-        files_index_name = list(Index(settings.ES_INDEX_PREFIX.format('files')).get_alias().keys())[0]
+        files_index_name = resolve_alias(settings.ES_INDEX_PREFIX.format('files'))
         ngram_query = Q("query_string", query=self.query_string,
                         fields=["name"],
                         minimum_should_match='80%',
@@ -47,7 +48,7 @@ class PublishedDataSearchManager(BaseSearchManager):
                 (ngram_query | match_query)
             ],
             must_not=[
-                Q({"prefix": {"path._exact": "/Trash"}})
+                IndexedFile.subtree_query("/Trash")
             ]
         )
 
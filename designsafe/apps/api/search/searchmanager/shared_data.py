@@ -7,8 +7,9 @@
 import logging
 from designsafe.apps.api.search.searchmanager.base import BaseSearchManager
 from designsafe.apps.data.models.elasticsearch import IndexedFile
-from elasticsearch_dsl import Q, search, Index
+from elasticsearch_dsl import Q, search
 from django.conf import settings
+from designsafe.libs.elasticsearch.aliases import resolve_alias
 
 logger = logging.getLogger(__name__)
 
@@ -30,23 +31,23 @@ class SharedDataSearchManager(BaseSearchManager):
 
     def construct_query(self, system, file_path=None):
 
-        files_index_name = list(Index(settings.ES_INDEX_PREFIX.format('files')).get_alias().keys())[0]
+        files_index_name = resolve_alias(settings.ES_INDEX_PREFIX.format('files'))
 
         if system == settings.AGAVE_STORAGE_SYSTEM:
-            storage_prefix_query = Q({'prefix': {'path._exact': '/' + self.username}})
+            storage_query = IndexedFile.subtree_query(self.username)
         else:
-            storage_prefix_query = Q({'prefix': {'path._exact': '/'}})
+            storage_query = IndexedFile.subtree_query('/')
 
         private_files_query = Q(
             'bool',
             must=[
                 Q({'term': {'_index': files_index_name}}),
                 Q({'term': {'system._exact': system}}),
-                storage_prefix_query,
+                storage_query,
                 Q("query_string", query=self.query_string, default_operator="and")
             ],
             must_not=[
-                Q({"prefix": {"path._exact": "/.Trash"}})
+                IndexedFile.subtree_query("/.Trash")
             ]
         )
 
@@ -66,12 +67,12 @@ class SharedDataSearchManager(BaseSearchManager):
                         default_operator='and')
         
         search = IndexedFile.search()
-        search = search.filter("nested", path="permissions", query=Q("term", permissions__username=user_context))
+        search = search.filter("term", readers=user_context)
         search = search.query(ngram_query | match_query)
         
-        search = search.query(Q('bool', must_not=[Q({'prefix': {'path._exact': '/'+user_context}})]))
+        search = search.query(Q('bool', must_not=[IndexedFile.subtree_query(user_context)]))
         search = search.filter("term", system=system)
-        search = search.query(Q('bool', must_not=[Q({'prefix': {'path._exact': '{}/.Trash'.format(user_context)}})]))
+        search = search.query(Q('bool', must_not=[IndexedFile.subtree_query('{}/.Trash'.format(user_context))]))
         res = search.execute()
 
         children = []
@@ -8,25 +8,36 @@ import json
 
 class SearchViewTests(TestCase):
 
+    def _bucket(self, key, doc_count):
+        return MagicMock(key=key, doc_count=doc_count)
+
     @patch('designsafe.apps.api.search.views.CommunityDataSearchManager')
     @patch('designsafe.apps.api.search.views.PublishedDataSearchManager')
     @patch('designsafe.apps.api.search.views.CMSSearchManager')
     @patch('designsafe.apps.api.search.views.PublicationsSiteSearchManager')
     @patch('designsafe.apps.api.search.views.Search')
-    @patch('designsafe.apps.api.search.views.Index')
-    def test_search_view(self, mock_index, mock_search, mock_community, mock_published, mock_cms, mock_publications):
-
-        mock_index().get_alias().keys.side_effect = [['test-pub'], ['test-pub-legacy'], ['test-files'], ['test-cms']]
-        mock_search().query().count.return_value = 0
-        mock_search().query().highlight().highlight_options().execute().return_value = []
-        mock_search().query().highlight().highlight_options().execute().hits.total.value = 0
+    @patch('designsafe.apps.api.search.views.resolve_aliases')
+    def test_search_view(self, mock_resolve, mock_search, mock_community, mock_published, mock_cms, mock_publications):
+        mock_resolve.return_value = {
+            settings.ES_INDEX_PREFIX.format('publications'): 'test-pub',
+            settings.ES_INDEX_PREFIX.format('publications-legacy'): 'test-pub-legacy',
+            settings.ES_INDEX_PREFIX.format('files'): 'test-files',
+            settings.ES_INDEX_PREFIX.format('cms'): 'test-cms',
+        }
+        mock_res = MagicMock()
+        mock_res.__iter__.return_value = []
+        mock_res.aggregations.indices.buckets = [
+            self._bucket('test-files', 3), self._bucket('test-pub', 2),
+            self._bucket('test-pub-legacy', 1), self._bucket('test-cms', 4)]
+        mock_search().query().highlight().highlight_options().extra().execute.return_value = mock_res
         url = "{}?type_filter=all&query_string=test".format(reverse('designsafe_api:ds_search_api:search'))
 
         response = self.client.get(url)
 
         self.assertEqual(response.json(), {'hits': [],
-                                           'public_files_total': 0,
-                                           'published_total': 0,
-                                           'cms_total': 0,
-                                           'all_total': 0})
-
+                                           'public_files_total': 3,
+                                           'published_total': 3,
+                                           'cms_total': 4,
+                                           'all_total': 10})
+        # The hits and every total come from a single search request.
+        self.assertEqual(mock_search().query().highlight().highlight_options().extra().execute.call_count, 1)
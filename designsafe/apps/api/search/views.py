@@ -6,12 +6,13 @@
 """
 import logging
 import operator
-from elasticsearch_dsl import Q, Search, Index
+from elasticsearch_dsl import Q, Search
 from elasticsearch import TransportError, ConnectionTimeout
 from django.http import (HttpResponseBadRequest,
                          JsonResponse)
 from django.conf import settings
 from designsafe.apps.api.views import BaseApiView
+from designsafe.libs.elasticsearch.aliases import resolve_aliases
 
 from designsafe.apps.api.search.searchmanager.community import CommunityDataSearchManager
 from designsafe.apps.api.search.searchmanager.published_files import PublishedDataSearchManager
@@ -21,45 +22,57 @@ from designsafe.apps.api.search.searchmanager.publications_site_search import Pu
 logger = logging.getLogger(__name__)
 
 
+def _doc_type_map():
+    """Map the concrete index behind each searchable alias to the doc type
+    reported to the client."""
+    alias_doc_types = {
+        settings.ES_INDEX_PREFIX.format('publications'): 'publication',
+        settings.ES_INDEX_PREFIX.format('publications-legacy'): 'publication',
+        settings.ES_INDEX_PREFIX.format('files'): 'file',
+        settings.ES_INDEX_PREFIX.format('cms'): 'modelresult'
+    }
+    return {index_name: alias_doc_types[alias]
+            for alias, index_name in resolve_aliases(*alias_doc_types).items()
+            if index_name}
+
+
 class SearchView(BaseApiView):
     """Main view to handle sitewise search requests"""
     def get(self, request):
-        """GET handler."""
+        """GET handler.
+
+        The hits and the totals for every type filter come back from a
+        single search: the selected type is applied as a post filter and
+        the totals are a terms aggregation on ``_index``.
+        """
         q = request.GET.get('query_string')
         offset = int(request.GET.get('offset', 0))
         limit = int(request.GET.get('limit', 10))
         if limit > 500:
             return HttpResponseBadRequest("limit must not exceed 500")
         type_filter = request.GET.get('type_filter', 'all')
-        doc_type_map = {
-            list(Index(settings.ES_INDEX_PREFIX.format('publications')).get_alias().keys())[0]: 'publication',
-            list(Index(settings.ES_INDEX_PREFIX.format('publications-legacy')).get_alias().keys())[0]: 'publication',
-            list(Index(settings.ES_INDEX_PREFIX.format('files')).get_alias().keys())[0]: 'file',
-            list(Index(settings.ES_INDEX_PREFIX.format('cms')).get_alias().keys())[0]: 'modelresult'
-        }
+        doc_type_map = _doc_type_map()
 
         public_files_query = CommunityDataSearchManager(request).construct_query() | PublishedDataSearchManager(request).construct_query()
         publications_query = PublicationsSiteSearchManager(request).construct_query()
-        cms_query = es_query = CMSSearchManager(request).construct_query()
+        cms_query = CMSSearchManager(request).construct_query()
+        type_queries = {
+            'public_files': public_files_query,
+            'published': publications_query,
+            'cms': cms_query
+        }
 
-        if type_filter == 'public_files':
-            es_query = Search().query(public_files_query)
-        elif type_filter == 'published':
-            es_query = Search().query(publications_query)
-        elif type_filter == 'cms':
-            es_query = Search().query(cms_query).highlight(
-                    'body',
-                    fragment_size=100).highlight_options(
-                    pre_tags=["<b>"],
-                    post_tags=["</b>"],
-                    require_field_match=False)
-        elif type_filter == 'all':
-            es_query = Search().query(public_files_query | publications_query | cms_query).highlight(
+        es_query = Search().query(public_files_query | publications_query | cms_query)
+        if type_filter in type_queries:
+            es_query = es_query.post_filter(type_queries[type_filter])
+        if type_filter in ('cms', 'all'):
+            es_query = es_query.highlight(
                     'body',
                     fragment_size=100).highlight_options(
                     pre_tags=["<b>"],
                     post_tags=["</b>"],
                     require_field_match=False)
+        es_query.aggs.bucket('indices', 'terms', field='_index', size=len(doc_type_map) or 10)
         es_query = es_query.extra(from_=offset, size=limit)
         try:
             res = es_query.execute()
@@ -84,11 +97,18 @@ class SearchView(BaseApiView):
                 d["piLabel"] = "{}, {}".format(pi_user.last_name, pi_user.first_name)
             hits.append(d)
 
+        # Every type query is restricted to its own indices, so the per-index
+        # counts add up to the per-type totals.
+        type_totals = {'file': 0, 'publication': 0, 'modelresult': 0}
+        for bucket in res.aggregations.indices.buckets:
+            doc_type = doc_type_map.get(bucket.key)
+            if doc_type:
+                type_totals[doc_type] += bucket.doc_count
+
         out['hits'] = hits
-        out['all_total'] = Search().query(public_files_query | publications_query | cms_query).count()
-        out['public_files_total'] = Search().query(public_files_query).count()
-        out['published_total'] = Search().query(publications_query).count()
-        out['cms_total'] = Search().query(cms_query).count()
-        print(out)
+        out['all_total'] = sum(type_totals.values())
+        out['public_files_total'] = type_totals['file']
+        out['published_total'] = type_totals['publication']
+        out['cms_total'] = type_totals['modelresult']
 
         return JsonResponse(out, safe=False)
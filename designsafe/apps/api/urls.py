@@ -1,6 +1,6 @@
 # pylint: disable=missing-docstring
 from django.conf.urls import url, include
-from designsafe.apps.api.views import LoggerApi
+from designsafe.apps.api.views import LoggerApi, ElasticsearchPoolApi
 from django.http import JsonResponse
 
 urlpatterns = [
@@ -11,6 +11,7 @@ urlpatterns = [
     url(r'^publications/', include('designsafe.apps.api.publications.urls')),
 
     url(r'^logger/$', LoggerApi.as_view(), name='logger'),
+    url(r'^es-pool/$', ElasticsearchPoolApi.as_view(), name='es_pool'),
     url(r'^notifications/', include('designsafe.apps.api.notifications.urls')),
     url(r'^users/', include('designsafe.apps.api.users.urls')),
     url(r'^search/', include('designsafe.apps.api.search.urls', namespace="ds_search_api")),
@@ -0,0 +1,25 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from designsafe.apps.api.users.utils import display_names
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestDisplayNames(TestCase):
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        user_model = get_user_model()
+        user_model.objects.create(username='pi_one', first_name='Ada', last_name='Lovelace')
+        user_model.objects.create(username='pi_two', first_name='Alan', last_name='Turing')
+
+    def test_resolves_usernames_in_one_query(self):
+        with self.assertNumQueries(1):
+            names = display_names(['pi_one', 'pi_two', 'pi_one', 'unknown'])
+        self.assertEqual(names, {'pi_one': 'Lovelace, Ada', 'pi_two': 'Turing, Alan'})
+
+    def test_cached_names_are_not_queried_again(self):
+        display_names(['pi_one', 'unknown'])
+        with self.assertNumQueries(0):
+            names = display_names(['pi_one', 'unknown'])
+        self.assertEqual(names, {'pi_one': 'Lovelace, Ada'})
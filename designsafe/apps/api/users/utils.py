@@ -1,3 +1,6 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.db.models import Q
 
 import logging
@@ -31,3 +34,44 @@ def q_to_model_queries(q):
         query |= Q(last_name__icontains = q)
 
     return query
+
+
+def _display_name_key(username):
+    return 'user_display_name:{}'.format(username)
+
+
+def display_names(usernames):
+    """Resolve usernames to ``"Last, First"`` display names.
+
+    Names are cached for ``settings.USER_DISPLAY_NAME_CACHE_TTL`` seconds.
+    Usernames missing from the cache are looked up in a single query.
+
+    :param usernames: iterable of usernames.
+    :returns: dict of username to display name. Usernames with no user
+        are left out.
+    :rtype: dict
+    """
+    usernames = set(username for username in usernames if username)
+    if not usernames:
+        return {}
+    cached = cache.get_many([_display_name_key(username) for username in usernames])
+    names = {}
+    missing = set()
+    for username in usernames:
+        name = cached.get(_display_name_key(username))
+        if name is None:
+            missing.add(username)
+        elif name:
+            names[username] = name
+
+    if missing:
+        found = {}
+        for user in get_user_model().objects.filter(username__in=missing).only(
+                'username', 'first_name', 'last_name'):
+            found[user.username] = '{}, {}'.format(user.last_name, user.first_name)
+        names.update(found)
+        # Unknown usernames are cached as '' so they are not looked up again.
+        cache.set_many({_display_name_key(username): found.get(username, '')
+                        for username in missing},
+                       timeout=settings.USER_DISPLAY_NAME_CACHE_TTL)
+    return names
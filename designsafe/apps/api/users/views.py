@@ -2,13 +2,16 @@ import logging
 import json
 from designsafe.apps.api.mixins import SecureMixin
 from designsafe.apps.api.users import utils as users_utils
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.forms.models import model_to_dict
 from django.http import HttpResponseNotFound, JsonResponse, HttpResponse
 from django.views.generic.base import View
 from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
 from pytas.http import TASClient
 
+from designsafe.apps.data.models import StorageUsage
 from designsafe.apps.data.models.elasticsearch import IndexedFile
 from elasticsearch_dsl import Q, Search
 
@@ -19,13 +22,19 @@ class UsageView(SecureMixin, View):
 
     def get(self, request):
         current_user = request.user
-        q = IndexedFile.search()\
-                .query('bool', must=[Q("prefix", **{"path._exact": '/' + current_user.username})])\
-                .extra(size=0)
-        q.aggs.metric('total_storage_bytes', 'sum', field="length")
-        result = q.execute()
-        agg = result.to_dict()["aggregations"]
-        out = {"total_storage_bytes": agg["total_storage_bytes"]["value"]}
+        system = settings.AGAVE_STORAGE_SYSTEM
+        try:
+            usage = StorageUsage.objects.get(system=system, owner=current_user.username)
+        except StorageUsage.DoesNotExist:
+            # Not indexed since rollups were introduced, count it once.
+            total_bytes, file_count = IndexedFile.subtree_usage(system, ['/' + current_user.username])
+            usage, _ = StorageUsage.objects.get_or_create(
+                system=system, owner=current_user.username,
+                defaults={'total_bytes': total_bytes,
+                          'file_count': file_count,
+                          'reconciled': timezone.now()})
+        out = {"total_storage_bytes": usage.total_bytes,
+               "file_count": usage.file_count}
         return JsonResponse(out)
 
 class AuthenticatedView(View):
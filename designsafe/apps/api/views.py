@@ -1,4 +1,5 @@
 from django.http.response import HttpResponse, HttpResponseForbidden
+from django.http import JsonResponse
 from django.views.generic import View
 from requests.exceptions import ConnectionError, HTTPError
 from .exceptions import ApiException
@@ -82,3 +83,14 @@ class LoggerApi(BaseApiView):
         return HttpResponse('OK', status=202)
 
 
+class ElasticsearchPoolApi(BaseApiView):
+    """
+    Connection pool metrics of this process' shared Elasticsearch client.
+    Staff only.
+    """
+
+    def get(self, request):
+        from designsafe.libs.elasticsearch.client import pool_stats
+        if not request.user.is_staff:
+            return HttpResponseForbidden()
+        return JsonResponse(pool_stats())
@@ -1,8 +1,6 @@
 """Data app config."""
 import logging
 from django.apps import AppConfig
-from django.conf import settings
-from elasticsearch_dsl.connections import connections
 
 
 # pylint: disable=invalid-name
@@ -18,16 +16,8 @@ class DataConfig(AppConfig):
 
     def ready(self):  # pylint:disable=too-many-locals
         """Run stuff when app is ready."""
-        try:
-            connections.create_connection('default',
-                                          hosts=settings.ES_CONNECTIONS[settings.DESIGNSAFE_ENVIRONMENT]['hosts'],
-                                          http_auth=settings.ES_AUTH,
-                                          max_retries=3,
-                                          retry_on_timeout=True,
-                                          )
-        except AttributeError as exc:
-            logger.error('Missing ElasticSearch config. %s', exc)
-            raise
+        from designsafe.libs.elasticsearch import client as es_client
+        es_client.configure()
         # We need to import every class so we can later setup the reverse
         # reverse relations.
         # pylint: disable=unused-import
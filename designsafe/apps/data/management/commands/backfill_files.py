@@ -0,0 +1,48 @@
+"""Backfill files command"""
+import logging
+from django.core.management import BaseCommand
+from designsafe.libs.elasticsearch.utils import backfill_depth, backfill_readers
+
+logger = logging.getLogger(__name__)
+
+BACKFILLS = {
+    'depth': backfill_depth,
+    'readers': backfill_readers,
+}
+
+
+class Command(BaseCommand):
+    """
+    This command sets a derived field on every document in the files index
+    that was indexed before the field was added to the mapping:
+
+     - ``depth``: searches that exclude a folder from its own subtree rely
+       on it. See :func:`designsafe.libs.elasticsearch.utils.backfill_depth`.
+     - ``readers``: shared data permission filters rely on it. See
+       :func:`designsafe.libs.elasticsearch.utils.backfill_readers`.
+
+    Run it once per field after deploying the new mapping, e.g.
+    `./manage.py backfill_files readers`. An interrupted run can be
+    continued with ``--resume``.
+    """
+
+    help = "Set a derived field on documents in the files index that lack it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('field', help='Field to backfill.', choices=sorted(BACKFILLS))
+        parser.add_argument('--slices', help='Number of scroll slices read in parallel.', default=8, type=int)
+        parser.add_argument('--max-docs-per-second', help='Throttle on documents updated per second.', default=None, type=int)
+        parser.add_argument('--resume', help='Skip slices finished by the last run.', default=False, action='store_true')
+        parser.add_argument('--dry-run', help='Only count documents that lack the field.', default=False, action='store_true')
+
+    def handle(self, *args, **options):
+        field = options.get('field')
+        report = BACKFILLS[field](slices=options.get('slices'),
+                                  max_docs_per_second=options.get('max_docs_per_second'),
+                                  resume=options.get('resume'),
+                                  dry_run=options.get('dry_run'))
+        if options.get('dry_run'):
+            self.stdout.write('{} documents lack {}.'.format(report['actions'], field))
+        else:
+            self.stdout.write('Set {} on {} documents with {} errors.'.format(
+                field, report['actions'], len(report['errors'])))
@@ -0,0 +1,94 @@
+"""Indexer benchmark command"""
+import logging
+import os
+import time
+import datetime
+from django.core.management import BaseCommand
+from django.conf import settings
+from elasticsearch_dsl import Index
+from designsafe.apps.data.models.elasticsearch import IndexedFile
+from designsafe.libs.elasticsearch.exceptions import DocumentNotFound
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    This command measures file indexer throughput against the files index.
+
+    A synthetic directory listing is indexed under a scratch system using
+    each write strategy:
+
+     - ``legacy``: the pre-deterministic-id behavior; every file forces an
+       index refresh and a search before it is saved.
+     - ``realtime``: ``index_level`` as it is now; every file is looked up
+       with a realtime GET by id and then saved.
+     - ``bulk``: ``index_level(bulk=True)``; the whole level is written in
+       bulk requests.
+
+    Every strategy writes the same documents, and the scratch documents are
+    removed when the command finishes. Usage:
+    `./manage.py benchmark_indexer --files 1000`.
+    """
+
+    help = "Measure file indexing throughput before and after removing per-file refreshes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', help='Number of files in the synthetic listing.', default=1000, type=int)
+        parser.add_argument('--chunk-size', help='Bulk chunk size.', default=500, type=int)
+        parser.add_argument('--modes', help='Comma separated strategies to run.', default='legacy,realtime,bulk')
+
+    def _listing(self, system, path, count):
+        from designsafe.apps.data.models.agave.files import BaseFileResource
+        now = datetime.datetime.now().isoformat()
+        return [BaseFileResource(None, system=system,
+                                 path='{}/file_{}.out'.format(path, i),
+                                 name='file_{}.out'.format(i),
+                                 format='raw', type='file',
+                                 mimeType='text/plain',
+                                 length=i, lastModified=now,
+                                 permissions='ALL', _links={})
+                for i in range(count)]
+
+    def _index_legacy(self, system, path, files, chunk_size):
+        alias = settings.ES_INDICES['files']['alias']
+        for obj in files:
+            obj_dict = obj.to_dict()
+            obj_dict.pop('permissions', None)
+            obj_dict.pop('trail', None)
+            obj_dict.pop('_links', None)
+            obj_dict['basePath'] = os.path.dirname(obj.path)
+            Index(alias).refresh()
+            try:
+                doc = IndexedFile._from_path_legacy(system, obj.path)
+                doc.update(**obj_dict)
+            except DocumentNotFound:
+                IndexedFile(**obj_dict).save()
+
+    def _index_realtime(self, system, path, files, chunk_size):
+        from designsafe.libs.elasticsearch.utils import index_level
+        index_level(None, path, [], files, system, 'ds_admin', update_pems=False)
+
+    def _index_bulk(self, system, path, files, chunk_size):
+        from designsafe.libs.elasticsearch.utils import index_level
+        index_level(None, path, [], files, system, 'ds_admin', update_pems=False,
+                    bulk=True, chunk_size=chunk_size)
+
+    def handle(self, *args, **options):
+        count = options.get('files')
+        chunk_size = options.get('chunk_size')
+        modes = options.get('modes').split(',')
+
+        system = 'benchmark.indexer.{}'.format(int(time.time()))
+        path = '/benchmark'
+        try:
+            for mode in modes:
+                files = self._listing(system, path, count)
+                start = time.time()
+                getattr(self, '_index_{}'.format(mode))(system, path, files, chunk_size)
+                elapsed = time.time() - start
+                self.stdout.write('{:<10} {:>8} files {:>10.2f}s {:>10.1f} files/s'.format(
+                    mode, count, elapsed, count / elapsed))
+        finally:
+            IndexedFile.search().filter('term', **{'system._exact': system}).params(
+                refresh=True, conflicts='proceed').delete()
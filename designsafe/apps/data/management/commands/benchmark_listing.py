@@ -0,0 +1,73 @@
+"""Listing benchmark command"""
+import json
+import logging
+import os
+import time
+from django.core.management import BaseCommand
+from django.conf import settings
+from designsafe.apps.api.agave.listing import iterate_listing
+
+logger = logging.getLogger(__name__)
+
+FIXTURE = os.path.join(settings.BASE_DIR, 'designsafe', 'apps', 'api', 'fixtures',
+                       'agave_agavefs_listing.json')
+
+
+class _Files(object):
+    """Stand-in for ``client.files`` serving a synthetic directory."""
+
+    def __init__(self, entries, latency):
+        self.entries = entries
+        self.latency = latency
+        self.requests = 0
+
+    def list(self, systemId, filePath, offset=0, limit=100):
+        self.requests += 1
+        time.sleep(self.latency)
+        return self.entries[offset:offset + limit]
+
+
+class _Client(object):
+
+    def __init__(self, entries, latency):
+        self.files = _Files(entries, latency)
+
+
+class Command(BaseCommand):
+    """
+    This command measures Tapis listing pagination without touching Tapis.
+
+    A directory of ``--files`` entries shaped like
+    ``designsafe/apps/api/fixtures/agave_agavefs_listing.json`` is served
+    by a fake client that sleeps ``--latency`` ms per request. Each page
+    size is iterated with and without prefetching while spending
+    ``--work`` ms on every entry, the way a transfer would. Usage:
+    `./manage.py benchmark_listing --files 2000 --page-sizes 100,500`.
+    """
+
+    help = "Measure paginated listing throughput with and without prefetching."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', help='Number of entries in the directory.', default=2000, type=int)
+        parser.add_argument('--latency', help='Milliseconds per listing request.', default=200, type=float)
+        parser.add_argument('--work', help='Milliseconds spent on each entry.', default=0.5, type=float)
+        parser.add_argument('--page-sizes', help='Comma separated page sizes.', default='100,250,500')
+
+    def handle(self, *args, **options):
+        with open(FIXTURE) as f:
+            fixture = json.load(f)
+        count = options.get('files')
+        entries = [dict(fixture[i % len(fixture)], name='file_{}'.format(i)) for i in range(count)]
+        latency = options.get('latency') / 1000.0
+        work = options.get('work') / 1000.0
+
+        for page_size in [int(size) for size in options.get('page_sizes').split(',')]:
+            for prefetch in (False, True):
+                client = _Client(entries, latency)
+                start = time.time()
+                for _ in iterate_listing(client, 'benchmark.system', '/benchmark',
+                                         page_size=page_size, prefetch=prefetch):
+                    time.sleep(work)
+                elapsed = time.time() - start
+                self.stdout.write('page_size={:<6} prefetch={:<6} {:>5} requests {:>8.2f}s {:>10.1f} entries/s'.format(
+                    page_size, str(prefetch), client.files.requests, elapsed, count / elapsed))
@@ -0,0 +1,33 @@
+"""Crawls command"""
+import logging
+from django.core.management import BaseCommand
+from designsafe.apps.data.models import Crawl
+from designsafe.apps.data.tasks import resume_crawl
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    This command reports the status of recent indexer crawls, e.g.
+    `./manage.py crawls --limit 5`, and restarts a crawl that stopped before
+    its frontier was drained, e.g. `./manage.py crawls --resume 42`.
+    """
+
+    help = "Show indexer crawl status or resume a crawl."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', help='Number of crawls to show.', default=10, type=int)
+        parser.add_argument('--resume', help='Id of a crawl to resume.', type=int)
+        parser.add_argument('--workers', help='Number of tasks draining a resumed crawl.', default=1, type=int)
+
+    def handle(self, *args, **options):
+        if options.get('resume'):
+            crawl = resume_crawl(options.get('resume'), workers=options.get('workers'))
+            self.stdout.write('Resumed crawl {} of {}.'.format(crawl.id, crawl))
+            return
+
+        for crawl in Crawl.objects.order_by('-created')[:options.get('limit')]:
+            status = crawl.status()
+            self.stdout.write('{:>6} {:<60} {:<10} queued={queued} running={running} done={done} failed={failed}'.format(
+                crawl.id, str(crawl), 'finished' if crawl.finished else 'active', **status))
@@ -0,0 +1,40 @@
+"""Dedup files command"""
+import logging
+from django.core.management import BaseCommand
+from designsafe.libs.elasticsearch.utils import full_dedup
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    This command removes documents in the files index that share their
+    system and path with another document. See
+    :func:`designsafe.libs.elasticsearch.utils.full_dedup`.
+
+    Run with ``--dry-run`` first to see how many documents would be removed.
+    """
+
+    help = "Remove duplicate documents from the files index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', help='Number of paths checked per request.', default=1000, type=int)
+        parser.add_argument('--chunk-size', help='Number of documents per bulk request.', default=500, type=int)
+        parser.add_argument('--dry-run', help='Only count duplicate documents.', default=False, action='store_true')
+
+    def _progress(self, report):
+        self.stdout.write('{paths} paths, {duplicated_paths} duplicated, '
+                          '{duplicates} duplicates, {deleted} deleted'.format(**report))
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run')
+        report = full_dedup(page_size=options.get('page_size'),
+                            chunk_size=options.get('chunk_size'),
+                            dry_run=dry_run,
+                            progress=self._progress)
+        if dry_run:
+            self.stdout.write('{} duplicate documents under {} paths would be deleted.'.format(
+                report['duplicates'], report['duplicated_paths']))
+        else:
+            self.stdout.write('Deleted {} duplicate documents with {} errors.'.format(
+                report['deleted'], len(report['errors'])))
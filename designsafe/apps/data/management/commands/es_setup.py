@@ -4,6 +4,7 @@ from django.utils.six.moves import input
 from django.conf import settings
 import elasticsearch
 import getpass
+from designsafe.libs.elasticsearch.client import create_client
 logger = logging.getLogger(__name__)
 
 
@@ -29,14 +30,13 @@ class Command(BaseCommand):
         parser.add_argument('--local', help='Remote role to index from, either staging or default', default="dev")
 
     def handle(self, *args, **options):
-        HOSTS = settings.ES_CONNECTIONS[settings.DESIGNSAFE_ENVIRONMENT]['hosts']
         password = getpass.getpass('Enter password for remote ES cluster ')
         username = options.get('username')
         remote = options.get('remote')
         local = options.get('local')
 
-        local_es_client = elasticsearch.Elasticsearch(settings.ES_CONNECTIONS[local]['hosts'])
-        remote_es_client = elasticsearch.Elasticsearch(settings.ES_CONNECTIONS[remote]['hosts'],
+        local_es_client = create_client(settings.ES_CONNECTIONS[local]['hosts'])
+        remote_es_client = create_client(settings.ES_CONNECTIONS[remote]['hosts'],
             **{'http_auth': "designsafe_{}:{}".format(remote, password)})
 
 
@@ -4,8 +4,8 @@ import logging
 import six
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
-import elasticsearch
 from elasticsearch import TransportError
+from designsafe.libs.elasticsearch.client import get_client, create_client
 
 
 logger = logging.getLogger(__name__)
@@ -97,10 +97,8 @@ class Command(BaseCommand):
         if doc_type:
             body['source']['type'] = doc_type
             self.stdout.write('doc_type: %s' % doc_type)
-        es_local = elasticsearch.Elasticsearch(
-            settings.ES_CONNECTIONS[settings.DESIGNSAFE_ENVIRONMENT]['hosts'],
-            request_timeout=120)
-        es_remote = elasticsearch.Elasticsearch(hosts, request_timeout=120)
+        es_local = get_client()
+        es_remote = create_client(hosts, timeout=120)
         self.stdout.write('local conn: %s' % settings.ES_CONNECTIONS[settings.DESIGNSAFE_ENVIRONMENT]['hosts'])
         self.stdout.write('remote conn: %s' % hosts)
         remote_index = es_remote.indices.get(from_index)
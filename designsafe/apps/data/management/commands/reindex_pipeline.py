@@ -0,0 +1,158 @@
+"""Reindex pipeline command"""
+import logging
+import time
+from django.core.cache import cache
+from django.core.management import BaseCommand, CommandError
+from django.utils.six.moves import input
+from django.conf import settings
+from elasticsearch import ConnectionError as ESConnectionError, ConnectionTimeout
+from elasticsearch_dsl import Index
+from designsafe.libs.elasticsearch import aliases as aliases_cache
+from designsafe.libs.elasticsearch.client import get_client
+from designsafe.libs.elasticsearch.indices import setup_index, apply_settings, restore_settings
+
+logger = logging.getLogger(__name__)
+
+STATE_TIMEOUT = 7 * 24 * 60 * 60
+
+# Target index settings while documents are copied into it.
+REINDEX_SETTINGS = {'refresh_interval': '-1', 'number_of_replicas': 0}
+
+
+class Command(BaseCommand):
+    """
+    This command rebuilds an index from settings.ES_INDICES into a fresh index
+    with the current mappings, and swaps it in without downtime:
+
+     1. A new index is created under the ``<alias>-reindex`` alias, with
+        refresh and replicas turned off.
+     2. Documents are copied with ``_reindex`` running as a background task
+        with ``slices=auto``. Progress is polled and printed, and lost
+        connections are retried.
+     3. The target's settings are restored and the document counts of both
+        indices are compared.
+     4. The aliases of the two indices are swapped atomically.
+
+    The task id is kept in the cache, so if this command is interrupted while
+    the task runs, `./manage.py reindex_pipeline --index files --resume`
+    continues from step 2 without starting a new copy.
+
+    Documents written to the old index after the copy started are not in the
+    new one. Pause indexing while this runs, or run an incremental crawl
+    after the swap.
+    """
+
+    help = "Reindex an index into a fresh one in the background, then swap aliases."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--index', help='key in settings.ES_INDICES to reindex', required=True)
+        parser.add_argument('--resume', help='Continue the last run for this index.', default=False, action='store_true')
+        parser.add_argument('--requests-per-second', help='Throttle for the reindex task.', default=None, type=float)
+        parser.add_argument('--poll-interval', help='Seconds between progress checks.', default=10, type=int)
+        parser.add_argument('--max-missing', help='Documents the new index may lack before the swap is refused.', default=0, type=int)
+        parser.add_argument('--no-swap', help='Stop after validating the new index.', default=False, action='store_true')
+        parser.add_argument('--cleanup', help='Delete the old index after swapping aliases.', default=False, action='store_true')
+        parser.add_argument('--noinput', help='Do not ask for confirmation.', default=False, action='store_true')
+
+    @staticmethod
+    def _state_key(index):
+        return 'reindex_pipeline:{}'.format(index)
+
+    def _start(self, es_client, index_config, options):
+        default_alias = index_config['alias']
+        reindex_alias = default_alias + '-reindex'
+        if not options.get('noinput'):
+            confirm = input('This will delete any documents in the index "{}" and recreate the index. Continue? (Y/n) '.format(reindex_alias))
+            if confirm != 'Y':
+                raise SystemExit
+        setup_index(index_config, force=True, reindex=True)
+        try:
+            source = list(Index(default_alias, using=es_client).get_alias().keys())[0]
+            target = list(Index(reindex_alias, using=es_client).get_alias().keys())[0]
+        except Exception:
+            raise CommandError('Unable to look up the indices behind {} and {}.'.format(default_alias, reindex_alias))
+
+        previous_settings = apply_settings(target, REINDEX_SETTINGS)
+        params = {'wait_for_completion': False, 'slices': 'auto'}
+        if options.get('requests_per_second'):
+            params['requests_per_second'] = options.get('requests_per_second')
+        res = es_client.reindex(body={'source': {'index': source}, 'dest': {'index': target}},
+                                **params)
+        state = {'task': res['task'], 'source': source, 'target': target,
+                 'settings': previous_settings}
+        self.stdout.write('Reindexing {} into {} as task {}'.format(source, target, res['task']))
+        return state
+
+    def _wait(self, es_client, task_id, poll_interval):
+        """Poll the reindex task until it completes, printing progress."""
+        last_time, last_done = time.time(), None
+        while True:
+            try:
+                res = es_client.tasks.get(task_id=task_id)
+            except (ESConnectionError, ConnectionTimeout) as exc:
+                self.stderr.write('Unable to reach the cluster ({}), retrying.'.format(exc))
+                time.sleep(poll_interval)
+                continue
+
+            status = res['task']['status']
+            done = status['created'] + status['updated'] + status['deleted'] + status['version_conflicts']
+            now = time.time()
+            rate = (done - last_done) / (now - last_time) if last_done is not None and now > last_time else 0
+            last_time, last_done = now, done
+            percent = 100.0 * done / status['total'] if status['total'] else 0
+            self.stdout.write('{}/{} docs ({:.1f}%), {:.0f} docs/s'.format(done, status['total'], percent, rate))
+
+            if res.get('completed'):
+                return res
+            time.sleep(poll_interval)
+
+    def _swap(self, es_client, index_config, state):
+        default_alias = index_config['alias']
+        reindex_alias = default_alias + '-reindex'
+        alias_body = {
+            'actions': [
+                {'remove': {'index': state['source'], 'alias': default_alias}},
+                {'remove': {'index': state['target'], 'alias': reindex_alias}},
+                {'add': {'index': state['source'], 'alias': reindex_alias}},
+                {'add': {'index': state['target'], 'alias': default_alias}},
+            ]
+        }
+        es_client.indices.update_aliases(alias_body)
+        aliases_cache.invalidate(default_alias, reindex_alias)
+
+    def handle(self, *args, **options):
+        index = options.get('index')
+        index_config = settings.ES_INDICES[index]
+        es_client = get_client()
+
+        state = cache.get(self._state_key(index)) if options.get('resume') else None
+        if options.get('resume') and not state:
+            raise CommandError('No reindex of {} to resume.'.format(index))
+        if not state:
+            state = self._start(es_client, index_config, options)
+            cache.set(self._state_key(index), state, STATE_TIMEOUT)
+
+        res = self._wait(es_client, state['task'], options.get('poll_interval'))
+        restore_settings(state['target'], state['settings'])
+        cache.delete(self._state_key(index))
+
+        failures = res.get('error') or res.get('response', {}).get('failures')
+        if failures:
+            raise CommandError('Reindex task failed: {}'.format(failures))
+
+        es_client.indices.refresh(index=state['target'])
+        source_count = es_client.count(index=state['source'])['count']
+        target_count = es_client.count(index=state['target'])['count']
+        self.stdout.write('{}: {} docs, {}: {} docs'.format(state['source'], source_count,
+                                                           state['target'], target_count))
+        if source_count - target_count > options.get('max_missing'):
+            raise CommandError('{} is missing {} docs, not swapping aliases.'.format(
+                state['target'], source_count - target_count))
+
+        if options.get('no_swap'):
+            return
+        self._swap(es_client, index_config, state)
+        self.stdout.write('{} now points to {}'.format(index_config['alias'], state['target']))
+
+        if options.get('cleanup'):
+            Index(state['source'], using=es_client).delete(ignore=404)
@@ -0,0 +1,87 @@
+"""Rekey files command"""
+import logging
+from django.core.management import BaseCommand
+from django.conf import settings
+from elasticsearch.helpers import streaming_bulk
+from designsafe.apps.data.models.elasticsearch import IndexedFile
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    This command re-keys every document in the files index so that its id is
+    derived from its system and path (see
+    :meth:`designsafe.apps.data.models.elasticsearch.IndexedFile.doc_id`).
+
+    Documents are copied in place through the files alias, so the index stays
+    online while this runs. Each legacy document is created under its new id
+    and then deleted. If a document already exists under the new id (because
+    the indexer wrote it after the new ids were introduced, or because the
+    legacy doc was a duplicate) the create is skipped and the legacy document
+    is only deleted, which also removes any duplicates.
+    """
+
+    help = "Re-key documents in the files index by system and path."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', help='Number of documents per bulk request.', default=500, type=int)
+        parser.add_argument('--dry-run', help='Only count documents that need to be re-keyed.', default=False, action='store_true')
+
+    def _rekey(self, client, batch):
+        """Create a batch of docs under their new ids, then drop the legacy
+        docs whose copy made it into the index."""
+        files_alias = settings.ES_INDICES['files']['alias']
+        creates = [{'_op_type': 'create',
+                    '_index': files_alias,
+                    '_id': doc_id,
+                    '_source': source} for legacy_id, doc_id, source in batch]
+        copied = []
+        errors = 0
+        for (legacy_id, _, _), (ok, item) in zip(batch, streaming_bulk(client, creates,
+                                                                      chunk_size=len(creates),
+                                                                      raise_on_error=False)):
+            # A 409 means the doc already exists under its new id.
+            if ok or item.get('create', {}).get('status') == 409:
+                copied.append(legacy_id)
+            else:
+                errors += 1
+                logger.error('Unable to re-key document %s: %s', legacy_id, item)
+
+        deletes = [{'_op_type': 'delete',
+                    '_index': files_alias,
+                    '_id': legacy_id} for legacy_id in copied]
+        for ok, item in streaming_bulk(client, deletes, raise_on_error=False):
+            if not ok and item.get('delete', {}).get('status') != 404:
+                errors += 1
+                logger.error('Unable to delete legacy document: %s', item)
+        return errors
+
+    def handle(self, *args, **options):
+        chunk_size = options.get('chunk_size')
+        dry_run = options.get('dry_run')
+        client = IndexedFile._get_connection()
+        stale_count = 0
+        errors = 0
+
+        batch = []
+        for hit in IndexedFile.search().scan():
+            if hit.system is None or hit.path is None:
+                continue
+            doc_id = IndexedFile.doc_id(hit.system, hit.path)
+            if hit.meta.id == doc_id:
+                continue
+            stale_count += 1
+            if dry_run:
+                continue
+            batch.append((hit.meta.id, doc_id, hit.to_dict()))
+            if len(batch) >= chunk_size:
+                errors += self._rekey(client, batch)
+                batch = []
+        if batch:
+            errors += self._rekey(client, batch)
+
+        if dry_run:
+            self.stdout.write('{} documents need to be re-keyed.'.format(stale_count))
+        else:
+            self.stdout.write('Re-keyed {} documents with {} errors.'.format(stale_count, errors))
@@ -6,6 +6,8 @@ from elasticsearch import TransportError
 from elasticsearch_dsl import Index
 from elasticsearch_dsl.connections import connections
 from designsafe.libs.elasticsearch.indices import setup_index
+from designsafe.libs.elasticsearch import aliases as aliases_cache
+from designsafe.libs.elasticsearch.client import get_client
 
 class Command(BaseCommand):
     """
@@ -29,8 +31,7 @@ class Command(BaseCommand):
         parser.add_argument('--swap-only', help='Only swap index aliases without reindexing.', default=False, action='store_true')
 
     def handle(self, *args, **options):
-        HOSTS = settings.ES_CONNECTIONS[settings.DESIGNSAFE_ENVIRONMENT]['hosts']
-        es_client = elasticsearch.Elasticsearch(HOSTS, http_auth=settings.ES_AUTH)
+        es_client = get_client()
         index = options.get('index')
         cleanup = options.get('cleanup')
         swap_only = options.get('swap-only')
@@ -68,6 +69,7 @@ class Command(BaseCommand):
         }
         # Swap the aliases of the default and reindexing aliases.
         es_client.indices.update_aliases(alias_body)
+        aliases_cache.invalidate(default_index_alias, reindex_index_alias)
 
         # Re-initialize the new reindexing index to save space.
         if cleanup:
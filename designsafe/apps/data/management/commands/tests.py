@@ -1,5 +1,5 @@
 from mock import Mock, patch, MagicMock, PropertyMock, call
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.core.management import call_command
@@ -12,14 +12,17 @@ class TestSwapReindex(TestCase):
         self.patch_setup = patch('designsafe.apps.data.management.commands.swap_reindex.setup_index')
         self.patch_connections = patch('designsafe.apps.data.management.commands.swap_reindex.connections')
         self.patch_elasticsearch = patch('designsafe.apps.data.management.commands.swap_reindex.elasticsearch')
+        self.patch_client = patch('designsafe.apps.data.management.commands.swap_reindex.get_client')
 
         self.mock_setup = self.patch_setup.start()
         self.mock_connections = self.patch_connections.start()
         self.mock_elasticsearch = self.patch_elasticsearch.start()
+        self.mock_client = self.patch_client.start()
 
         self.addCleanup(self.patch_setup.stop)
         self.addCleanup(self.patch_connections.stop)
         self.addCleanup(self.patch_elasticsearch.stop)
+        self.addCleanup(self.patch_client.stop)
 
     @patch('designsafe.apps.data.management.commands.swap_reindex.Command.handle')
     def test_working(self, mock_handle):
@@ -54,7 +57,7 @@ class TestSwapReindex(TestCase):
         opts = {'index': 'files'}
 
         mock_client = MagicMock()
-        self.mock_elasticsearch.Elasticsearch.return_value = mock_client
+        self.mock_client.return_value = mock_client
 
         call_command('swap_reindex', **opts)
 
@@ -78,7 +81,7 @@ class TestSwapReindex(TestCase):
                 {'add': {'index': 'REINDEX_NAME', 'alias': 'designsafe-dev-files'}},
             ]
         }
-        self.mock_elasticsearch.Elasticsearch().indices.update_aliases.assert_called_with(mock_alias)
+        self.mock_client().indices.update_aliases.assert_called_with(mock_alias)
 
     @patch('designsafe.apps.data.management.commands.swap_reindex.Index')
     @patch('designsafe.apps.data.management.commands.swap_reindex.input')
@@ -92,3 +95,114 @@ class TestSwapReindex(TestCase):
 
         self.assertEqual(mock_index.return_value.delete.call_count, 1)
 
+
+
+class TestRekeyFiles(TestCase):
+
+    def setUp(self):
+        self.patch_search = patch('designsafe.apps.data.management.commands.rekey_files.IndexedFile.search')
+        self.patch_conn = patch('designsafe.apps.data.management.commands.rekey_files.IndexedFile._get_connection')
+        self.patch_bulk = patch('designsafe.apps.data.management.commands.rekey_files.streaming_bulk')
+
+        self.mock_search = self.patch_search.start()
+        self.mock_conn = self.patch_conn.start()
+        self.mock_bulk = self.patch_bulk.start()
+
+        self.addCleanup(self.patch_search.stop)
+        self.addCleanup(self.patch_conn.stop)
+        self.addCleanup(self.patch_bulk.stop)
+
+    def _hit(self, doc_id, system, path):
+        hit = MagicMock(system=system, path=path)
+        hit.meta.id = doc_id
+        hit.to_dict.return_value = {'system': system, 'path': path}
+        return hit
+
+    def test_dry_run_does_not_write(self):
+        from designsafe.apps.data.models.elasticsearch import IndexedFile
+        new_id = IndexedFile.doc_id('test.system', '/path/new')
+        self.mock_search().scan.return_value = [self._hit('LEGACY_ID', 'test.system', '/path/old'),
+                                                self._hit(new_id, 'test.system', '/path/new')]
+        call_command('rekey_files', dry_run=True)
+        self.assertEqual(self.mock_bulk.call_count, 0)
+
+    def test_deletes_legacy_doc_only_after_create(self):
+        from designsafe.apps.data.models.elasticsearch import IndexedFile
+        self.mock_search().scan.return_value = [self._hit('LEGACY_1', 'test.system', '/path/1'),
+                                                self._hit('LEGACY_2', 'test.system', '/path/2')]
+        self.mock_bulk.side_effect = [
+            iter([(True, {}), (False, {'create': {'status': 500}})]),
+            iter([(True, {})])
+        ]
+        call_command('rekey_files')
+
+        creates = self.mock_bulk.call_args_list[0][0][1]
+        self.assertEqual(creates[0]['_id'], IndexedFile.doc_id('test.system', '/path/1'))
+        deletes = self.mock_bulk.call_args_list[1][0][1]
+        self.assertEqual([d['_id'] for d in deletes], ['LEGACY_1'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestReindexPipeline(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        module = 'designsafe.apps.data.management.commands.reindex_pipeline'
+        patches = {
+            'setup_index': patch('{}.setup_index'.format(module)),
+            'client': patch('{}.get_client'.format(module)),
+            'index': patch('{}.Index'.format(module)),
+            'apply_settings': patch('{}.apply_settings'.format(module)),
+            'restore_settings': patch('{}.restore_settings'.format(module)),
+            'sleep': patch('{}.time.sleep'.format(module)),
+        }
+        self.mocks = {}
+        for name, patcher in patches.items():
+            self.mocks[name] = patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(cache.clear)
+
+        self.mocks['index'].return_value.get_alias.return_value.keys.side_effect = [['DEFAULT_NAME'], ['REINDEX_NAME']]
+        self.mocks['apply_settings'].return_value = {'refresh_interval': None, 'number_of_replicas': '1'}
+        self.es_client = self.mocks['client'].return_value
+        self.es_client.reindex.return_value = {'task': 'node:1'}
+        status = {'total': 10, 'created': 10, 'updated': 0, 'deleted': 0, 'version_conflicts': 0}
+        self.es_client.tasks.get.side_effect = [
+            {'completed': False, 'task': {'status': dict(status, created=5)}},
+            {'completed': True, 'task': {'status': status}, 'response': {'failures': []}},
+        ]
+        self.es_client.count.return_value = {'count': 10}
+
+    def test_reindexes_in_background_and_swaps(self):
+        call_command('reindex_pipeline', index='files', noinput=True)
+
+        self.es_client.reindex.assert_called_with(
+            body={'source': {'index': 'DEFAULT_NAME'}, 'dest': {'index': 'REINDEX_NAME'}},
+            wait_for_completion=False, slices='auto')
+        self.mocks['apply_settings'].assert_called_with('REINDEX_NAME', {'refresh_interval': '-1',
+                                                                         'number_of_replicas': 0})
+        self.mocks['restore_settings'].assert_called_with('REINDEX_NAME', {'refresh_interval': None,
+                                                                           'number_of_replicas': '1'})
+        actions = self.es_client.indices.update_aliases.call_args[0][0]['actions']
+        self.assertIn({'add': {'index': 'REINDEX_NAME', 'alias': 'designsafe-dev-files'}}, actions)
+
+    def test_refuses_swap_on_missing_docs(self):
+        from django.core.management import CommandError
+        self.es_client.count.side_effect = [{'count': 10}, {'count': 9}]
+        with self.assertRaises(CommandError):
+            call_command('reindex_pipeline', index='files', noinput=True)
+        self.assertEqual(self.es_client.indices.update_aliases.call_count, 0)
+
+    def test_resumes_interrupted_run(self):
+        self.es_client.tasks.get.side_effect = KeyboardInterrupt
+        with self.assertRaises(KeyboardInterrupt):
+            call_command('reindex_pipeline', index='files', noinput=True)
+
+        self.es_client.tasks.get.side_effect = [
+            {'completed': True, 'task': {'status': {'total': 10, 'created': 10, 'updated': 0,
+                                                    'deleted': 0, 'version_conflicts': 0}},
+             'response': {'failures': []}}]
+        call_command('reindex_pipeline', index='files', resume=True)
+        self.assertEqual(self.es_client.reindex.call_count, 1)
+        self.es_client.tasks.get.assert_called_with(task_id='node:1')
+        self.assertEqual(self.es_client.indices.update_aliases.call_count, 1)
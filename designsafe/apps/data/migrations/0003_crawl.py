@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0002_auto_20171213_2125'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Crawl',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('system', models.CharField(max_length=255)),
+                ('root_path', models.TextField()),
+                ('update_pems', models.BooleanField(default=False)),
+                ('reindex', models.BooleanField(default=False)),
+                ('bulk', models.BooleanField(default=False)),
+                ('incremental', models.BooleanField(default=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CrawlDirectory',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.TextField()),
+                ('path_hash', models.CharField(editable=False, max_length=64)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('crawl', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='directories', to='data.Crawl')),
+            ],
+            options={
+                'verbose_name_plural': 'Crawl directories',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='crawldirectory',
+            unique_together=set([('crawl', 'path_hash')]),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0003_crawl'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('system', models.CharField(max_length=255)),
+                ('owner', models.CharField(blank=True, max_length=255)),
+                ('total_bytes', models.BigIntegerField(default=0)),
+                ('file_count', models.BigIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('reconciled', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Storage usage',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='storageusage',
+            unique_together=set([('system', 'owner')]),
+        ),
+    ]
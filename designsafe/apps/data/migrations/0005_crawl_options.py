@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0004_storageusage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crawl',
+            name='ignore_hidden',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='crawl',
+            name='paths_to_ignore',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='crawl',
+            name='refresh',
+            field=models.CharField(blank=True, max_length=16),
+        ),
+    ]
@@ -0,0 +1,2 @@
+from designsafe.apps.data.models.crawl import Crawl, CrawlDirectory
+from designsafe.apps.data.models.usage import StorageUsage
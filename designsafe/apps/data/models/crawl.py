@@ -0,0 +1,112 @@
+"""Indexer crawl models."""
+import datetime
+import hashlib
+from django.db import models, transaction
+from django.utils import timezone
+
+
+def _path_hash(path):
+    return hashlib.sha256(path.encode('utf-8')).hexdigest()
+
+
+class Crawl(models.Model):
+    """A recursive indexing run over a storage system.
+
+    The directories that still need to be indexed are persisted as
+    :class:`CrawlDirectory` rows (the crawl frontier), so a crawl can be
+    drained by a few tasks in batches and picked up again after a crash.
+    """
+    system = models.CharField(max_length=255)
+    root_path = models.TextField()
+    update_pems = models.BooleanField(default=False)
+    reindex = models.BooleanField(default=False)
+    bulk = models.BooleanField(default=False)
+    incremental = models.BooleanField(default=False)
+    ignore_hidden = models.BooleanField(default=True)
+    # Names of files and folders to skip, one per line.
+    paths_to_ignore = models.TextField(blank=True)
+    # Refresh policy of the index writes, e.g. 'wait_for'; empty for none.
+    refresh = models.CharField(max_length=16, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    def ignored_names(self):
+        """``paths_to_ignore`` as a list."""
+        return [name for name in self.paths_to_ignore.split('\n') if name]
+
+    def status(self):
+        """Number of directories in each state, e.g.
+        ``{'queued': 10, 'running': 2, 'done': 40, 'failed': 0}``."""
+        counts = dict.fromkeys([status for status, _ in CrawlDirectory.STATUS_CHOICES], 0)
+        for row in self.directories.values('status').annotate(count=models.Count('id')):
+            counts[row['status']] = row['count']
+        return counts
+
+    def __str__(self):
+        return '{}{}'.format(self.system, self.root_path)
+
+
+class CrawlDirectoryManager(models.Manager):
+    """Crawl directory manager."""
+
+    def enqueue(self, crawl, paths):
+        """Add paths to a crawl's frontier, skipping paths already in it."""
+        hashes = {_path_hash(path): path for path in paths}
+        existing = set(self.filter(crawl=crawl, path_hash__in=list(hashes))
+                       .values_list('path_hash', flat=True))
+        self.bulk_create([self.model(crawl=crawl, path=path, path_hash=path_hash)
+                          for path_hash, path in hashes.items()
+                          if path_hash not in existing])
+
+    def claim(self, crawl, batch_size, lease_seconds):
+        """Mark up to ``batch_size`` queued directories as running and return
+        them. Directories left running for longer than ``lease_seconds``
+        belong to a task that died and are claimed again."""
+        expired = timezone.now() - datetime.timedelta(seconds=lease_seconds)
+        with transaction.atomic():
+            ids = list(self.select_for_update()
+                       .filter(crawl=crawl)
+                       .filter(models.Q(status=CrawlDirectory.QUEUED) |
+                               models.Q(status=CrawlDirectory.RUNNING, updated__lt=expired))
+                       .order_by('id')
+                       .values_list('id', flat=True)[:batch_size])
+            self.filter(id__in=ids).update(status=CrawlDirectory.RUNNING,
+                                           attempts=models.F('attempts') + 1,
+                                           updated=timezone.now())
+        return list(self.filter(id__in=ids).order_by('id'))
+
+
+class CrawlDirectory(models.Model):
+    """A directory in a crawl's frontier."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    crawl = models.ForeignKey(Crawl, on_delete=models.CASCADE, related_name='directories')
+    path = models.TextField()
+    # Paths can be longer than MySQL allows in an index, so uniqueness is
+    # enforced on a hash of the path.
+    path_hash = models.CharField(max_length=64, editable=False)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    updated = models.DateTimeField(auto_now=True)
+    objects = CrawlDirectoryManager()
+
+    class Meta:
+        unique_together = ('crawl', 'path_hash')
+        verbose_name_plural = 'Crawl directories'
+
+    def save(self, *args, **kwargs):
+        self.path_hash = _path_hash(self.path)
+        return super(CrawlDirectory, self).save(*args, **kwargs)
+
+    def __str__(self):
+        return self.path
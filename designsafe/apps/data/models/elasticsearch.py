@@ -1,17 +1,19 @@
 
 from future.utils import python_2_unicode_compatible
+import hashlib
 import logging
 import json
 from django.conf import settings
 from django.db import models
 from elasticsearch_dsl.connections import connections
 from elasticsearch_dsl import (Search, Document, Date, Nested,
-                               analyzer, Object, Text, Long,
+                               analyzer, Object, Text, Long, Integer,
                                Boolean, Keyword,
-                               GeoPoint, MetaField, Index)
+                               GeoPoint, MetaField)
 from elasticsearch_dsl.query import Q
 from elasticsearch import TransportError, ConnectionTimeout
-from designsafe.libs.elasticsearch.analyzers import path_analyzer, file_analyzer, file_pattern_analyzer, reverse_file_analyzer
+from designsafe.libs.elasticsearch.analyzers import (path_analyzer, file_analyzer, file_pattern_analyzer, reverse_file_analyzer,
+                                                     file_suggest_analyzer, file_suggest_search_analyzer)
 from designsafe.libs.elasticsearch.exceptions import DocumentNotFound
 
 #pylint: disable=invalid-name
@@ -23,12 +25,15 @@ class IndexedFile(Document):
     name = Text(analyzer=file_analyzer, fields={
         '_exact': Keyword(),
         '_pattern': Text(analyzer=file_pattern_analyzer),
-        '_reverse': Text(analyzer=reverse_file_analyzer)
+        '_reverse': Text(analyzer=reverse_file_analyzer),
+        '_suggest': Text(analyzer=file_suggest_analyzer, search_analyzer=file_suggest_search_analyzer)
     })
     path = Text(fields={
         '_exact': Keyword(),
         '_path': Text(analyzer=path_analyzer)
     })
+    # Number of components in ``path``; ``/`` is 0 and ``/a/b`` is 2.
+    depth = Integer()
     lastModified = Date()
     length = Long()
     format = Text()
@@ -49,27 +54,90 @@ class IndexedFile(Document):
             'execute': Boolean()
         })
     })
+    # Usernames that can read the file, including WORLD, flattened from
+    # ``permissions`` so permission filters do not need a nested query.
+    readers = Keyword(multi=True)
+
+    @classmethod
+    def pems_filter(cls, username):
+        """Filter on the docs ``username`` can read."""
+        return Q('terms', readers=[username, 'WORLD'])
+
+    @staticmethod
+    def readers_of(permissions):
+        """Usernames granted read access in a list of permissions."""
+        return sorted(set(pem['username'] for pem in permissions or []
+                          if pem.get('username') and
+                          (pem.get('permission') or {}).get('read', True)))
+
+    @staticmethod
+    def doc_id(system, path):
+        """Stable document id for a system/path pair.
+
+        Paths are normalized to a single leading slash so ``a/b`` and
+        ``/a/b/`` map to the same document.
+        """
+        path = '/' + path.strip('/')
+        return hashlib.sha256(
+            '{}{}'.format(system, path).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def path_depth(path):
+        """Number of components in a path, stored as ``depth``."""
+        path = path.strip('/')
+        return len(path.split('/')) if path else 0
+
+    @classmethod
+    def subtree_query(cls, path, include_root=True):
+        """Query matching the docs at ``path`` and everything below it.
+
+        Matches on the ``path._path`` hierarchy tokens instead of a prefix,
+        so ``/a/b`` does not match ``/a/bc``. With ``include_root=False``
+        the doc at ``path`` itself is left out using ``depth``.
+        """
+        path = '/' + path.strip('/')
+        if path == '/':
+            query = Q('match_all')
+        else:
+            query = Q('term', **{'path._path': path})
+        if not include_root:
+            query &= Q('range', depth={'gt': cls.path_depth(path)})
+        return query
 
     @classmethod
-    def _pems_filter(self):
-        term_username_query = Q(
-            'term',
-            **{'permissions.username': self.username}
-        )
-        term_world_query = Q(
-            'term',
-            **{'permissions.username': 'WORLD'}
-        )
-        bool_query = Q('bool')
-        bool_query.should = [term_username_query, term_world_query]
-        nested_query = Q('nested')
-        nested_query.path = 'permissions'
-        nested_query.query = bool_query
-        return nested_query
+    def suggest(cls, system, path, prefix, limit=10):
+        """Search for the files under ``path`` whose name has words starting
+        with the words of ``prefix``, for typeahead.
+
+        The match is a filter on the edge n-grams in ``name._suggest``, so no
+        scores are computed; names are returned in alphabetical order.
+
+        :rtype: :class:`elasticsearch_dsl.Search`
+        """
+        search = cls.search()
+        search = search.filter('match', **{'name._suggest': {'query': prefix, 'operator': 'and'}})
+        search = search.filter('term', **{'system._exact': system})
+        search = search.filter(cls.subtree_query(path, include_root=False))
+        search = search.sort('name._exact', 'path._exact')
+        search = search.source(['name', 'path', 'system', 'type'])
+        return search.extra(size=int(limit), track_total_hits=False)
 
     @classmethod
     def from_path(cls, system, path):
-        Index(settings.ES_INDICES['files']['alias']).refresh()
+        doc = cls.get(cls.doc_id(system, path), ignore=404)
+        if doc is not None:
+            return doc
+        return cls._from_path_legacy(system, path)
+
+    @classmethod
+    def _from_path_legacy(cls, system, path):
+        """Look up a doc indexed before ids were derived from system/path.
+
+        This can go away once every index has been re-keyed with the
+        ``rekey_files`` management command. New docs are always written under
+        their derived id and fetched with a realtime GET, so legacy docs are
+        never fresh enough to need an index refresh before searching.
+        """
         search = cls.search()
         sys_filter = Q('term', **{'system._exact': system})
         path_filter = Q('term', **{'path._exact': path})
@@ -90,10 +158,81 @@ class IndexedFile(Document):
             raise DocumentNotFound("No document found for "
                                    "{}/{}".format(system, path))
 
+    def save(self, **kwargs):
+        """Save the doc under the id derived from its system and path.
+
+        Docs loaded with a legacy id are re-keyed: the doc is written under
+        the new id and the legacy doc is deleted.
+        """
+        if self.path:
+            self.depth = self.path_depth(self.path)
+        # Checked on the raw data so a cleared ACL (``[]``) clears readers too.
+        if self._d_.get('permissions') is not None:
+            self.readers = self.readers_of(self.to_dict().get('permissions'))
+        if self.system and self.path:
+            doc_id = self.doc_id(self.system, self.path)
+            legacy_id = getattr(self.meta, 'id', None)
+            self.meta.id = doc_id
+            res = super(IndexedFile, self).save(**kwargs)
+            if legacy_id and legacy_id != doc_id:
+                self._get_connection().delete(index=self._get_index(),
+                                              id=legacy_id,
+                                              ignore=404)
+            return res
+        return super(IndexedFile, self).save(**kwargs)
+
+    @classmethod
+    def delete_subtrees(cls, system, paths, chunk_size=1000):
+        """Delete the docs at each path and everything below them.
+
+        Uses one ``delete_by_query`` per ``chunk_size`` paths, matching on
+        the ``path._path`` hierarchy tokens. The storage usage of the deleted
+        files is subtracted from their owners' rollups.
+        """
+        from designsafe.apps.data.models.usage import StorageUsage
+        paths = list(paths)
+        owner_paths = {}
+        for path in paths:
+            owner = StorageUsage.owner_of(system, path)
+            if owner is not None:
+                owner_paths.setdefault(owner, []).append(path)
+        deltas = {}
+        for owner, subtrees in owner_paths.items():
+            total_bytes, file_count = cls.subtree_usage(system, subtrees)
+            deltas[owner] = (-total_bytes, -file_count)
+
+        StorageUsage.objects.record(system, deltas)
+
+        for i in range(0, len(paths), chunk_size):
+            search = cls.search()
+            search = search.filter('term', **{'system._exact': system})
+            search = search.filter('terms', **{'path._path': paths[i:i + chunk_size]})
+            search.params(slices='auto', conflicts='proceed').delete()
+
+    @classmethod
+    def subtree_usage(cls, system, paths=None):
+        """Total length and number of the files at or below ``paths``.
+
+        Folders are not counted. Without ``paths`` every file in ``system``
+        is counted.
+
+        :returns: ``(bytes, files)``
+        :rtype: tuple
+        """
+        search = cls.search()
+        search = search.filter('term', **{'system._exact': system})
+        if paths is not None:
+            search = search.filter('terms', **{'path._path': list(paths)})
+        search = search.exclude('term', format='folder')
+        search = search.extra(size=0, track_total_hits=True)
+        search.aggs.metric('total_bytes', 'sum', field='length')
+        res = search.execute()
+        return int(res.aggregations.total_bytes.value or 0), res.hits.total.value
+
     @classmethod
     def children(cls, username, system, path, limit=100, search_after=None):
         search = cls.search()
-        # search = search.filter(cls._pems_filter(username))
+        # search = search.filter(cls.pems_filter(username))
         search = search.filter('term', **{'basePath._exact': path})
         search = search.filter('term', **{'system._exact': system})
         search = search.sort('_id')
@@ -0,0 +1,87 @@
+"""Storage usage models."""
+from django.conf import settings
+from django.db import models, IntegrityError, transaction
+
+
+class StorageUsageManager(models.Manager):
+    """Storage usage manager."""
+
+    def record(self, system, deltas):
+        """Add byte and file count deltas to the rollups of a system.
+
+        A missing row is created from the owner's files in the index plus
+        the delta, since the owner may have been indexed before rollups
+        existed. Call this before the change is written to the index so
+        that it is not counted twice.
+
+        :param str system: system id.
+        :param dict deltas: ``{owner: (bytes, files)}``.
+        """
+        from designsafe.apps.data.models.elasticsearch import IndexedFile
+        for owner, (total_bytes, file_count) in deltas.items():
+            if not total_bytes and not file_count:
+                continue
+            updated = self.filter(system=system, owner=owner).update(
+                total_bytes=models.F('total_bytes') + total_bytes,
+                file_count=models.F('file_count') + file_count)
+            if updated:
+                continue
+            indexed_bytes, indexed_files = IndexedFile.subtree_usage(
+                system, ['/' + owner] if owner else None)
+            try:
+                with transaction.atomic():
+                    self.create(system=system, owner=owner,
+                                total_bytes=indexed_bytes + total_bytes,
+                                file_count=indexed_files + file_count)
+            except IntegrityError:
+                # Created by a concurrent indexer since the update above.
+                self.filter(system=system, owner=owner).update(
+                    total_bytes=models.F('total_bytes') + total_bytes,
+                    file_count=models.F('file_count') + file_count)
+
+
+class StorageUsage(models.Model):
+    """Bytes and files stored by one owner of a storage system.
+
+    Usage is tracked for the shared storage system, where the owner is the
+    user whose home directory holds the files, and for project systems,
+    which belong to a single project and use ``''`` as the owner. Rows
+    are updated from the indexer's deltas and overwritten by
+    :func:`designsafe.apps.data.tasks.reconcile_storage_usage`.
+    """
+    system = models.CharField(max_length=255)
+    owner = models.CharField(max_length=255, blank=True)
+    total_bytes = models.BigIntegerField(default=0)
+    file_count = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+    reconciled = models.DateTimeField(null=True, blank=True)
+    objects = StorageUsageManager()
+
+    class Meta:
+        unique_together = ('system', 'owner')
+        verbose_name_plural = 'Storage usage'
+
+    @staticmethod
+    def owner_of(system, path):
+        """Owner the usage of ``path`` on ``system`` is rolled up to.
+
+        :returns: the owner, or ``None`` if usage is not tracked for
+            ``system``.
+        """
+        if system == settings.AGAVE_STORAGE_SYSTEM:
+            return path.strip('/').split('/')[0] or None
+        if system.startswith('project-'):
+            return ''
+        return None
+
+    def to_dict(self):
+        """To Dict."""
+        return {
+            'system': self.system,
+            'owner': self.owner,
+            'total_storage_bytes': self.total_bytes,
+            'file_count': self.file_count,
+        }
+
+    def __str__(self):
+        return '{}/{}'.format(self.system, self.owner)
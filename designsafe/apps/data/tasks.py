@@ -1,13 +1,102 @@
+import datetime
+import hashlib
 import logging
+import os
+from contextlib import ExitStack
 from celery import shared_task
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
 from designsafe.apps.api.agave import get_service_account_client
 
 logger = logging.getLogger(__name__)
 
 
+def _pending_index_key(systemId, filePath, recurse):
+    """Cache key marking an indexing request for a path as pending."""
+    digest = hashlib.sha256('{}/{}'.format(systemId, filePath.strip('/')).encode('utf-8')).hexdigest()
+    return 'agave_indexer:pending:{}:{}'.format('recursive' if recurse else 'level', digest)
+
+
+def _ancestors(filePath):
+    """Yield ``filePath`` and every parent path up to ``/``."""
+    path = '/' + filePath.strip('/')
+    while True:
+        yield path
+        if path == '/':
+            break
+        path = os.path.dirname(path)
+
+
+def _bulk_load_options():
+    """Files index alias and bulk load settings for crawls."""
+    return settings.ES_INDICES['files']['alias'], settings.INDEXER_CRAWL_BULK_LOAD
+
+
+def _bulk_load(enabled):
+    """Bulk load mode on the files index if ``enabled``, with the settings
+    in ``settings.INDEXER_CRAWL_BULK_LOAD``."""
+    from designsafe.libs.elasticsearch.indices import bulk_load
+    stack = ExitStack()
+    if enabled:
+        alias, options = _bulk_load_options()
+        stack.enter_context(bulk_load(alias, **options))
+    return stack
+
+
+def _finish_crawl(crawl):
+    """Mark a crawl finished and, for bulk crawls, leave the bulk load mode
+    entered by :func:`start_crawl`. Only the first caller for a crawl does
+    either.
+
+    :returns: whether this call finished the crawl.
+    """
+    from designsafe.apps.data.models import Crawl
+    from designsafe.libs.elasticsearch.indices import leave_bulk_load
+    finished = timezone.now()
+    if not Crawl.objects.filter(id=crawl.id, finished__isnull=True).update(finished=finished):
+        return False
+    crawl.finished = finished
+    if crawl.bulk:
+        leave_bulk_load(_bulk_load_options()[0])
+    return True
+
+
+def schedule_agave_indexer(systemId, filePath='/', recurse=True, **kwargs):
+    """Queue an :func:`agave_indexer` task, coalescing duplicate requests.
+
+    Each request marks its (system, path, recurse) as pending in the cache
+    and is queued with a countdown of ``settings.INDEXER_DEBOUNCE_SECONDS``.
+    Until that task starts, further requests for the same path, and any
+    request under a path with a pending recursive reindex, are dropped.
+
+    Extra kwargs are passed on to :func:`agave_indexer`.
+
+    :returns: the queued task's ``AsyncResult``, or ``None`` if the request
+        was coalesced into a pending one.
+    """
+    filePath = '/' + filePath.strip('/')
+    pending_keys = [_pending_index_key(systemId, path, True)
+                    for path in _ancestors(filePath)]
+    if not recurse:
+        pending_keys.append(_pending_index_key(systemId, filePath, False))
+    if cache.get_many(pending_keys):
+        return None
+
+    debounce = settings.INDEXER_DEBOUNCE_SECONDS
+    key = _pending_index_key(systemId, filePath, recurse)
+    # If the cache is unreachable add() fails without the key being set; in
+    # that case queue the task anyway instead of dropping it.
+    if not cache.add(key, True, timeout=debounce * 10) and cache.get(key):
+        return None
+
+    task_kwargs = dict(kwargs, systemId=systemId, filePath=filePath, recurse=recurse)
+    return agave_indexer.apply_async(kwargs=task_kwargs, countdown=debounce, queue='indexing')
+
+
 @shared_task(bind=True, max_retries=3, retry_backoff=True, rate_limit="1/s")
-def agave_indexer(self, systemId, filePath='/', username=None, recurse=True, update_pems=False, ignore_hidden=True, reindex=False, paths_to_ignore=[]):
+def agave_indexer(self, systemId, filePath='/', username=None, recurse=True, update_pems=False, ignore_hidden=True, reindex=False, paths_to_ignore=[], bulk=False, refresh=False, incremental=False):
     from designsafe.libs.elasticsearch.utils import index_level
     from designsafe.libs.elasticsearch.utils import walk_levels
 
@@ -20,17 +109,207 @@ def agave_indexer(self, systemId, filePath='/', username=None, recurse=True, upd
     if not filePath.startswith('/'):
         filePath = '/' + filePath
 
+    # Requests made from now on need a new task to see their changes.
+    cache.delete(_pending_index_key(systemId, filePath, recurse))
+
     try:
         filePath, folders, files = next(walk_levels(client, systemId, filePath, ignore_hidden=ignore_hidden, paths_to_ignore=paths_to_ignore))
     except Exception as exc:
         logger.debug(exc)
         raise self.retry(exc=exc)
 
-    index_level(client, filePath, folders, files, systemId, pems_username, update_pems=update_pems, reindex=reindex)
-    if recurse:
-        for child in folders:
-            self.apply_async(args=[systemId],
-                             kwargs={'filePath': child.path,
-                                     'reindex': reindex,
-                                     'update_pems': update_pems},
-                             queue='indexing')
+    skip_unchanged_folders = incremental and systemId in settings.INDEXER_FOLDER_FINGERPRINT_SYSTEMS
+    # The crawl started below enters the bulk load mode before this task
+    # leaves it, so the settings stay relaxed from here to the end of it.
+    with _bulk_load(bulk):
+        index_level(client, filePath, folders, files, systemId, pems_username, update_pems=update_pems, reindex=reindex, bulk=bulk, refresh=refresh,
+                    incremental=incremental, skip_unchanged_folders=skip_unchanged_folders)
+        if recurse and folders:
+            start_crawl(systemId, filePath, paths=[child.path for child in folders],
+                        update_pems=update_pems, reindex=reindex, bulk=bulk, incremental=incremental,
+                        ignore_hidden=ignore_hidden, paths_to_ignore=paths_to_ignore, refresh=refresh)
+
+
+def start_crawl(systemId, filePath='/', paths=None, workers=1, **options):
+    """Start a recursive crawl of ``filePath``.
+
+    The crawl frontier starts with ``paths`` (``[filePath]`` by default) and
+    is drained by ``workers`` :func:`crawl_frontier` tasks.
+
+    Extra kwargs (``update_pems``, ``reindex``, ``bulk``, ``incremental``,
+    ``ignore_hidden``, ``paths_to_ignore``, ``refresh``) are stored on the
+    :class:`~designsafe.apps.data.models.Crawl` and apply to every
+    directory in it. A ``bulk`` crawl puts the files index in bulk load
+    mode until it finishes.
+
+    :returns: the new ``Crawl``.
+    """
+    from designsafe.apps.data.models import Crawl, CrawlDirectory
+    from designsafe.libs.elasticsearch.indices import enter_bulk_load, leave_bulk_load
+    filePath = '/' + filePath.strip('/')
+    if 'paths_to_ignore' in options:
+        options['paths_to_ignore'] = '\n'.join(options['paths_to_ignore'] or [])
+    if 'refresh' in options:
+        refresh = options['refresh']
+        options['refresh'] = 'true' if refresh is True else (refresh or '')
+    alias, bulk_options = _bulk_load_options()
+    if options.get('bulk') and not enter_bulk_load(alias, **bulk_options):
+        # No holder could be counted, so nothing would leave the mode.
+        options['bulk'] = False
+    try:
+        with transaction.atomic():
+            crawl = Crawl.objects.create(system=systemId, root_path=filePath, **options)
+            CrawlDirectory.objects.enqueue(crawl, paths or [filePath])
+    except Exception:
+        if options.get('bulk'):
+            leave_bulk_load(alias)
+        raise
+    for _ in range(workers):
+        crawl_frontier.apply_async(args=[crawl.id], queue='indexing')
+    return crawl
+
+
+def resume_crawl(crawl_id, workers=1):
+    """Requeue the directories a crawl left running and restart its tasks."""
+    from designsafe.apps.data.models import Crawl, CrawlDirectory
+    from designsafe.libs.elasticsearch.indices import enter_bulk_load, leave_bulk_load
+    crawl = Crawl.objects.get(id=crawl_id)
+    crawl.directories.filter(status=CrawlDirectory.RUNNING).update(status=CrawlDirectory.QUEUED)
+    # A finished bulk crawl left the bulk load mode and enters it again.
+    alias, bulk_options = _bulk_load_options()
+    reenter = crawl.bulk and crawl.finished is not None
+    if reenter and not enter_bulk_load(alias, **bulk_options):
+        Crawl.objects.filter(id=crawl.id).update(bulk=False)
+        crawl.bulk = reenter = False
+    reopened = Crawl.objects.filter(id=crawl.id, finished__isnull=False).update(finished=None)
+    if reenter and not reopened:
+        leave_bulk_load(alias)
+    crawl.finished = None
+    for _ in range(workers):
+        crawl_frontier.apply_async(args=[crawl.id], queue='indexing')
+    return crawl
+
+
+@shared_task(bind=True)
+def crawl_frontier(self, crawl_id, batch_size=None):
+    """Index a batch of directories from a crawl's frontier.
+
+    Each directory's child folders are added to the frontier in the same
+    transaction that marks it done. The task queues itself again while
+    there are directories left, and marks the crawl finished once none are
+    queued or running. A directory that fails is retried by a later batch
+    until it has been attempted ``settings.INDEXER_CRAWL_MAX_ATTEMPTS``
+    times; after a batch with failures the next one is delayed by
+    ``2 ** attempts`` seconds, up to
+    ``settings.INDEXER_CRAWL_RETRY_BACKOFF_MAX``. Directories claimed by a task that died are claimed again after
+    ``settings.INDEXER_CRAWL_LEASE_SECONDS``, or right away with
+    :func:`resume_crawl`.
+    """
+    from designsafe.apps.data.models import Crawl, CrawlDirectory
+    from designsafe.libs.elasticsearch.utils import index_level
+    from designsafe.libs.elasticsearch.utils import walk_levels
+
+    crawl = Crawl.objects.get(id=crawl_id)
+    batch = CrawlDirectory.objects.claim(crawl, batch_size or settings.INDEXER_CRAWL_BATCH_SIZE,
+                                         settings.INDEXER_CRAWL_LEASE_SECONDS)
+    client = get_service_account_client() if batch else None
+    skip_unchanged_folders = crawl.incremental and crawl.system in settings.INDEXER_FOLDER_FINGERPRINT_SYSTEMS
+
+    failed_attempts = 0
+    for directory in batch:
+        try:
+            filePath, folders, files = next(walk_levels(client, crawl.system, directory.path,
+                                                        ignore_hidden=crawl.ignore_hidden,
+                                                        paths_to_ignore=crawl.ignored_names()))
+            index_level(client, filePath, folders, files, crawl.system, 'ds_admin',
+                        update_pems=crawl.update_pems, reindex=crawl.reindex, bulk=crawl.bulk,
+                        refresh=crawl.refresh or False, incremental=crawl.incremental,
+                        skip_unchanged_folders=skip_unchanged_folders)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.exception('Unable to index %s%s', crawl.system, directory.path)
+            if directory.attempts >= settings.INDEXER_CRAWL_MAX_ATTEMPTS:
+                directory.status = CrawlDirectory.FAILED
+            else:
+                directory.status = CrawlDirectory.QUEUED
+                failed_attempts = max(failed_attempts, directory.attempts)
+            directory.error = str(exc)
+            directory.save()
+            continue
+
+        with transaction.atomic():
+            CrawlDirectory.objects.enqueue(crawl, [child.path for child in folders])
+            directory.status = CrawlDirectory.DONE
+            directory.error = ''
+            directory.save()
+
+    if crawl.directories.filter(status=CrawlDirectory.QUEUED).exists():
+        # Back off while listings or writes fail, so a struggling backend
+        # gets time to recover before the directories are tried again.
+        countdown = (min(2 ** failed_attempts, settings.INDEXER_CRAWL_RETRY_BACKOFF_MAX)
+                     if failed_attempts else None)
+        self.apply_async(args=[crawl_id], kwargs={'batch_size': batch_size}, queue='indexing',
+                         countdown=countdown)
+    elif not crawl.directories.filter(status=CrawlDirectory.RUNNING).exists():
+        if _finish_crawl(crawl):
+            logger.info('Crawl of %s finished: %s', crawl, crawl.status())
+
+
+@shared_task(bind=True)
+def finish_abandoned_crawls(self):
+    """Mark crawls finished when none of their directories was claimed or
+    indexed for ``settings.INDEXER_CRAWL_ABANDON_SECONDS``, e.g. because
+    the tasks draining them were lost. This also ends their bulk load
+    mode. They can still be picked up again with :func:`resume_crawl`.
+    """
+    from django.db.models import Max, Q
+    from designsafe.apps.data.models import Crawl
+    cutoff = timezone.now() - datetime.timedelta(seconds=settings.INDEXER_CRAWL_ABANDON_SECONDS)
+    crawls = (Crawl.objects.filter(finished__isnull=True, created__lt=cutoff)
+              .annotate(last_update=Max('directories__updated'))
+              .filter(Q(last_update__lt=cutoff) | Q(last_update__isnull=True)))
+    for crawl in crawls:
+        if _finish_crawl(crawl):
+            logger.warning('Crawl of %s abandoned: %s', crawl, crawl.status())
+
+
+@shared_task(bind=True)
+def prune_crawls(self):
+    """Delete crawls that finished more than
+    ``settings.INDEXER_CRAWL_RETENTION_DAYS`` days ago, with their
+    directories."""
+    from designsafe.apps.data.models import Crawl
+    cutoff = timezone.now() - datetime.timedelta(days=settings.INDEXER_CRAWL_RETENTION_DAYS)
+    deleted, _ = Crawl.objects.filter(finished__lt=cutoff).delete()
+    logger.info('Deleted %s finished crawl rows', deleted)
+
+
+@shared_task(bind=True)
+def reconcile_storage_usage(self, system=None):
+    """Recompute the storage usage rollups from the files index.
+
+    The indexer keeps :class:`~designsafe.apps.data.models.StorageUsage`
+    rows up to date with deltas, which drift when a bulk write fails or two
+    indexers race on the same level. Each row is overwritten with the total
+    of its owner's files in the index.
+
+    :param str system: only reconcile the rows of this system.
+    """
+    from designsafe.apps.data.models import StorageUsage
+    from designsafe.apps.data.models.elasticsearch import IndexedFile
+
+    rows = StorageUsage.objects.all()
+    if system:
+        rows = rows.filter(system=system)
+    for usage in rows.iterator():
+        paths = ['/' + usage.owner] if usage.owner else None
+        try:
+            total_bytes, file_count = IndexedFile.subtree_usage(usage.system, paths)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Unable to reconcile storage usage of %s', usage)
+            continue
+        if (total_bytes, file_count) != (usage.total_bytes, usage.file_count):
+            logger.info('Storage usage of %s drifted: %s bytes, %s files',
+                        usage, usage.total_bytes - total_bytes, usage.file_count - file_count)
+        StorageUsage.objects.filter(id=usage.id).update(total_bytes=total_bytes,
+                                                        file_count=file_count,
+                                                        reconciled=timezone.now())
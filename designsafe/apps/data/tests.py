@@ -0,0 +1,233 @@
+from mock import patch, MagicMock
+from django.test import TestCase, override_settings
+from django.conf import settings
+from django.core.cache import cache
+from designsafe.apps.data.models import Crawl, CrawlDirectory, StorageUsage
+from designsafe.apps.data.tasks import (schedule_agave_indexer, start_crawl, crawl_frontier,
+                                        resume_crawl, reconcile_storage_usage)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestScheduleAgaveIndexer(TestCase):
+
+    def setUp(self):
+        self.patch_apply = patch('designsafe.apps.data.tasks.agave_indexer.apply_async')
+        self.mock_apply = self.patch_apply.start()
+        self.addCleanup(self.patch_apply.stop)
+        self.addCleanup(cache.clear)
+
+    def test_queues_with_debounce(self):
+        schedule_agave_indexer('test.system', 'path/to/dir', recurse=False, username='ds_admin')
+        self.mock_apply.assert_called_with(kwargs={'systemId': 'test.system',
+                                                   'filePath': '/path/to/dir',
+                                                   'recurse': False,
+                                                   'username': 'ds_admin'},
+                                           countdown=5, queue='indexing')
+
+    def test_duplicate_requests_are_coalesced(self):
+        for _ in range(3):
+            schedule_agave_indexer('test.system', '/path/to/dir', recurse=False)
+        self.assertEqual(self.mock_apply.call_count, 1)
+
+    def test_recursive_request_subsumes_nested_requests(self):
+        schedule_agave_indexer('test.system', '/path', recurse=True)
+        schedule_agave_indexer('test.system', '/path/to/dir', recurse=False)
+        schedule_agave_indexer('test.system', '/path/to', recurse=True)
+        self.assertEqual(self.mock_apply.call_count, 1)
+
+    def test_other_paths_are_not_coalesced(self):
+        schedule_agave_indexer('test.system', '/path/to/dir', recurse=False)
+        schedule_agave_indexer('test.system', '/path/to', recurse=False)
+        schedule_agave_indexer('other.system', '/path/to/dir', recurse=False)
+        schedule_agave_indexer('test.system', '/path/to/dir', recurse=True)
+        self.assertEqual(self.mock_apply.call_count, 4)
+
+
+class TestCrawlFrontier(TestCase):
+
+    TREE = {
+        '/root': ['/root/a', '/root/b'],
+        '/root/a': ['/root/a/c'],
+        '/root/a/c': [],
+        '/root/b': [],
+    }
+
+    def setUp(self):
+        self.patch_apply = patch('designsafe.apps.data.tasks.crawl_frontier.apply_async')
+        self.patch_client = patch('designsafe.apps.data.tasks.get_service_account_client')
+        self.patch_walk = patch('designsafe.libs.elasticsearch.utils.walk_levels')
+        self.patch_index = patch('designsafe.libs.elasticsearch.utils.index_level')
+        self.patch_enter_bulk_load = patch('designsafe.libs.elasticsearch.indices.enter_bulk_load')
+        self.patch_leave_bulk_load = patch('designsafe.libs.elasticsearch.indices.leave_bulk_load')
+
+        self.mock_apply = self.patch_apply.start()
+        self.mock_client = self.patch_client.start()
+        self.mock_walk = self.patch_walk.start()
+        self.mock_index = self.patch_index.start()
+        self.mock_enter_bulk_load = self.patch_enter_bulk_load.start()
+        self.mock_leave_bulk_load = self.patch_leave_bulk_load.start()
+
+        self.addCleanup(self.patch_apply.stop)
+        self.addCleanup(self.patch_client.stop)
+        self.addCleanup(self.patch_walk.stop)
+        self.addCleanup(self.patch_index.stop)
+        self.addCleanup(self.patch_enter_bulk_load.stop)
+        self.addCleanup(self.patch_leave_bulk_load.stop)
+
+        self.mock_walk.side_effect = lambda client, system, path, **kwargs: iter(
+            [(path, [MagicMock(path=child) for child in self.TREE[path]], [])])
+
+    def test_drains_frontier_in_batches(self):
+        crawl = start_crawl('test.system', '/root', bulk=True)
+        self.assertEqual(crawl.status(), {'queued': 1, 'running': 0, 'done': 0, 'failed': 0})
+
+        crawl_frontier(crawl.id, batch_size=2)
+        self.assertEqual(crawl.status(), {'queued': 2, 'running': 0, 'done': 1, 'failed': 0})
+        crawl_frontier(crawl.id, batch_size=2)
+        self.assertEqual(crawl.status(), {'queued': 1, 'running': 0, 'done': 3, 'failed': 0})
+        crawl_frontier(crawl.id, batch_size=2)
+        self.assertEqual(crawl.status(), {'queued': 0, 'running': 0, 'done': 4, 'failed': 0})
+
+        # One task to start the crawl, then one per batch while work remains.
+        self.assertEqual(self.mock_apply.call_count, 3)
+        self.assertEqual(self.mock_index.call_count, 4)
+        self.assertTrue(self.mock_index.call_args[1]['bulk'])
+        self.assertIsNotNone(Crawl.objects.get(id=crawl.id).finished)
+        # The whole crawl runs in one bulk load mode.
+        self.mock_enter_bulk_load.assert_called_once_with('designsafe-dev-files',
+                                                          **settings.INDEXER_CRAWL_BULK_LOAD)
+        self.mock_leave_bulk_load.assert_called_once_with('designsafe-dev-files')
+
+    @override_settings(INDEXER_CRAWL_MAX_ATTEMPTS=2)
+    def test_failed_directories_are_retried_then_marked_failed(self):
+        self.mock_walk.side_effect = Exception('listing failed')
+        crawl = start_crawl('test.system', '/root')
+
+        crawl_frontier(crawl.id)
+        self.assertEqual(crawl.status()['queued'], 1)
+        # The retry is delayed instead of queued right away.
+        self.assertEqual(self.mock_apply.call_args[1]['countdown'], 2)
+        crawl_frontier(crawl.id)
+        self.assertEqual(crawl.status()['failed'], 1)
+        self.assertEqual(crawl.directories.get().error, 'listing failed')
+        self.assertEqual(self.mock_enter_bulk_load.call_count, 0)
+        self.assertEqual(self.mock_leave_bulk_load.call_count, 0)
+
+    @override_settings(INDEXER_CRAWL_MAX_ATTEMPTS=20, INDEXER_CRAWL_RETRY_BACKOFF_MAX=60)
+    def test_retry_delay_grows_up_to_the_cap(self):
+        self.mock_walk.side_effect = Exception('listing failed')
+        crawl = start_crawl('test.system', '/root')
+        countdowns = []
+        for _ in range(7):
+            crawl_frontier(crawl.id)
+            countdowns.append(self.mock_apply.call_args[1]['countdown'])
+        self.assertEqual(countdowns, [2, 4, 8, 16, 32, 60, 60])
+
+    def test_listing_options_apply_to_every_directory(self):
+        crawl = start_crawl('test.system', '/root', paths_to_ignore=['Trash'], refresh=True)
+        self.assertTrue(crawl.ignore_hidden)
+        crawl_frontier(crawl.id)
+        self.mock_walk.assert_called_with(self.mock_client(), 'test.system', '/root',
+                                          ignore_hidden=True, paths_to_ignore=['Trash'])
+        self.assertEqual(self.mock_index.call_args[1]['refresh'], 'true')
+
+    def test_prune_crawls(self):
+        import datetime
+        from django.utils import timezone
+        from designsafe.apps.data.tasks import prune_crawls
+        old = start_crawl('test.system', '/old')
+        Crawl.objects.filter(id=old.id).update(finished=timezone.now() - datetime.timedelta(days=30))
+        recent = start_crawl('test.system', '/recent')
+        Crawl.objects.filter(id=recent.id).update(finished=timezone.now())
+        running = start_crawl('test.system', '/running')
+
+        prune_crawls()
+        self.assertEqual(set(Crawl.objects.values_list('id', flat=True)), {recent.id, running.id})
+        self.assertFalse(CrawlDirectory.objects.filter(crawl_id=old.id).exists())
+
+    @override_settings(INDEXER_CRAWL_ABANDON_SECONDS=3600)
+    def test_abandoned_crawls_leave_bulk_load_mode(self):
+        import datetime
+        from django.utils import timezone
+        from designsafe.apps.data.tasks import finish_abandoned_crawls
+        stale = timezone.now() - datetime.timedelta(hours=2)
+        abandoned = start_crawl('test.system', '/abandoned', bulk=True)
+        Crawl.objects.filter(id=abandoned.id).update(created=stale)
+        CrawlDirectory.objects.filter(crawl=abandoned).update(updated=stale)
+        active = start_crawl('test.system', '/active', bulk=True)
+
+        finish_abandoned_crawls()
+        finish_abandoned_crawls()
+        self.assertIsNotNone(Crawl.objects.get(id=abandoned.id).finished)
+        self.assertIsNone(Crawl.objects.get(id=active.id).finished)
+        self.mock_leave_bulk_load.assert_called_once_with('designsafe-dev-files')
+
+        resume_crawl(abandoned.id)
+        self.assertEqual(self.mock_enter_bulk_load.call_count, 3)
+        self.assertIsNone(Crawl.objects.get(id=abandoned.id).finished)
+
+    def test_crawl_without_bulk_load_mode_is_not_bulk(self):
+        self.mock_enter_bulk_load.return_value = False
+        crawl = start_crawl('test.system', '/root', bulk=True)
+        self.assertFalse(crawl.bulk)
+        while crawl.status()['queued']:
+            crawl_frontier(crawl.id)
+        self.assertFalse(self.mock_index.call_args[1]['bulk'])
+        self.assertEqual(self.mock_leave_bulk_load.call_count, 0)
+
+    def test_expired_directories_are_claimed_again(self):
+        crawl = start_crawl('test.system', '/root')
+        CrawlDirectory.objects.claim(crawl, 10, 3600)
+        self.assertEqual(CrawlDirectory.objects.claim(crawl, 10, 3600), [])
+        self.assertEqual(len(CrawlDirectory.objects.claim(crawl, 10, -1)), 1)
+
+
+@override_settings(AGAVE_STORAGE_SYSTEM='designsafe.storage.default')
+class TestStorageUsage(TestCase):
+
+    def test_owner_of(self):
+        self.assertEqual(StorageUsage.owner_of('designsafe.storage.default', '/user1/a/b.txt'), 'user1')
+        self.assertIsNone(StorageUsage.owner_of('designsafe.storage.default', '/'))
+        self.assertEqual(StorageUsage.owner_of('project-1234', '/a/b.txt'), '')
+        self.assertIsNone(StorageUsage.owner_of('designsafe.storage.community', '/a/b.txt'))
+
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.subtree_usage', return_value=(0, 0))
+    def test_record_deltas(self, mock_subtree_usage):
+        StorageUsage.objects.record('designsafe.storage.default', {'user1': (100, 2), 'user2': (0, 0)})
+        StorageUsage.objects.record('designsafe.storage.default', {'user1': (-40, -1)})
+        usage = StorageUsage.objects.get(system='designsafe.storage.default', owner='user1')
+        self.assertEqual((usage.total_bytes, usage.file_count), (60, 1))
+        self.assertFalse(StorageUsage.objects.filter(owner='user2').exists())
+
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.subtree_usage')
+    def test_missing_rows_are_seeded_from_index(self, mock_subtree_usage):
+        mock_subtree_usage.return_value = (5000, 50)
+        StorageUsage.objects.record('designsafe.storage.default', {'user1': (100, 1)})
+        StorageUsage.objects.record('designsafe.storage.default', {'user1': (100, 1)})
+        mock_subtree_usage.assert_called_once_with('designsafe.storage.default', ['/user1'])
+        usage = StorageUsage.objects.get(system='designsafe.storage.default', owner='user1')
+        self.assertEqual((usage.total_bytes, usage.file_count), (5200, 52))
+
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.subtree_usage', return_value=(0, 0))
+    def test_level_deltas(self, mock_subtree_usage):
+        from designsafe.libs.elasticsearch.utils import record_level_usage
+        StorageUsage.objects.record('designsafe.storage.default', {'user1': (100, 1)})
+        files = [MagicMock(path='/user1/a.txt', format='raw', length=150),
+                 MagicMock(path='/user1/b.txt', format='raw', length=10)]
+        indexed = [MagicMock(path='/user1/a.txt', format='raw', length=100),
+                   MagicMock(path='/user1/dir', format='folder', length=4096)]
+        record_level_usage('designsafe.storage.default', files, indexed)
+        usage = StorageUsage.objects.get(system='designsafe.storage.default', owner='user1')
+        self.assertEqual((usage.total_bytes, usage.file_count), (160, 2))
+
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.subtree_usage')
+    def test_reconcile(self, mock_subtree_usage):
+        mock_subtree_usage.return_value = (500, 5)
+        StorageUsage.objects.record('designsafe.storage.default', {'user1': (100, 1)})
+        StorageUsage.objects.record('project-1234', {'': (100, 1)})
+        reconcile_storage_usage()
+        mock_subtree_usage.assert_any_call('designsafe.storage.default', ['/user1'])
+        mock_subtree_usage.assert_any_call('project-1234', None)
+        for usage in StorageUsage.objects.all():
+            self.assertEqual((usage.total_bytes, usage.file_count), (500, 5))
+            self.assertIsNotNone(usage.reconciled)
@@ -15,4 +15,4 @@ def update_search_index():
 
 @shared_task(bind=True)
 def index_community_data(self):
-    agave_indexer.delay('designsafe.storage.community', paths_to_ignore=['Trash'])
+    agave_indexer.delay('designsafe.storage.community', paths_to_ignore=['Trash'], bulk=True, incremental=True)
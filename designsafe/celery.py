@@ -29,6 +29,21 @@ app.conf.update(
         'reindex_projects': {
             'task': 'designsafe.apps.api.tasks.reindex_projects',
             'schedule': crontab(hour=0, minute=0)
+        },
+        'finish_abandoned_crawls': {
+            'task': 'designsafe.apps.data.tasks.finish_abandoned_crawls',
+            'schedule': crontab(minute=15),
+            'options': {'queue': 'indexing'}
+        },
+        'prune_crawls': {
+            'task': 'designsafe.apps.data.tasks.prune_crawls',
+            'schedule': crontab(hour=2, minute=30),
+            'options': {'queue': 'indexing'}
+        },
+        'reconcile_storage_usage': {
+            'task': 'designsafe.apps.data.tasks.reconcile_storage_usage',
+            'schedule': crontab(hour=3, minute=0),
+            'options': {'queue': 'indexing'}
         }
     }
 )
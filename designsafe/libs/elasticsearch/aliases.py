@@ -0,0 +1,84 @@
+"""
+.. module: designsafe.libs.elasticsearch.aliases
+   :synopsis: Process-level cache of alias to concrete index resolution.
+"""
+
+import logging
+import threading
+import time
+from django.conf import settings
+from elasticsearch import NotFoundError
+from elasticsearch_dsl.connections import connections
+
+logger = logging.getLogger(__name__)
+
+_resolved = {}
+_resolved_lock = threading.Lock()
+
+
+def resolve_aliases(*aliases):
+    """Resolve aliases to the name of the concrete index behind each one.
+
+    Resolutions are cached in this process for ``settings.ES_ALIAS_CACHE_TTL``
+    seconds. Aliases missing from the cache are resolved together in a
+    single request.
+
+    :returns: dict mapping each alias to an index name, or to ``None`` if
+        no index has that alias. Missing aliases are not cached.
+    :rtype: dict
+    """
+    now = time.time()
+    ttl = getattr(settings, 'ES_ALIAS_CACHE_TTL', 60)
+    resolved = {}
+    with _resolved_lock:
+        for alias in aliases:
+            index_name, expires = _resolved.get(alias, (None, 0))
+            if expires > now:
+                resolved[alias] = index_name
+    missing = [alias for alias in aliases if alias not in resolved]
+    if not missing:
+        return resolved
+
+    # A 404 body still lists the aliases that were found, next to the
+    # error for the ones that were not.
+    indices = connections.get_connection().indices.get_alias(name=','.join(missing), ignore=404)
+    for alias in missing:
+        resolved[alias] = None
+    for index_name, body in sorted(indices.items()):
+        if not isinstance(body, dict):
+            continue
+        for alias in body.get('aliases', {}):
+            if alias in missing and resolved[alias] is None:
+                resolved[alias] = index_name
+    with _resolved_lock:
+        for alias in missing:
+            if resolved[alias] is not None:
+                _resolved[alias] = (resolved[alias], now + ttl)
+    return resolved
+
+
+def resolve_alias(alias):
+    """Resolve one alias to the name of its concrete index. See
+    :func:`resolve_aliases`.
+
+    :raises NotFoundError: if no index has that alias.
+    """
+    index_name = resolve_aliases(alias)[alias]
+    if index_name is None:
+        raise NotFoundError(404, 'alias_not_found_exception',
+                            {'error': 'alias [{}] missing'.format(alias)})
+    return index_name
+
+
+def invalidate(*aliases):
+    """Drop cached resolutions so the next lookup asks the cluster again.
+
+    Call this after moving an alias. With no arguments every alias is
+    dropped. Only this process' cache is cleared; other processes pick up
+    the change once their entries expire.
+    """
+    with _resolved_lock:
+        if not aliases:
+            _resolved.clear()
+        for alias in aliases:
+            _resolved.pop(alias, None)
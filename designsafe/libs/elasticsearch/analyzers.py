@@ -4,7 +4,7 @@
 """
 
 import logging
-from elasticsearch_dsl import analyzer, tokenizer
+from elasticsearch_dsl import analyzer, tokenizer, token_filter
 
 #pylint: disable=invalid-name
 logger = logging.getLogger(__name__)
@@ -23,4 +23,18 @@ file_pattern_analyzer = analyzer('file_ext_analyzer',
 
 reverse_file_analyzer = analyzer('file_reverse',
                         tokenizer=tokenizer('keyword'),
-                        filter=['lowercase', 'reverse'])
\ No newline at end of file
+                        filter=['lowercase', 'reverse'])
+# Prefixes of each word in a file name, so that "temp" suggests
+# "TemperatureData_2020.csv" and "data" suggests it too. Searched with
+# file_suggest_search_analyzer, which splits the typed text into words
+# without making prefixes of it. Typed words are cut to the longest indexed
+# prefix, otherwise a long word would never match.
+FILE_SUGGEST_MAX_GRAM = 20
+
+file_suggest_analyzer = analyzer('file_suggest',
+                        tokenizer=tokenizer('file_suggest_edge', 'edge_ngram', min_gram=1, max_gram=FILE_SUGGEST_MAX_GRAM, token_chars=["letter", "digit"]),
+                        filter='lowercase')
+
+file_suggest_search_analyzer = analyzer('file_suggest_search',
+                        tokenizer=tokenizer('file_suggest_words', 'pattern', pattern='[^\\p{L}\\p{N}]+'),
+                        filter=['lowercase', token_filter('file_suggest_truncate', 'truncate', length=FILE_SUGGEST_MAX_GRAM)])
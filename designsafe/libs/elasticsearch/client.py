@@ -0,0 +1,115 @@
+"""
+.. module: designsafe.libs.elasticsearch.client
+   :synopsis: Shared Elasticsearch clients and connection pool metrics.
+"""
+
+import logging
+import threading
+import time
+from django.conf import settings
+from elasticsearch import Transport
+from elasticsearch_dsl.connections import connections
+
+logger = logging.getLogger(__name__)
+
+
+class BackoffTransport(Transport):
+    """Transport that waits before retrying a failed request.
+
+    The stock transport retries on the next connection right away. This one
+    sleeps ``retry_backoff * 2 ** n`` seconds (at most ``retry_backoff_max``)
+    before the ``n``-th retry of a request, and counts requests and retries
+    for :func:`pool_stats`.
+    """
+
+    def __init__(self, hosts, retry_backoff=0.5, retry_backoff_max=10, **kwargs):
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.requests = 0
+        self.retries = 0
+        self._attempts = threading.local()
+        super(BackoffTransport, self).__init__(hosts, **kwargs)
+
+    def mark_dead(self, connection):
+        # Only called when the failed request is going to be retried, or
+        # right before the last failure is raised.
+        super(BackoffTransport, self).mark_dead(connection)
+        attempt = getattr(self._attempts, 'count', 0)
+        self._attempts.count = attempt + 1
+        self.retries += 1
+        if attempt < self.max_retries:
+            time.sleep(min(self.retry_backoff * 2 ** attempt, self.retry_backoff_max))
+
+    def perform_request(self, method, url, headers=None, params=None, body=None):
+        self._attempts.count = 0
+        self.requests += 1
+        return super(BackoffTransport, self).perform_request(
+            method, url, headers=headers, params=params, body=body)
+
+
+def client_options(**overrides):
+    """Options shared by every client, from ``settings.ES_CLIENT_OPTIONS``."""
+    options = dict(getattr(settings, 'ES_CLIENT_OPTIONS', {}))
+    options.update(overrides)
+    options.setdefault('transport_class', BackoffTransport)
+    return options
+
+
+def configure():
+    """Register the default connection used by every DSL ``Document`` and by
+    :func:`get_client`. Called once when the data app is ready."""
+    try:
+        hosts = settings.ES_CONNECTIONS[settings.DESIGNSAFE_ENVIRONMENT]['hosts']
+    except (AttributeError, KeyError) as exc:
+        logger.error('Missing ElasticSearch config. %s', exc)
+        raise
+    return connections.create_connection('default', hosts=hosts,
+                                         **client_options(http_auth=settings.ES_AUTH))
+
+
+def get_client(alias='default'):
+    """Shared client for the portal's cluster.
+
+    Every request made through it goes through the same connection pool.
+    Pass ``request_timeout`` to an API call to override the default timeout
+    for that call.
+
+    :rtype: :class:`elasticsearch.Elasticsearch`
+    """
+    return connections.get_connection(alias)
+
+
+def create_client(hosts, **kwargs):
+    """Client for another cluster, e.g. a remote reindex source, configured
+    like the shared client. ``kwargs`` override the shared options."""
+    return connections.create_connection('remote:{}'.format(','.join(hosts)), hosts=hosts,
+                                         **client_options(**kwargs))
+
+
+def pool_stats(alias='default'):
+    """Connection pool metrics of a client.
+
+    :returns: requests and retries made through the transport and, for
+        each node, whether it is live, its consecutive failures and the
+        urllib3 pool's open connections, idle connections and requests.
+    :rtype: dict
+    """
+    transport = get_client(alias).transport
+    pool = transport.connection_pool
+    live = set(pool.connections)
+    nodes = []
+    for connection in getattr(pool, 'orig_connections', pool.connections):
+        http_pool = getattr(connection, 'pool', None)
+        nodes.append({
+            'host': connection.host,
+            'live': connection in live,
+            'failures': getattr(pool, 'dead_count', {}).get(connection, 0),
+            'open_connections': getattr(http_pool, 'num_connections', None),
+            'idle_connections': http_pool.pool.qsize() if getattr(http_pool, 'pool', None) else None,
+            'requests': getattr(http_pool, 'num_requests', None),
+        })
+    return {
+        'requests': getattr(transport, 'requests', None),
+        'retries': getattr(transport, 'retries', None),
+        'nodes': nodes,
+    }
@@ -6,10 +6,10 @@
 from future.utils import python_2_unicode_compatible
 import logging
 import json
-from django.conf import settings
 from elasticsearch_dsl.connections import connections
-from elasticsearch import TransportError, Elasticsearch
+from elasticsearch import TransportError
 from designsafe.libs.elasticsearch.analyzers import path_analyzer
+from designsafe.libs.elasticsearch.client import get_client
 
 #pylint: disable=invalid-name
 logger = logging.getLogger(__name__)
@@ -33,8 +33,5 @@ def reindex(from_index, from_doc_type, to_index, to_doc_type,
     if script:
         body['script'] = script
 
-    es_local = Elasticsearch(
-        settings.ES_CONNECTIONS[settings.DESIGNSAFE_ENVIRONMENT]['hosts'],
-        request_timeout=120)
-    resp = es_local.reindex(body=body, request_timeout=request_timeout)
+    resp = get_client().reindex(body=body, request_timeout=request_timeout)
     logger.debug(resp)
@@ -8,6 +8,7 @@ import logging
 import os
 from django.conf import settings
 from designsafe.apps.data.models.elasticsearch import IndexedFile
+from designsafe.apps.data.models.usage import StorageUsage
 from designsafe.libs.elasticsearch.docs.base import BaseESResource
 from designsafe.libs.elasticsearch.exceptions import DocumentNotFound
 
@@ -87,18 +88,26 @@ class BaseESFile(BaseESResource):
 
     def save(self, using=None, index=None, validate=True, **kwargs):
         """Save document
+
+        Extra kwargs (e.g. ``refresh='wait_for'``) are passed on to the
+        index request.
         """
-        self._wrapped.save()
+        self._wrapped.save(**kwargs)
 
     def delete(self):
         """Overwriting to implement delete recursively.
+
+        Folders are removed along with everything below them in a single
+        delete by query.
+
         .. seealso:
             Module :class:`elasticsearch_dsl.document.DocType`
 
         """
         if self.format == 'folder':
-            children = self.children()
-            for child in children:
-                if child.path != self.path:
-                    child.delete()
-        self._wrapped.delete()
\ No newline at end of file
+            self._index_cls(self._reindex).delete_subtrees(self.system, [self.path])
+            return
+        owner = StorageUsage.owner_of(self.system, self.path)
+        if owner is not None:
+            StorageUsage.objects.record(self.system, {owner: (-(self.length or 0), -1)})
+        self._wrapped.delete()
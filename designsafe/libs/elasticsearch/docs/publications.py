@@ -9,7 +9,7 @@ from future.utils import python_2_unicode_compatible
 from designsafe.apps.data.models.elasticsearch import IndexedPublication
 from designsafe.libs.elasticsearch.docs.base import BaseESResource
 from designsafe.libs.elasticsearch.exceptions import DocumentNotFound
-from django.contrib.auth import get_user_model
+from designsafe.apps.api.users.utils import display_names
 
 # pylint: disable=invalid-name
 logger = logging.getLogger(__name__)
@@ -67,7 +67,16 @@ class BaseESPublication(BaseESResource):
         self._wrapped.delete()
 
     @staticmethod
-    def hit_to_file(hit):
+    def pi_names(hits):
+        """Display names of the PIs of publication hits that do not carry a
+        ``users`` list, resolved in one query. Pass the result to
+        :meth:`hit_to_file` when converting a page of hits."""
+        # Legacy (NEES) hits have no projectId and are skipped.
+        return display_names(hit.project['value']['pi'] for hit in hits
+                             if getattr(hit, 'projectId', None) and not getattr(hit, 'users', []))
+
+    @staticmethod
+    def hit_to_file(hit, pi_names=None):
         dict_obj = {
             'agavePath': 'agave://designsafe.storage.published/{}'.format(
                 hit.project.value.projectId
@@ -103,16 +112,13 @@ class BaseESPublication(BaseESResource):
             dict_obj['meta']['piLabel'] = '{last_name}, {first_name}'.format(
                 last_name=pi_user['last_name'], first_name=pi_user['first_name'])
         else:
-            try:
-                pi_user = get_user_model().objects.get(username=pi)
-                dict_obj['meta']['piLabel'] = '{last_name}, {first_name}'.format(
-                    last_name=pi_user.last_name, first_name=pi_user.first_name)
-            except:
-                dict_obj['meta']['piLabel'] = '({pi})'.format(pi=pi)
+            if pi_names is None:
+                pi_names = display_names([pi])
+            dict_obj['meta']['piLabel'] = pi_names.get(pi, '({pi})'.format(pi=pi))
         return dict_obj
 
 
-    def to_file(self):
+    def to_file(self, pi_names=None):
         """To file."""
         dict_obj = {
             'agavePath': 'agave://designsafe.storage.published/{}'.format(
@@ -149,12 +155,9 @@ class BaseESPublication(BaseESResource):
             dict_obj['meta']['piLabel'] = '{last_name}, {first_name}'.format(
                 last_name=pi_user['last_name'], first_name=pi_user['first_name'])
         else:
-            try:
-                pi_user = get_user_model().objects.get(username=pi)
-                dict_obj['meta']['piLabel'] = '{last_name}, {first_name}'.format(
-                    last_name=pi_user.last_name, first_name=pi_user.first_name)
-            except:
-                dict_obj['meta']['piLabel'] = '({pi})'.format(pi=pi)
+            if pi_names is None:
+                pi_names = display_names([pi])
+            dict_obj['meta']['piLabel'] = pi_names.get(pi, '({pi})'.format(pi=pi))
         return dict_obj
 
     def related_file_paths(self):
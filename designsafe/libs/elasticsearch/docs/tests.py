@@ -140,29 +140,22 @@ class TestBaseESFile(TestCase):
         mock_delete.assert_called_with()
 
     @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.delete')
-    @patch('designsafe.libs.elasticsearch.docs.files.BaseESFile.children')
-    def test_delete_recursive(self, mock_children, mock_delete):
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.delete_subtrees')
+    def test_delete_recursive(self, mock_delete_subtrees, mock_delete):
         wrapped_doc = IndexedFile(
             **{'name': 'folder1', 'system': 'test.system', 'path': '/path/to/folder', 'format': 'folder'})
         base = BaseESFile('test_user', system='test.system',
                           wrapped_doc=wrapped_doc)
         object.__setattr__(base, '_wrapped', wrapped_doc)
+        object.__setattr__(base, '_reindex', False)
         object.__setattr__(base, 'format', 'folder')
+        object.__setattr__(base, 'system', 'test.system')
         object.__setattr__(base, 'path', '/path/to/folder')
 
-        child_doc = IndexedFile(
-            **{'name': 'child1', 'system': 'test.system', 'path': '/path/to/child1', 'format': 'file'})
-        base_child = BaseESFile('test_user', system='test.system',
-                          wrapped_doc=child_doc)
-        object.__setattr__(base_child, '_wrapped', child_doc)
-        object.__setattr__(base_child, 'format', 'file')
-        object.__setattr__(base_child, 'path', '/path/to/child1')
-
-        mock_children.return_value = iter( [base_child] )
-
         base.delete()
-        # Assert 2 delete calls: 1 for parent, 1 for child
-        self.assertEqual(mock_delete.call_count, 2)
+        # The folder and its children are removed by a single delete by query.
+        mock_delete_subtrees.assert_called_with('test.system', ['/path/to/folder'])
+        self.assertEqual(mock_delete.call_count, 0)
 
 
 class TestBaseESResource(TestCase):
@@ -235,24 +228,61 @@ class TestIndexedFile(TestCase):
         f.save()
         mock_save.assert_called_with()
 
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.get')
+    def test_from_path_gets_by_id(self, mock_get):
+        search_res = IndexedFile(
+            **{'name': 'res1', 'system': 'test.system', 'path': '/path/to/res1'})
+        mock_get.return_value = search_res
+
+        doc_from_path = IndexedFile.from_path('test.system', '/path/to/res1')
+
+        mock_get.assert_called_with(IndexedFile.doc_id('test.system', '/path/to/res1'), ignore=404)
+        self.assertEqual(doc_from_path, search_res)
+
+    def test_doc_id_is_normalized(self):
+        self.assertEqual(IndexedFile.doc_id('test.system', 'path/to/res1/'),
+                         IndexedFile.doc_id('test.system', '/path/to/res1'))
+        self.assertNotEqual(IndexedFile.doc_id('test.system', '/path/to/res1'),
+                            IndexedFile.doc_id('other.system', '/path/to/res1'))
+
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile._get_connection')
+    @patch('designsafe.apps.data.models.elasticsearch.Document.save')
+    def test_save_rekeys_legacy_doc(self, mock_save, mock_conn):
+        f = IndexedFile(meta={'id': 'LEGACY_ID'},
+                        **{'name': 'res1', 'system': 'test.system', 'path': '/path/to/res1'})
+        f.save()
+        self.assertEqual(f.meta.id, IndexedFile.doc_id('test.system', '/path/to/res1'))
+        mock_conn().delete.assert_called_with(index=f._get_index(), id='LEGACY_ID', ignore=404)
+
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.get')
     @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.search')
     @patch('designsafe.apps.data.models.elasticsearch.Index.refresh')
-    def test_from_path_with_404(self, mock_refresh, mock_search):
+    def test_from_path_does_not_refresh(self, mock_refresh, mock_search, mock_get):
+        mock_get.return_value = None
+        mock_search().filter().execute.return_value.hits.total.value = 0
+        with self.assertRaises(DocumentNotFound):
+            IndexedFile.from_path('test.system', '/')
+        self.assertEqual(mock_refresh.call_count, 0)
+
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.get')
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.search')
+    def test_from_path_with_404(self, mock_search, mock_get):
+        mock_get.return_value = None
         mock_search().filter().execute.side_effect = TransportError(404)
         with self.assertRaises(TransportError):
             IndexedFile.from_path('test.system', '/')
 
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.get')
     @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.search')
-    @patch('designsafe.apps.data.models.elasticsearch.Index.refresh')
-    def test_from_path_raises_when_no_hits(self, mock_refresh, mock_search):
+    def test_from_path_raises_when_no_hits(self, mock_search, mock_get):
+        mock_get.return_value = None
         mock_search().filter().execute.return_value.hits.total.value = 0
         with self.assertRaises(DocumentNotFound):
             IndexedFile.from_path('test.system', '/')
     
     @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.search')
     @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.get')
-    @patch('designsafe.apps.data.models.elasticsearch.Index.refresh')
-    def test_from_path_1_hit(self, mock_refresh, mock_get, mock_search):
+    def test_from_path_1_hit(self, mock_get, mock_search):
         search_res = IndexedFile(
             **{'name': 'res1', 'system': 'test.system', 'path': '/path/to/res1'})
 
@@ -263,7 +293,7 @@ class TestIndexedFile(TestCase):
         mock_res.hits.total.value = 1
 
         mock_search().filter().execute.return_value = mock_res
-        mock_get.return_value = search_res
+        mock_get.side_effect = [None, search_res]
 
         doc_from_path = IndexedFile.from_path('test.system', '/path/to/res1')
 
@@ -275,8 +305,7 @@ class TestIndexedFile(TestCase):
     @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.delete')
     @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.search')
     @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.get')
-    @patch('designsafe.apps.data.models.elasticsearch.Index.refresh')
-    def test_from_path_multiple_hits(self, mock_refresh, mock_get, mock_search, mock_delete):
+    def test_from_path_multiple_hits(self, mock_get, mock_search, mock_delete):
         """
         When there are multiple files sharing a system and path, ensure we delete
         all but one and return the remaining document.
@@ -292,7 +321,7 @@ class TestIndexedFile(TestCase):
         mock_res = MagicMock()
         mock_res.hits.total.value = 3
         mock_search().filter().execute.return_value = mock_res
-        mock_get.return_value = search_res
+        mock_get.side_effect = [None, search_res]
 
         doc_from_path = IndexedFile.from_path('test.system', '/path/to/res1')
 
@@ -300,6 +329,13 @@ class TestIndexedFile(TestCase):
 
         self.assertEqual(doc_from_path, search_res)
 
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.search')
+    def test_delete_subtrees(self, mock_search):
+        IndexedFile.delete_subtrees('test.system', ['/path/a', '/path/b'])
+        mock_search().filter().filter.assert_called_with('terms', **{'path._path': ['/path/a', '/path/b']})
+        mock_search().filter().filter().params.assert_called_with(slices='auto', conflicts='proceed')
+        self.assertEqual(mock_search().filter().filter().params().delete.call_count, 1)
+
     @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.search')
     def test_children_raises_on_404(self, mock_search):
         mock_search().filter().filter().sort().extra().execute.side_effect = TransportError(404)
@@ -7,24 +7,21 @@ from future.utils import python_2_unicode_compatible
 import logging
 import json
 import six
+from contextlib import contextmanager
 from importlib import import_module
 from django.conf import settings
+from django.core.cache import cache
 from elasticsearch_dsl.connections import connections
 from elasticsearch_dsl import (Index)
 from elasticsearch_dsl.query import Q
-from elasticsearch import TransportError, ConnectionTimeout, Elasticsearch
+from elasticsearch import TransportError, ConnectionTimeout
 from designsafe.libs.elasticsearch.analyzers import path_analyzer
+from designsafe.libs.elasticsearch import aliases as aliases_cache
+from designsafe.libs.elasticsearch.client import get_client
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-try:
-    HOSTS = settings.ES_CONNECTIONS[settings.DESIGNSAFE_ENVIRONMENT]['hosts']
-    es_client = Elasticsearch(HOSTS, http_auth=settings.ES_AUTH)
-except AttributeError as exc:
-    logger.error('Missing ElasticSearch config. %s', exc)
-    raise
-
 def setup_index(index_config, force=False, reindex=False):
     """
     Set up an index from a config dict. The behavior of the function is as follows:
@@ -42,6 +39,7 @@ def setup_index(index_config, force=False, reindex=False):
     time_now = datetime.now().strftime("%Y_%m_%d_%H_%M_%S_%f")
     index_name = '{}-{}'.format(alias, time_now)
 
+    es_client = get_client()
     index = Index(alias, using=es_client)
 
     if force or not index.exists():
@@ -63,6 +61,149 @@ def setup_index(index_config, force=False, reindex=False):
         index.settings(**index_config['kwargs'])
 
         index.create()
+        aliases_cache.invalidate(alias)
+
+
+def apply_settings(index_name, new_settings):
+    """
+    Update the settings of an index and return the previous values of the
+    same settings, to be passed to :func:`restore_settings`. A setting that
+    was not set explicitly is returned as ``None``.
+
+    :param dict new_settings: index settings without the ``index.`` prefix,
+        e.g. ``{'refresh_interval': '-1'}``.
+    """
+    es_client = get_client()
+    names = ['index.{}'.format(name) for name in new_settings]
+    res = es_client.indices.get_settings(index=index_name, name=','.join(names),
+                                         flat_settings=True)
+    current = {}
+    for index_settings in res.values():
+        current.update(index_settings.get('settings', {}))
+    previous = {name: current.get('index.{}'.format(name)) for name in new_settings}
+    es_client.indices.put_settings(index=index_name, body={'index': new_settings})
+    return previous
+
+
+def restore_settings(index_name, previous):
+    """Restore settings returned by :func:`apply_settings`."""
+    get_client().indices.put_settings(index=index_name, body={'index': previous})
+
+
+def _bulk_load_key(alias):
+    return 'es_bulk_load:{}'.format(alias)
+
+
+# Settings put back when the original ones saved by enter_bulk_load were
+# evicted from the cache; ``None`` resets a setting to the index default.
+BULK_LOAD_RESET_SETTINGS = {'refresh_interval': None, 'translog.durability': None}
+
+
+def _add_bulk_load_holder(holders_key):
+    """Count a new holder and return the number of holders, or ``None`` if
+    the cache cannot keep the count."""
+    for _ in range(2):
+        cache.add(holders_key, 0, settings.ES_BULK_LOAD_TIMEOUT)
+        try:
+            return cache.incr(holders_key)
+        except ValueError:
+            # The counter was evicted after add(), or the cache is
+            # unreachable; seed it again once.
+            continue
+    return None
+
+
+def enter_bulk_load(alias, refresh_interval='30s', number_of_replicas=None,
+                    translog_durability='async'):
+    """
+    Relax an index's settings for heavy writes, e.g. for the duration of a
+    full crawl. Refreshes are made less often, the translog is fsynced in
+    the background instead of on every bulk request and, if
+    ``number_of_replicas`` is given, replicas are dropped. Every call that
+    returns ``True`` must be matched by a call to :func:`leave_bulk_load`.
+
+    Concurrent holders of the same alias (e.g. several crawls) are counted
+    in the cache: settings are changed when the first one enters and
+    restored when the last one leaves. The original settings are kept in
+    the cache until then, so a holder that enters while a stale bulk load
+    is active does not take the relaxed settings for the original ones.
+    Holders that never leave are forgotten after
+    ``settings.ES_BULK_LOAD_TIMEOUT``. If the cache cannot count holders,
+    the settings are left alone and the writes run without bulk load mode.
+
+    :param str alias: alias or name of the index.
+    :param str refresh_interval: refresh interval during the load, or
+        ``'-1'`` to turn refreshes off.
+    :param int number_of_replicas: replicas during the load, or ``None`` to
+        keep them.
+    :param str translog_durability: translog durability during the load,
+        or ``None`` to keep it.
+    :returns: whether bulk load mode was entered.
+    """
+    new_settings = {'refresh_interval': refresh_interval}
+    if number_of_replicas is not None:
+        new_settings['number_of_replicas'] = number_of_replicas
+    if translog_durability:
+        new_settings['translog.durability'] = translog_durability
+
+    key = _bulk_load_key(alias)
+    holders_key = key + ':holders'
+    holders = _add_bulk_load_holder(holders_key)
+    if holders is None:
+        logger.warning('Cannot count bulk load holders of %s, writing without '
+                       'bulk load mode', alias)
+        return False
+    if holders == 1:
+        try:
+            cache.add(key, apply_settings(alias, new_settings), None)
+        except Exception:
+            # Nothing was changed, so only the holder is dropped.
+            try:
+                cache.decr(holders_key)
+            except ValueError:
+                pass
+            raise
+    return True
+
+
+def leave_bulk_load(alias):
+    """
+    Leave the bulk load mode entered with :func:`enter_bulk_load`, and
+    restore the index's settings if no other holder is left. If the saved
+    settings were lost, :data:`BULK_LOAD_RESET_SETTINGS` are put back
+    instead so the index is not left relaxed.
+    """
+    key = _bulk_load_key(alias)
+    holders_key = key + ':holders'
+    try:
+        remaining = cache.decr(holders_key)
+    except ValueError:
+        # The counter expired, so no other holder can be relied on to
+        # restore the settings.
+        remaining = 0
+    if remaining <= 0:
+        previous = cache.get(key)
+        if previous is None:
+            logger.warning('Bulk load settings of %s were lost, resetting %s',
+                           alias, ', '.join(sorted(BULK_LOAD_RESET_SETTINGS)))
+            previous = BULK_LOAD_RESET_SETTINGS
+        restore_settings(alias, previous)
+        cache.delete_many([key, holders_key])
+
+
+@contextmanager
+def bulk_load(alias, **kwargs):
+    """
+    Bulk load mode for the duration of a block, including when it exits on
+    an exception. See :func:`enter_bulk_load` for the ``kwargs``.
+    """
+    entered = enter_bulk_load(alias, **kwargs)
+    try:
+        yield
+    finally:
+        if entered:
+            leave_bulk_load(alias)
+
 
 def init(name='all', force=False):
     if name != 'all':
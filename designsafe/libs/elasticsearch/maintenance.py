@@ -0,0 +1,175 @@
+"""
+.. module: designsafe.libs.elasticsearch.maintenance
+   :synopsis: Parallel index fix-ups over sliced scrolls.
+"""
+
+import collections
+import logging
+import queue
+import threading
+import time
+from django.core.cache import cache
+from elasticsearch.helpers import parallel_bulk
+from designsafe.libs.elasticsearch.client import get_client
+from designsafe.libs.elasticsearch.pagination import _put
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_TIMEOUT = 7 * 24 * 60 * 60
+
+_SLICE_DONE = object()
+
+
+def _checkpoint_key(name):
+    return 'es_maintenance:{}'.format(name)
+
+
+def _read_slice(search, slice_id, slices, hits, stop):
+    try:
+        for hit in search.extra(slice={'id': slice_id, 'max': slices}).scan():
+            if not _put(hits, (slice_id, hit), stop):
+                return
+        _put(hits, (slice_id, _SLICE_DONE), stop)
+    except Exception as exc:  # pylint: disable=broad-except
+        _put(hits, (slice_id, exc), stop)
+
+
+class _Throttle(object):
+    """Blocks callers so that at most ``rate`` calls go through per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_call = time.time()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.time()
+        if self.next_call > now:
+            time.sleep(self.next_call - now)
+        self.next_call = max(self.next_call, now) + self.interval
+
+
+def run(search, transform, name=None, resume=False, slices=8, thread_count=4,
+        chunk_size=500, batch_size=1000, max_docs_per_second=None, scroll='5m',
+        dry_run=False):
+    """Apply a transform to every hit of a search and write the results in bulk.
+
+    The search is read as ``slices`` scroll slices in parallel threads, and
+    the actions returned by ``transform`` are written with
+    :func:`elasticsearch.helpers.parallel_bulk` while the slices are still
+    being read.
+
+    With a ``name``, every slice whose actions have all been written
+    without errors is checkpointed in the cache. A run with ``resume=True``
+    skips the checkpointed slices of the last run with the same name and
+    number of slices. The checkpoint is cleared once every slice is done.
+    Slices are redone as a whole, so ``transform`` must be safe to apply
+    twice.
+
+    :param search: :class:`elasticsearch_dsl.Search` selecting the docs.
+    :param transform: called with each hit; returns a bulk action dict, or
+        ``None`` to leave the doc alone.
+    :param str name: checkpoint name.
+    :param bool resume: skip the slices checkpointed under ``name``.
+    :param int slices: number of scroll slices.
+    :param int thread_count: threads sending bulk requests.
+    :param int chunk_size: actions per bulk request.
+    :param int batch_size: hits fetched per scroll request.
+    :param max_docs_per_second: throttle on the hits transformed per second.
+    :param str scroll: how long ES keeps each scroll context alive.
+    :param bool dry_run: only count the actions, do not write them.
+
+    :returns: the number of hits read and actions written, the slices
+        finished and the per-item bulk errors.
+    :rtype: dict
+    """
+    done = set()
+    if name and resume:
+        checkpoint = cache.get(_checkpoint_key(name))
+        if checkpoint and checkpoint['slices'] == slices:
+            done = set(checkpoint['done'])
+        elif checkpoint:
+            logger.warning('Ignoring checkpoint of %s made with %s slices',
+                           name, checkpoint['slices'])
+    pending = [slice_id for slice_id in range(slices) if slice_id not in done]
+    report = {'hits': 0, 'actions': 0, 'slices_done': sorted(done), 'errors': []}
+    if not pending:
+        return report
+
+    lock = threading.Lock()
+    # Slice of every action sent and not yet acknowledged, in send order.
+    in_flight = collections.deque()
+    outstanding = collections.Counter()
+    read = set()
+    failed = set()
+
+    def _slice_finished(slice_id):
+        """Checkpoint a slice once it is read and all its actions are
+        acknowledged. Must be called with ``lock`` held."""
+        if slice_id not in read or outstanding[slice_id] or slice_id in failed:
+            return
+        done.add(slice_id)
+        report['slices_done'] = sorted(done)
+        if name and not dry_run:
+            cache.set(_checkpoint_key(name), {'slices': slices, 'done': sorted(done)},
+                      CHECKPOINT_TIMEOUT)
+        logger.info('%s: slice %s/%s done, %s hits, %s actions', name or 'maintenance',
+                    slice_id + 1, slices, report['hits'], report['actions'])
+
+    hits = queue.Queue(maxsize=batch_size * len(pending))
+    stop = threading.Event()
+    search = search.params(size=batch_size, scroll=scroll)
+    readers = [threading.Thread(target=_read_slice, args=(search, slice_id, slices, hits, stop),
+                                daemon=True)
+               for slice_id in pending]
+    throttle = _Throttle(max_docs_per_second)
+
+    def _actions():
+        running = len(readers)
+        while running:
+            slice_id, hit = hits.get()
+            if hit is _SLICE_DONE:
+                running -= 1
+                with lock:
+                    read.add(slice_id)
+                    _slice_finished(slice_id)
+                continue
+            if isinstance(hit, Exception):
+                raise hit
+            throttle.wait()
+            action = transform(hit)
+            with lock:
+                report['hits'] += 1
+                if action is None:
+                    continue
+                report['actions'] += 1
+                if dry_run:
+                    continue
+                in_flight.append(slice_id)
+                outstanding[slice_id] += 1
+            yield action
+
+    for reader in readers:
+        reader.start()
+    try:
+        if dry_run:
+            collections.deque(_actions(), maxlen=0)
+            return report
+        for ok, item in parallel_bulk(get_client(), _actions(), thread_count=thread_count,
+                                      chunk_size=chunk_size, raise_on_error=False,
+                                      raise_on_exception=False):
+            with lock:
+                slice_id = in_flight.popleft()
+                outstanding[slice_id] -= 1
+                if not ok:
+                    failed.add(slice_id)
+                    report['errors'].append(item)
+                    logger.error('%s: bulk error: %s', name or 'maintenance', item)
+                _slice_finished(slice_id)
+    finally:
+        stop.set()
+
+    if name and len(done) == slices:
+        cache.delete(_checkpoint_key(name))
+    return report
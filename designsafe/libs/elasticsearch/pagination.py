@@ -0,0 +1,125 @@
+"""
+.. module: designsafe.libs.elasticsearch.pagination
+   :synopsis: Paging and streaming of ES search results.
+"""
+
+import base64
+import binascii
+import json
+import logging
+import queue
+import threading
+from designsafe.apps.api.exceptions import ApiException
+
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(sort_values):
+    """Encode the sort values of a page's last hit as an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps(list(sort_values)).encode('utf-8')).decode('utf-8')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor made by :func:`encode_cursor`.
+
+    :raises ApiException: if the cursor is malformed.
+    """
+    try:
+        sort_values = json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')).decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ApiException(status=400, message='Invalid cursor.')
+    if not isinstance(sort_values, list):
+        raise ApiException(status=400, message='Invalid cursor.')
+    return sort_values
+
+
+def paginate(search, offset=0, limit=100, cursor=None):
+    """Limit a search to one page of results.
+
+    With a ``cursor`` the page starts right after the hit the cursor was
+    made from (``search_after``), which costs the same at any depth and is
+    not capped by ``index.max_result_window``. Otherwise ``offset`` is used
+    with ``from``/``size``.
+
+    The search must be sorted on fields that identify every hit, e.g. end
+    the sort with ``path._exact`` for files.
+
+    :rtype: :class:`elasticsearch_dsl.Search`
+    """
+    if cursor:
+        return search.extra(search_after=decode_cursor(cursor), size=int(limit))
+    return search.extra(from_=int(offset), size=int(limit))
+
+
+def next_cursor(res, limit):
+    """Cursor for the page after ``res``, or ``None`` on the last page."""
+    hits = res.hits
+    if not hits or len(hits) < int(limit):
+        return None
+    return encode_cursor(hits[-1].meta.sort)
+
+
+_SLICE_DONE = object()
+
+
+def _put(hits, item, stop):
+    """Put an item in the queue unless the consumer has stopped."""
+    while not stop.is_set():
+        try:
+            hits.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _scan_slice(search, slice_id, slices, hits, stop):
+    try:
+        for hit in search.extra(slice={'id': slice_id, 'max': slices}).scan():
+            if not _put(hits, hit, stop):
+                return
+        _put(hits, _SLICE_DONE, stop)
+    except Exception as exc:  # pylint: disable=broad-except
+        _put(hits, exc, stop)
+
+
+def scan(search, batch_size=1000, slices=None, scroll='5m'):
+    """Stream every hit of a search with a scroll, in no particular order.
+
+    Unlike paging with ``from``/``size`` every hit is read once, and at
+    most about ``batch_size`` hits per slice are held in memory.
+
+    :param search: :class:`elasticsearch_dsl.Search` to run.
+    :param int batch_size: hits fetched per scroll request.
+    :param int slices: if more than 1, split the scroll into this many
+        slices that are read in parallel threads. Hits from different
+        slices are interleaved.
+    :param str scroll: how long ES keeps each scroll context alive between
+        requests.
+
+    :rtype: generator of hits
+    """
+    search = search.params(size=batch_size, scroll=scroll)
+    if not slices or slices < 2:
+        yield from search.scan()
+        return
+
+    hits = queue.Queue(maxsize=batch_size * slices)
+    stop = threading.Event()
+    workers = [threading.Thread(target=_scan_slice, args=(search, slice_id, slices, hits, stop),
+                                daemon=True)
+               for slice_id in range(slices)]
+    for worker in workers:
+        worker.start()
+    try:
+        running = slices
+        while running:
+            hit = hits.get()
+            if hit is _SLICE_DONE:
+                running -= 1
+            elif isinstance(hit, Exception):
+                raise hit
+            else:
+                yield hit
+    finally:
+        stop.set()
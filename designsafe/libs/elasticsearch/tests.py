@@ -0,0 +1,778 @@
+from mock import Mock, patch, MagicMock, call
+import os
+import shutil
+import tempfile
+from django.test import TestCase, override_settings
+from elasticsearch import NotFoundError
+from designsafe.apps.data.models.elasticsearch import IndexedFile
+from designsafe.libs.elasticsearch.utils import (index_level, bulk_index_level, prune_level,
+                                                 level_permissions, walk_levels, listing_backend,
+                                                 posix_listing, tapis_listing, full_dedup)
+
+
+class TestBulkIndexLevel(TestCase):
+
+    def setUp(self):
+        self.patch_bulk = patch('elasticsearch.helpers.streaming_bulk')
+        self.patch_search = patch('designsafe.apps.data.models.elasticsearch.IndexedFile.search')
+        self.patch_conn = patch('designsafe.apps.data.models.elasticsearch.IndexedFile._get_connection')
+
+        self.mock_bulk = self.patch_bulk.start()
+        self.mock_search = self.patch_search.start()
+        self.mock_conn = self.patch_conn.start()
+
+        self.addCleanup(self.patch_bulk.stop)
+        self.addCleanup(self.patch_search.stop)
+        self.addCleanup(self.patch_conn.stop)
+
+    def _mock_file(self, path, format='raw'):
+        mock_file = MagicMock()
+        mock_file.path = path
+        mock_file.lastModified = '2020-01-01T00:00:00.000-06:00'
+        mock_file.length = 4096
+        mock_file.to_dict.return_value = {
+            'name': path.split('/')[-1],
+            'path': path,
+            'system': 'test.system',
+            'format': format,
+            'lastModified': '2020-01-01T00:00:00.000-06:00',
+            'length': 4096,
+            'permissions': 'ALL',
+            'trail': [],
+            '_links': {}
+        }
+        return mock_file
+
+    def test_index_level_delegates_to_bulk(self):
+        mock_client = MagicMock()
+        with patch('designsafe.libs.elasticsearch.utils.bulk_index_level') as mock_bulk_level:
+            index_level(mock_client, '/path', [], [], 'test.system', 'test_user',
+                        bulk=True, chunk_size=10)
+        mock_bulk_level.assert_called_with(
+            mock_client, '/path', [], [], 'test.system', 'test_user',
+            reindex=False, update_pems=True, chunk_size=10, refresh=False,
+            incremental=False, skip_unchanged_folders=False)
+
+    def test_writes_level_in_one_bulk_call(self):
+        existing = MagicMock(path='/path/file1')
+        existing.meta.id = 'EXISTING_ID'
+        self.mock_search().filter().filter().source().scan.return_value = [existing]
+
+        actions = []
+        def consume(client, gen, **kwargs):
+            actions.extend(gen)
+            return iter([(True, {})] * len(actions))
+        self.mock_bulk.side_effect = consume
+
+        files = [self._mock_file('/path/file1'), self._mock_file('/path/file2')]
+        errors = bulk_index_level(MagicMock(), '/path', [], files, 'test.system',
+                                  'test_user', update_pems=False, chunk_size=10)
+
+        self.assertEqual(self.mock_bulk.call_count, 1)
+        self.assertEqual(self.mock_bulk.call_args[1]['chunk_size'], 10)
+        self.assertEqual(len(actions), 3)
+        self.assertEqual(actions[0]['_id'], IndexedFile.doc_id('test.system', '/path/file1'))
+        self.assertEqual(actions[1]['_id'], IndexedFile.doc_id('test.system', '/path/file2'))
+        self.assertEqual(actions[1]['doc']['basePath'], '/path')
+        # Fields that are not listed, e.g. permissions, are left as they are.
+        self.assertEqual(actions[1]['_op_type'], 'update')
+        self.assertTrue(actions[1]['doc_as_upsert'])
+        self.assertNotIn('permissions', actions[1]['doc'])
+        self.assertNotIn('readers', actions[1]['doc'])
+        # The doc stored under a legacy id is dropped in the same request.
+        self.assertEqual(actions[2]['_op_type'], 'delete')
+        self.assertEqual(actions[2]['_id'], 'EXISTING_ID')
+        self.assertEqual(errors, [])
+
+    def test_reports_item_errors(self):
+        self.mock_search().filter().filter().source().scan.return_value = []
+        error = {'index': {'status': 400, 'error': 'mapper_parsing_exception'}}
+        self.mock_bulk.return_value = iter([(False, error)])
+
+        errors = bulk_index_level(MagicMock(), '/path', [], [self._mock_file('/path/file1')],
+                                  'test.system', 'test_user', update_pems=False)
+        self.assertEqual(errors, [error])
+
+
+    def test_incremental_skips_unchanged_entries(self):
+        from designsafe.apps.data.models.elasticsearch import IndexedFile
+        import dateutil.parser
+
+        def indexed(path, length):
+            hit = MagicMock(path=path, length=length,
+                            lastModified=dateutil.parser.parse('2020-01-01T00:00:00.000-06:00'))
+            hit.meta.id = IndexedFile.doc_id('test.system', path)
+            return hit
+        self.mock_search().filter().filter().source().scan.return_value = [
+            indexed('/path/unchanged', 4096), indexed('/path/changed', 1)]
+
+        actions = []
+        def consume(client, gen, **kwargs):
+            actions.extend(gen)
+            return iter([])
+        self.mock_bulk.side_effect = consume
+
+        folders = [self._mock_file('/path/unchanged', format='folder'),
+                   self._mock_file('/path/changed', format='folder')]
+        bulk_index_level(MagicMock(), '/path', folders, [], 'test.system', 'test_user',
+                         update_pems=False, incremental=True, skip_unchanged_folders=True)
+
+        self.assertEqual([a['doc']['path'] for a in actions], ['/path/changed'])
+        self.assertEqual([f.path for f in folders], ['/path/changed'])
+
+
+class TestPruneLevel(TestCase):
+
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.delete_subtrees')
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.search')
+    def test_deletes_stale_subtrees_in_one_call(self, mock_search, mock_delete_subtrees):
+        mock_search().filter().filter().source().scan.return_value = [
+            MagicMock(path='/path/kept'), MagicMock(path='/path/gone1'), MagicMock(path='/path/gone2')]
+        prune_level('test.system', '/path', [MagicMock(path='/path/kept')])
+        mock_delete_subtrees.assert_called_once_with('test.system', {'/path/gone1', '/path/gone2'})
+
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.delete_subtrees')
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.search')
+    def test_nothing_stale(self, mock_search, mock_delete_subtrees):
+        mock_search().filter().filter().source().scan.return_value = [MagicMock(path='/path/kept')]
+        prune_level('test.system', '/path', [MagicMock(path='/path/kept')])
+        self.assertEqual(mock_delete_subtrees.call_count, 0)
+
+
+class TestLevelPermissions(TestCase):
+
+    def test_fetches_each_child(self):
+        client = MagicMock()
+        client.files.listPermissions.side_effect = lambda systemId, filePath: [
+            {'username': filePath.split('/')[-1], 'recursive': False,
+             'permission': {'read': True, 'write': False, 'execute': False},
+             '_links': {}}]
+        children = [MagicMock(path='/path/file1'), MagicMock(path='/path/file2')]
+
+        permissions = level_permissions(client, 'test.system', '/path', children)
+
+        self.assertEqual(client.files.listPermissions.call_count, 2)
+        client.files.listPermissions.assert_any_call(systemId='test.system', filePath='/path/file2')
+        self.assertEqual(client.files.list.call_count, 0)
+        self.assertEqual(permissions['/path/file1'][0]['username'], 'file1')
+        self.assertEqual(permissions['/path/file2'][0]['username'], 'file2')
+        self.assertNotIn('_links', permissions['/path/file1'][0])
+
+    def test_empty_level(self):
+        client = MagicMock()
+        self.assertEqual(level_permissions(client, 'test.system', '/path', []), {})
+        self.assertEqual(client.files.listPermissions.call_count, 0)
+
+    @patch('designsafe.libs.elasticsearch.utils.prune_level')
+    @patch('designsafe.libs.elasticsearch.utils.record_level_usage')
+    @patch('designsafe.libs.elasticsearch.utils.level_permissions')
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.from_path')
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.search')
+    def test_index_level_updates_indexed_doc(self, mock_search, mock_from_path, mock_permissions,
+                                             mock_usage, mock_prune):
+        mock_search().filter().filter().source().scan.return_value = []
+        existing = IndexedFile(system='test.system', path='/path/file1', name='file1',
+                               permissions=[{'username': 'old_user', 'recursive': False,
+                                             'permission': {'read': True}}])
+        mock_from_path.return_value = existing
+        new_pems = [{'username': 'new_user', 'recursive': False,
+                     'permission': {'read': True, 'write': False, 'execute': False}}]
+        mock_permissions.return_value = {'/path/file1': new_pems}
+
+        mock_file = MagicMock(path='/path/file1')
+        mock_file.to_dict.return_value = {'name': 'file1', 'path': '/path/file1', 'system': 'test.system',
+                                          'permissions': 'ALL', 'trail': [], '_links': {}}
+        with patch('elasticsearch_dsl.Document.save') as mock_save:
+            index_level(MagicMock(), '/path', [], [mock_file], 'test.system', 'test_user')
+
+        self.assertEqual(mock_save.call_count, 1)
+        self.assertEqual(existing.to_dict()['permissions'], new_pems)
+        self.assertEqual(list(existing.readers), ['new_user'])
+
+
+class TestWalkLevels(TestCase):
+
+    TREE = {
+        '/root': ['/root/a', '/root/b', '/root/file1'],
+        '/root/a': ['/root/a/c', '/root/a/file2'],
+        '/root/a/c': [],
+        '/root/b': ['/root/b/file3'],
+    }
+
+    def _list(self, systemId, filePath, offset=0, limit=100):
+        if offset:
+            return []
+        return [{'name': child.split('/')[-1],
+                 'path': child,
+                 'system': systemId,
+                 'format': 'folder' if child in self.TREE else 'raw'}
+                for child in self.TREE[filePath]]
+
+    def _walk(self, **kwargs):
+        client = MagicMock()
+        client.files.list.side_effect = self._list
+        return [(root, [f.path for f in folders], [f.path for f in files])
+                for root, folders, files in walk_levels(client, 'test.system', '/root', **kwargs)]
+
+    def test_concurrent_walk_matches_serial_walk(self):
+        self.assertEqual(self._walk(), self._walk(max_workers=4))
+        self.assertEqual(self._walk(bottom_up=True), self._walk(bottom_up=True, max_workers=4))
+
+    def test_concurrent_walk_respects_pruned_folders(self):
+        client = MagicMock()
+        client.files.list.side_effect = self._list
+        roots = []
+        for root, folders, files in walk_levels(client, 'test.system', '/root', max_workers=4):
+            roots.append(root)
+            folders[:] = [f for f in folders if f.path != '/root/a']
+        self.assertEqual(roots, ['/root', '/root/b'])
+
+    def test_filters_apply_below_the_top_level(self):
+        self.TREE = dict(self.TREE)
+        self.TREE['/root/a/c'] = ['/root/a/c/.hidden', '/root/a/c/Trash', '/root/a/c/file4']
+        self.TREE['/root/a/c/.hidden'] = ['/root/a/c/.hidden/file5']
+        self.TREE['/root/a/c/Trash'] = ['/root/a/c/Trash/file6']
+        for max_workers in (None, 4):
+            levels = self._walk(ignore_hidden=True, paths_to_ignore=['Trash'],
+                                max_workers=max_workers)
+            self.assertEqual([root for root, _, _ in levels],
+                             ['/root', '/root/a', '/root/a/c', '/root/b'])
+            self.assertEqual(levels[2], ('/root/a/c', [], ['/root/a/c/file4']))
+
+
+class TestPosixListing(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        os.makedirs(os.path.join(self.root, 'community', 'data', 'folder'))
+        with open(os.path.join(self.root, 'community', 'data', 'file.txt'), 'w') as f:
+            f.write('hello')
+
+    def test_uses_tapis_when_not_mounted(self):
+        self.assertEqual(listing_backend('designsafe.storage.community'), tapis_listing)
+
+    def test_listing_matches_tapis_format(self):
+        with override_settings(INDEXER_POSIX_ROOT=self.root):
+            self.assertEqual(listing_backend('designsafe.storage.community'), posix_listing)
+            listing = sorted(posix_listing(None, 'designsafe.storage.community', '/data'),
+                             key=lambda f: f['name'])
+
+        self.assertEqual([f['path'] for f in listing], ['/data/file.txt', '/data/folder'])
+        self.assertEqual(listing[0]['format'], 'raw')
+        self.assertEqual(listing[0]['length'], 5)
+        self.assertEqual(listing[0]['mimeType'], 'text/plain')
+        self.assertEqual(listing[1]['format'], 'folder')
+        for json_file in listing:
+            self.assertEqual(json_file['system'], 'designsafe.storage.community')
+            self.assertIn('lastModified', json_file)
+
+    def test_walk_levels_uses_posix_backend(self):
+        client = MagicMock()
+        with override_settings(INDEXER_POSIX_ROOT=self.root):
+            levels = [(root, [f.path for f in folders], [f.path for f in files])
+                      for root, folders, files in walk_levels(client, 'designsafe.storage.community', '/data')]
+        self.assertEqual(levels, [('/data', ['/data/folder'], ['/data/file.txt']),
+                                  ('/data/folder', [], [])])
+        self.assertEqual(client.files.list.call_count, 0)
+
+
+class TestAliasCache(TestCase):
+
+    def setUp(self):
+        from designsafe.libs.elasticsearch import aliases
+        self.aliases = aliases
+        self.patch_conn = patch('designsafe.libs.elasticsearch.aliases.connections')
+        self.mock_conn = self.patch_conn.start()
+        self.addCleanup(self.patch_conn.stop)
+        self.addCleanup(aliases.invalidate)
+        self.mock_get_alias = self.mock_conn.get_connection().indices.get_alias
+        self.mock_get_alias.return_value = {
+            'files-2020': {'aliases': {'files': {}}},
+            'cms-2020': {'aliases': {'cms': {}}},
+        }
+
+    def test_resolves_aliases_in_one_request(self):
+        self.assertEqual(self.aliases.resolve_aliases('files', 'cms'),
+                         {'files': 'files-2020', 'cms': 'cms-2020'})
+        self.mock_get_alias.assert_called_once_with(name='files,cms', ignore=404)
+
+    def test_caches_resolutions(self):
+        self.aliases.resolve_alias('files')
+        self.assertEqual(self.aliases.resolve_alias('files'), 'files-2020')
+        self.assertEqual(self.mock_get_alias.call_count, 1)
+
+    def test_invalidate(self):
+        self.aliases.resolve_alias('files')
+        self.aliases.invalidate('files')
+        self.aliases.resolve_alias('files')
+        self.assertEqual(self.mock_get_alias.call_count, 2)
+
+    @override_settings(ES_ALIAS_CACHE_TTL=0)
+    def test_expired_resolutions_are_refreshed(self):
+        self.aliases.resolve_alias('files')
+        self.aliases.resolve_alias('files')
+        self.assertEqual(self.mock_get_alias.call_count, 2)
+
+    def test_missing_alias_is_not_cached(self):
+        self.mock_get_alias.return_value = {'error': 'alias [missing] missing', 'status': 404}
+        self.assertEqual(self.aliases.resolve_aliases('missing'), {'missing': None})
+        with self.assertRaises(NotFoundError) as cm:
+            self.aliases.resolve_alias('missing')
+        self.assertIn('missing', str(cm.exception))
+        self.assertEqual(self.mock_get_alias.call_count, 2)
+
+
+class TestPagination(TestCase):
+
+    def test_offset_pagination(self):
+        from designsafe.libs.elasticsearch.pagination import paginate
+        search = IndexedFile.search().sort('name._exact', 'path._exact')
+        body = paginate(search, offset='20', limit='10').to_dict()
+        self.assertEqual(body['from'], 20)
+        self.assertEqual(body['size'], 10)
+        self.assertNotIn('search_after', body)
+
+    def test_cursor_pagination(self):
+        from designsafe.libs.elasticsearch.pagination import paginate, encode_cursor
+        search = IndexedFile.search().sort('name._exact', 'path._exact')
+        cursor = encode_cursor(['file1', '/path/file1'])
+        body = paginate(search, offset=20, limit=10, cursor=cursor).to_dict()
+        self.assertEqual(body['search_after'], ['file1', '/path/file1'])
+        self.assertEqual(body['size'], 10)
+        self.assertNotIn('from', body)
+
+    def test_invalid_cursor(self):
+        from designsafe.apps.api.exceptions import ApiException
+        from designsafe.libs.elasticsearch.pagination import paginate
+        with self.assertRaises(ApiException):
+            paginate(IndexedFile.search(), cursor='not a cursor')
+
+    def test_next_cursor(self):
+        from designsafe.libs.elasticsearch.pagination import next_cursor, decode_cursor
+        last_hit = MagicMock()
+        last_hit.meta.sort = ['file2', '/path/file2']
+        res = MagicMock()
+        res.hits = [MagicMock(), last_hit]
+        self.assertEqual(decode_cursor(next_cursor(res, 2)), ['file2', '/path/file2'])
+        self.assertIsNone(next_cursor(res, 10))
+
+
+class TestScan(TestCase):
+
+    def _search(self, hits_per_slice):
+        search = MagicMock()
+        search.params.return_value = search
+
+        def sliced(slice):
+            sliced_search = MagicMock()
+            sliced_search.scan.side_effect = lambda: iter(
+                '{}-{}'.format(slice['id'], i) for i in range(hits_per_slice))
+            return sliced_search
+        search.extra.side_effect = sliced
+        search.scan.side_effect = lambda: iter(range(hits_per_slice))
+        return search
+
+    def test_scan(self):
+        from designsafe.libs.elasticsearch.pagination import scan
+        search = self._search(5)
+        self.assertEqual(list(scan(search, batch_size=2)), [0, 1, 2, 3, 4])
+        search.params.assert_called_with(size=2, scroll='5m')
+
+    def test_sliced_scan(self):
+        from designsafe.libs.elasticsearch.pagination import scan
+        search = self._search(50)
+        hits = list(scan(search, batch_size=2, slices=3))
+        self.assertEqual(sorted(hits), sorted('{}-{}'.format(slice_id, i)
+                                              for slice_id in range(3) for i in range(50)))
+
+    def test_sliced_scan_raises_slice_errors(self):
+        from designsafe.libs.elasticsearch.pagination import scan
+        search = self._search(5)
+        search.extra.side_effect = Exception('scroll expired')
+        with self.assertRaises(Exception):
+            list(scan(search, slices=2))
+
+
+class TestBackoffTransport(TestCase):
+
+    def _transport(self, **kwargs):
+        from designsafe.libs.elasticsearch.client import BackoffTransport
+        connection = MagicMock()
+        connection_class = MagicMock(return_value=connection)
+        transport = BackoffTransport([{'host': 'localhost'}], connection_class=connection_class,
+                                     retry_on_timeout=True, **kwargs)
+        return transport, connection
+
+    @patch('designsafe.libs.elasticsearch.client.time.sleep')
+    def test_backs_off_between_retries(self, mock_sleep):
+        from elasticsearch import ConnectionTimeout
+        transport, connection = self._transport(max_retries=3, retry_backoff=1, retry_backoff_max=3)
+        connection.perform_request.side_effect = ConnectionTimeout('TIMEOUT', 'timed out', None)
+        with self.assertRaises(ConnectionTimeout):
+            transport.perform_request('GET', '/')
+        self.assertEqual(connection.perform_request.call_count, 4)
+        self.assertEqual([c[0][0] for c in mock_sleep.call_args_list], [1, 2, 3])
+        self.assertEqual((transport.requests, transport.retries), (1, 4))
+
+    @patch('designsafe.libs.elasticsearch.client.time.sleep')
+    def test_retry_count_is_per_request(self, mock_sleep):
+        from elasticsearch import ConnectionTimeout
+        transport, connection = self._transport(max_retries=1, retry_backoff=1)
+        connection.perform_request.side_effect = [ConnectionTimeout('TIMEOUT', 'timed out', None),
+                                                  (200, {}, '{}')] * 2
+        transport.perform_request('GET', '/')
+        transport.perform_request('GET', '/')
+        self.assertEqual([c[0][0] for c in mock_sleep.call_args_list], [1, 1])
+
+    def test_pool_stats(self):
+        from designsafe.libs.elasticsearch import client
+        transport, connection = self._transport()
+        connection.host = 'http://localhost:9200'
+        connection.pool.num_connections = 2
+        connection.pool.num_requests = 10
+        connection.pool.pool.qsize.return_value = 1
+        with patch.object(client, 'get_client', return_value=MagicMock(transport=transport)):
+            stats = client.pool_stats()
+        self.assertEqual(stats['nodes'], [{'host': 'http://localhost:9200', 'live': True, 'failures': 0,
+                                           'open_connections': 2, 'idle_connections': 1,
+                                           'requests': 10}])
+
+
+class TestFullDedup(TestCase):
+
+    def setUp(self):
+        self.patch_search = patch('designsafe.apps.data.models.elasticsearch.IndexedFile.search')
+        self.patch_bulk = patch('elasticsearch.helpers.streaming_bulk')
+        self.patch_client = patch('designsafe.libs.elasticsearch.client.get_client')
+
+        self.mock_search = self.patch_search.start()
+        self.mock_bulk = self.patch_bulk.start()
+        self.mock_client = self.patch_client.start()
+
+        self.addCleanup(self.patch_search.stop)
+        self.addCleanup(self.patch_bulk.stop)
+        self.addCleanup(self.patch_client.stop)
+
+        def bucket(path, doc_count):
+            bucket = MagicMock(doc_count=doc_count)
+            bucket.key.system = 'test.system'
+            bucket.key.path = path
+            return bucket
+        res = MagicMock()
+        res.aggregations.paths.buckets = [bucket('/path/dup', 3), bucket('/path/single', 1)]
+        res.aggregations.paths.after_key = None
+        self.mock_search().extra().execute.return_value = res
+
+        def hit(doc_id, last_modified):
+            hit = MagicMock(system='test.system', path='/path/dup', lastModified=last_modified)
+            hit.meta.id = doc_id
+            return hit
+        self.mock_search().filter().source().scan.return_value = [
+            hit('LEGACY_NEW', '2020-01-03'),
+            hit(IndexedFile.doc_id('test.system', '/path/dup'), '2020-01-01'),
+            hit('LEGACY_OLD', '2020-01-02')]
+
+        self.actions = []
+        def consume(client, gen, **kwargs):
+            self.actions.extend(gen)
+            return iter([(True, {})] * len(self.actions))
+        self.mock_bulk.side_effect = consume
+
+    def test_keeps_doc_with_derived_id(self):
+        report = full_dedup()
+        self.assertEqual(sorted(a['_id'] for a in self.actions), ['LEGACY_NEW', 'LEGACY_OLD'])
+        self.assertEqual(report['paths'], 2)
+        self.assertEqual(report['duplicated_paths'], 1)
+        self.assertEqual(report['deleted'], 2)
+
+    def test_dry_run(self):
+        progress = MagicMock()
+        report = full_dedup(dry_run=True, progress=progress)
+        self.assertEqual(self.mock_bulk.call_count, 0)
+        self.assertEqual((report['duplicates'], report['deleted']), (2, 0))
+        self.assertEqual(progress.call_count, 1)
+
+    def test_keeps_most_recent_legacy_doc(self):
+        from designsafe.libs.elasticsearch.utils import _duplicate_ids
+        hits = list(self.mock_search().filter().source().scan.return_value)
+        hits[1].meta.id = 'LEGACY_OLDEST'
+        self.assertEqual(_duplicate_ids(hits), ['LEGACY_OLD', 'LEGACY_OLDEST'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestMaintenanceRunner(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        self.patch_bulk = patch('designsafe.libs.elasticsearch.maintenance.parallel_bulk')
+        self.patch_client = patch('designsafe.libs.elasticsearch.maintenance.get_client')
+        self.mock_bulk = self.patch_bulk.start()
+        self.mock_client = self.patch_client.start()
+        self.addCleanup(self.patch_bulk.stop)
+        self.addCleanup(self.patch_client.stop)
+        self.addCleanup(cache.clear)
+
+        self.failing_ids = set()
+        self.actions = []
+        def consume(client, gen, **kwargs):
+            for action in gen:
+                self.actions.append(action)
+                yield action['_id'] not in self.failing_ids, {'update': {'_id': action['_id']}}
+        self.mock_bulk.side_effect = consume
+
+        self.search = MagicMock()
+        def sliced(slice):
+            hits = []
+            for i in range(slice['id'], 20, slice['max']):
+                hit = MagicMock()
+                hit.meta.id = 'doc{}'.format(i)
+                hits.append(hit)
+            return MagicMock(scan=MagicMock(return_value=hits))
+        self.search.params.return_value.extra.side_effect = sliced
+
+    def _transform(self, hit):
+        if hit.meta.id == 'doc0':
+            return None
+        return {'_op_type': 'update', '_id': hit.meta.id, 'doc': {}}
+
+    def test_runs_every_slice(self):
+        from designsafe.libs.elasticsearch import maintenance
+        report = maintenance.run(self.search, self._transform, name='test', slices=4)
+        self.assertEqual((report['hits'], report['actions']), (20, 19))
+        self.assertEqual(report['slices_done'], [0, 1, 2, 3])
+        self.assertEqual(len(self.actions), 19)
+
+    def test_resumes_from_checkpoint(self):
+        from designsafe.libs.elasticsearch import maintenance
+        self.failing_ids = {'doc5'}
+        report = maintenance.run(self.search, self._transform, name='test', slices=4)
+        self.assertEqual(report['slices_done'], [0, 2, 3])
+        self.assertEqual(len(report['errors']), 1)
+
+        self.failing_ids = set()
+        self.actions = []
+        report = maintenance.run(self.search, self._transform, name='test', slices=4, resume=True)
+        self.assertEqual(report['slices_done'], [0, 1, 2, 3])
+        self.assertEqual(sorted(a['_id'] for a in self.actions),
+                         sorted('doc{}'.format(i) for i in range(1, 20, 4)))
+
+    def test_dry_run(self):
+        from designsafe.libs.elasticsearch import maintenance
+        report = maintenance.run(self.search, self._transform, slices=4, dry_run=True)
+        self.assertEqual(report['actions'], 19)
+        self.assertEqual(self.mock_bulk.call_count, 0)
+
+
+class TestSubtreeQuery(TestCase):
+
+    def test_path_depth(self):
+        self.assertEqual(IndexedFile.path_depth('/'), 0)
+        self.assertEqual(IndexedFile.path_depth('user'), 1)
+        self.assertEqual(IndexedFile.path_depth('/user/dir/'), 2)
+
+    def test_subtree(self):
+        self.assertEqual(IndexedFile.subtree_query('user/dir/').to_dict(),
+                         {'term': {'path._path': '/user/dir'}})
+
+    def test_subtree_without_root(self):
+        self.assertEqual(IndexedFile.subtree_query('/user/dir', include_root=False).to_dict(),
+                         {'bool': {'must': [{'term': {'path._path': '/user/dir'}},
+                                            {'range': {'depth': {'gt': 2}}}]}})
+        self.assertEqual(IndexedFile.subtree_query('/', include_root=False).to_dict(),
+                         {'range': {'depth': {'gt': 0}}})
+
+    def test_save_sets_depth(self):
+        doc = IndexedFile(system='test.system', path='/user/dir/file.txt')
+        with patch('elasticsearch_dsl.Document.save') as mock_save:
+            doc.save()
+        self.assertEqual(doc.depth, 3)
+
+
+class TestReaders(TestCase):
+
+    def test_readers_of(self):
+        permissions = [
+            {'username': 'owner', 'permission': {'read': True, 'write': True}},
+            {'username': 'writer', 'permission': {'read': False, 'write': True}},
+            {'username': 'WORLD', 'permission': {'read': True}},
+            {'username': 'owner', 'recursive': True, 'permission': {'read': True}},
+        ]
+        self.assertEqual(IndexedFile.readers_of(permissions), ['WORLD', 'owner'])
+        self.assertEqual(IndexedFile.readers_of(None), [])
+
+    def test_pems_filter(self):
+        self.assertEqual(IndexedFile.pems_filter('user').to_dict(),
+                         {'terms': {'readers': ['user', 'WORLD']}})
+
+    def test_cleared_permissions_clear_readers(self):
+        doc = IndexedFile(system='test.system', path='/path/file1', name='file1',
+                          permissions=[{'username': 'old_user', 'recursive': False,
+                                        'permission': {'read': True}}],
+                          readers=['old_user'])
+        doc.permissions = []
+        with patch('elasticsearch_dsl.Document.save'):
+            doc.save()
+        self.assertEqual(list(doc.readers), [])
+        visible_to = IndexedFile.pems_filter('old_user').to_dict()['terms']['readers']
+        self.assertFalse(set(doc.to_dict().get('readers', [])) & set(visible_to))
+
+    @patch('designsafe.libs.elasticsearch.utils.level_permissions')
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.search')
+    @patch('elasticsearch.helpers.streaming_bulk')
+    def test_bulk_index_level_sets_readers(self, mock_bulk, mock_search, mock_permissions):
+        mock_search().filter().filter().source().scan.return_value = []
+        mock_permissions.return_value = {
+            '/path/file1': [{'username': 'user', 'recursive': False,
+                             'permission': {'read': True, 'write': False, 'execute': False}}]}
+        actions = []
+        def consume(client, gen, **kwargs):
+            actions.extend(gen)
+            return iter([])
+        mock_bulk.side_effect = consume
+
+        mock_file = MagicMock(path='/path/file1')
+        mock_file.to_dict.return_value = {'name': 'file1', 'path': '/path/file1', 'system': 'test.system',
+                                          'permissions': 'READ', 'trail': [], '_links': {}}
+        with patch('designsafe.apps.data.models.elasticsearch.IndexedFile._get_connection'):
+            bulk_index_level(MagicMock(), '/path', [], [mock_file], 'test.system', 'test_user')
+        self.assertEqual(actions[0]['doc']['readers'], ['user'])
+        self.assertEqual(actions[0]['doc']['depth'], 2)
+
+    @patch('designsafe.libs.elasticsearch.utils.level_permissions')
+    @patch('designsafe.apps.data.models.elasticsearch.IndexedFile.search')
+    @patch('elasticsearch.helpers.streaming_bulk')
+    def test_bulk_index_level_clears_readers(self, mock_bulk, mock_search, mock_permissions):
+        mock_search().filter().filter().source().scan.return_value = []
+        mock_permissions.return_value = {'/path/file1': []}
+        actions = []
+        def consume(client, gen, **kwargs):
+            actions.extend(gen)
+            return iter([])
+        mock_bulk.side_effect = consume
+
+        mock_file = MagicMock(path='/path/file1')
+        mock_file.to_dict.return_value = {'name': 'file1', 'path': '/path/file1', 'system': 'test.system',
+                                          'permissions': 'READ', 'trail': [], '_links': {}}
+        with patch('designsafe.apps.data.models.elasticsearch.IndexedFile._get_connection'):
+            bulk_index_level(MagicMock(), '/path', [], [mock_file], 'test.system', 'test_user')
+        self.assertEqual(actions[0]['doc']['permissions'], [])
+        self.assertEqual(actions[0]['doc']['readers'], [])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestBulkLoad(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        self.patch_apply = patch('designsafe.libs.elasticsearch.indices.apply_settings')
+        self.patch_restore = patch('designsafe.libs.elasticsearch.indices.restore_settings')
+        self.mock_apply = self.patch_apply.start()
+        self.mock_restore = self.patch_restore.start()
+        self.addCleanup(self.patch_apply.stop)
+        self.addCleanup(self.patch_restore.stop)
+        self.addCleanup(cache.clear)
+        self.mock_apply.return_value = {'refresh_interval': None, 'translog.durability': None}
+
+    def test_restores_settings_on_error(self):
+        from designsafe.libs.elasticsearch.indices import bulk_load
+        with self.assertRaises(ValueError):
+            with bulk_load('files'):
+                raise ValueError
+        self.mock_apply.assert_called_once_with('files', {'refresh_interval': '30s',
+                                                          'translog.durability': 'async'})
+        self.mock_restore.assert_called_once_with('files', {'refresh_interval': None,
+                                                            'translog.durability': None})
+
+    def test_nested_holders_share_settings(self):
+        from designsafe.libs.elasticsearch.indices import bulk_load
+        with bulk_load('files', refresh_interval='-1', number_of_replicas=0):
+            with bulk_load('files', refresh_interval='-1', number_of_replicas=0):
+                pass
+            self.assertEqual(self.mock_restore.call_count, 0)
+        self.assertEqual(self.mock_apply.call_count, 1)
+        self.assertEqual(self.mock_apply.call_args[0][1]['number_of_replicas'], 0)
+        self.assertEqual(self.mock_restore.call_count, 1)
+
+    def test_evicted_holder_count_is_seeded_again(self):
+        from django.core.cache import cache
+        from designsafe.libs.elasticsearch.indices import enter_bulk_load, leave_bulk_load
+        incr = cache.incr
+        calls = []
+        def evicting_incr(key, *args, **kwargs):
+            calls.append(key)
+            if len(calls) == 1:
+                cache.delete(key)
+            return incr(key, *args, **kwargs)
+        with patch.object(cache, 'incr', side_effect=evicting_incr):
+            self.assertTrue(enter_bulk_load('files'))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.mock_apply.call_count, 1)
+        leave_bulk_load('files')
+        self.mock_restore.assert_called_once_with('files', {'refresh_interval': None,
+                                                            'translog.durability': None})
+
+    def test_unreachable_cache_skips_bulk_load(self):
+        from django.core.cache import cache
+        from designsafe.libs.elasticsearch.indices import bulk_load, enter_bulk_load
+        with patch.object(cache, 'incr', side_effect=ValueError):
+            self.assertFalse(enter_bulk_load('files'))
+            with bulk_load('files'):
+                pass
+        self.assertEqual(self.mock_apply.call_count, 0)
+        self.assertEqual(self.mock_restore.call_count, 0)
+
+    def test_lost_settings_are_reset(self):
+        from django.core.cache import cache
+        from designsafe.libs.elasticsearch.indices import (
+            enter_bulk_load, leave_bulk_load, BULK_LOAD_RESET_SETTINGS)
+        self.mock_apply.return_value = {'refresh_interval': '5s', 'translog.durability': 'request'}
+        enter_bulk_load('files')
+        cache.clear()
+        leave_bulk_load('files')
+        leave_bulk_load('files')
+        self.assertEqual(self.mock_restore.call_args_list,
+                         [call('files', BULK_LOAD_RESET_SETTINGS)] * 2)
+        self.assertIsNone(cache.get('es_bulk_load:files:holders'))
+
+
+class TestSuggest(TestCase):
+
+    def test_suggest_query(self):
+        search = IndexedFile.suggest('test.system', '/user/dir', 'temp da', limit=5)
+        body = search.to_dict()
+        self.assertEqual(body['query']['bool']['filter'], [
+            {'match': {'name._suggest': {'query': 'temp da', 'operator': 'and'}}},
+            {'term': {'system._exact': 'test.system'}},
+            {'bool': {'must': [{'term': {'path._path': '/user/dir'}},
+                               {'range': {'depth': {'gt': 2}}}]}},
+        ])
+        self.assertNotIn('must', body['query']['bool'])
+        self.assertEqual(body['size'], 5)
+        self.assertFalse(body['track_total_hits'])
+        self.assertEqual(body['sort'], ['name._exact', 'path._exact'])
+
+    def test_suggest_analyzers(self):
+        from designsafe.libs.elasticsearch.analyzers import file_suggest_analyzer
+        mapping = IndexedFile._doc_type.mapping.to_dict()
+        self.assertEqual(mapping['properties']['name']['fields']['_suggest'],
+                         {'type': 'text', 'analyzer': 'file_suggest',
+                          'search_analyzer': 'file_suggest_search'})
+        self.assertEqual(file_suggest_analyzer.get_definition()['tokenizer'], 'file_suggest_edge')
+
+    def test_suggest_truncates_long_words(self):
+        from designsafe.libs.elasticsearch.analyzers import (
+            file_suggest_analyzer, file_suggest_search_analyzer, FILE_SUGGEST_MAX_GRAM)
+        word = 'temperaturemeasurements2020'
+        self.assertGreater(len(word), FILE_SUGGEST_MAX_GRAM)
+        search = IndexedFile.suggest('test.system', '/user/dir', word)
+        self.assertEqual(search.to_dict()['query']['bool']['filter'][0],
+                         {'match': {'name._suggest': {'query': word, 'operator': 'and'}}})
+        index_definition = file_suggest_analyzer.get_analysis_definition()
+        search_definition = file_suggest_search_analyzer.get_analysis_definition()
+        self.assertEqual(index_definition['tokenizer']['file_suggest_edge']['max_gram'],
+                         FILE_SUGGEST_MAX_GRAM)
+        self.assertEqual(search_definition['filter']['file_suggest_truncate'],
+                         {'type': 'truncate', 'length': FILE_SUGGEST_MAX_GRAM})
+        self.assertEqual(file_suggest_search_analyzer.get_definition()['filter'],
+                         ['lowercase', 'file_suggest_truncate'])
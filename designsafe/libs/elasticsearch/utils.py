@@ -2,14 +2,149 @@ from future.utils import python_2_unicode_compatible
 import urllib.request, urllib.parse, urllib.error
 import logging
 import os 
+import six
+import datetime
+import mimetypes
+import threading
+import dateutil.parser
+import dateutil.tz
+from concurrent.futures import ThreadPoolExecutor
 
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
+_listing_semaphores = {}
+_listing_semaphores_lock = threading.Lock()
+
+
+def _listing_semaphore(system):
+    """Process-wide semaphore capping concurrent listings of a system.
+
+    The cap is read from ``settings.INDEXER_LISTING_CONCURRENCY``.
+    """
+    with _listing_semaphores_lock:
+        if system not in _listing_semaphores:
+            _listing_semaphores[system] = threading.BoundedSemaphore(_listing_cap(system))
+        return _listing_semaphores[system]
+
+
+def _listing_cap(system):
+    caps = getattr(settings, 'INDEXER_LISTING_CONCURRENCY', {})
+    return caps.get(system, caps.get('default', 4))
+
+
+def tapis_listing(client, system, path):
+    """List a directory through the Tapis files API.
+
+    :returns: list of file dicts as returned by ``files.list``.
+    :rtype: list
+    """
+    from designsafe.apps.api.agave.listing import iterate_listing
+    with _listing_semaphore(system):
+        # The whole listing is collected at once, so there is nothing to
+        # overlap a prefetch with; walk_levels(max_workers=N) lists
+        # directories concurrently instead.
+        return list(iterate_listing(client, system, path, prefetch=False))
+
+
+def posix_root(system):
+    """Local mount point of a storage system, or ``None``.
+
+    Systems are mapped to directories under ``settings.INDEXER_POSIX_ROOT``
+    with ``settings.INDEXER_POSIX_SYSTEMS``; ``project-<uuid>`` systems map
+    to ``projects/<uuid>``.
+    """
+    root = getattr(settings, 'INDEXER_POSIX_ROOT', None)
+    if not root:
+        return None
+    dirname = getattr(settings, 'INDEXER_POSIX_SYSTEMS', {}).get(system)
+    if dirname is None and system.startswith('project-'):
+        dirname = 'projects/{}'.format(system.replace('project-', '', 1))
+    if dirname is None:
+        return None
+    system_root = os.path.join(root, dirname)
+    if not os.path.isdir(system_root):
+        return None
+    return system_root
+
+
+def posix_listing(client, system, path):
+    """List a directory of a locally mounted storage system with
+    :func:`os.scandir`.
+
+    The dicts have the same keys as a Tapis listing so they can be wrapped
+    in ``BaseFileResource`` and indexed the same way.
+
+    :returns: list of file dicts.
+    :rtype: list
+    """
+    root = posix_root(system)
+    local_path = os.path.join(root, path.strip('/'))
+    listing = []
+    for entry in os.scandir(local_path):
+        stat = entry.stat(follow_symlinks=False)
+        is_dir = entry.is_dir(follow_symlinks=False)
+        if is_dir:
+            mime_type = 'text/directory'
+        else:
+            mime_type = mimetypes.guess_type(entry.name)[0] or 'application/octet-stream'
+        listing.append({
+            'name': entry.name,
+            'path': '/' + os.path.join(path.strip('/'), entry.name).strip('/'),
+            'system': system,
+            'length': stat.st_size,
+            'lastModified': datetime.datetime.fromtimestamp(
+                stat.st_mtime, tz=dateutil.tz.tzlocal()).isoformat(),
+            'format': 'folder' if is_dir else 'raw',
+            'type': 'dir' if is_dir else 'file',
+            'mimeType': mime_type,
+            'permissions': None,
+            '_links': {},
+        })
+    return listing
+
+
+def listing_backend(system):
+    """Pick the listing function used to walk a system.
+
+    Systems mounted locally (see :func:`posix_root`) are listed with
+    :func:`posix_listing`, everything else goes through Tapis.
+    """
+    if posix_root(system) is not None:
+        return posix_listing
+    return tapis_listing
+
+
+def _list_level(client, system, path, ignore_hidden=False, paths_to_ignore=[],
+                backend=tapis_listing):
+    """List one directory and split it into folders and files.
+
+    :returns: ([<``BaseFile`` folders>], [<``BaseFile`` files>])
+    :rtype: tuple
+    """
+    from designsafe.apps.data.models.agave.files import BaseFileResource
+    listing = backend(client, system, path)
+
+    folders = []
+    files = []
+    for json_file in listing:
+        if json_file['name'] == '.':
+            continue
+        if (ignore_hidden and json_file['name'][0] == '.') or (json_file['name'] in paths_to_ignore):
+            continue
+        _file = BaseFileResource(client, **json_file)
+        if _file.format == 'folder':
+            folders.append(_file)
+        else:
+            files.append(_file)
+    return folders, files
+
+
 # pylint: disable=too-many-locals
 @python_2_unicode_compatible
-def walk_levels(client, system, path, bottom_up=False, ignore_hidden=False, paths_to_ignore=[]):
+def walk_levels(client, system, path, bottom_up=False, ignore_hidden=False, paths_to_ignore=[],
+                max_workers=None, backend=None):
     """Walk a pth in an Agave storgae system.
 
     This generator will walk an agave storage system and return a tuple with
@@ -19,6 +154,14 @@ def walk_levels(client, system, path, bottom_up=False, ignore_hidden=False, path
     :param str system: system
     :param str path: path to walk
     :param bool bottom_up:if ``True`` walk the path bottom to top.
+    :param int max_workers: if set, list sibling directories concurrently
+        using a pool of this many threads. Concurrent listings of the same
+        system are also capped by ``settings.INDEXER_LISTING_CONCURRENCY``.
+        Levels are yielded in the same order as the serial walk.
+    :param backend: function used to list a directory, called as
+        ``backend(client, system, path)``. Defaults to
+        :func:`listing_backend`, which lists locally mounted systems with
+        :func:`os.scandir` and everything else through Tapis.
 
     :returns: (<str root_path>, [<``BaseFile`` folders>],
         [<``BaseFile`` files>])
@@ -41,35 +184,25 @@ def walk_levels(client, system, path, bottom_up=False, ignore_hidden=False, path
     ...         del folders[:]
 
     """
-    from designsafe.apps.data.models.agave.files import BaseFileResource
-    listing = []
-    offset = 0
-    limit = 100
-    page = client.files.list(systemId=system,
-                             filePath=urllib.parse.quote(path),
-                             offset=offset)
-    while True:
-        page = client.files.list(systemId=system,
-                                 filePath=urllib.parse.quote(path),
-                                 offset=offset)
-        listing += page
-        offset += limit
+    if backend is None:
+        backend = listing_backend(system)
 
-        if len(page) != limit:
-            break
+    if max_workers:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            root = executor.submit(_list_level, client, system, path,
+                                   ignore_hidden=ignore_hidden,
+                                   paths_to_ignore=paths_to_ignore,
+                                   backend=backend)
+            for level in _walk_levels_concurrent(executor, client, system, path,
+                                                 root, bottom_up=bottom_up,
+                                                 ignore_hidden=ignore_hidden,
+                                                 paths_to_ignore=paths_to_ignore,
+                                                 backend=backend):
+                yield level
+        return
 
-    folders = []
-    files = []
-    for json_file in listing:
-        if json_file['name'] == '.':
-            continue
-        if (ignore_hidden and json_file['name'][0] == '.') or (json_file['name'] in paths_to_ignore):
-            continue
-        _file = BaseFileResource(client, **json_file)
-        if _file.format == 'folder':
-            folders.append(_file)
-        else:
-            files.append(_file)
+    folders, files = _list_level(client, system, path, ignore_hidden=ignore_hidden,
+                                 paths_to_ignore=paths_to_ignore, backend=backend)
     if not bottom_up:
         yield (path, folders, files)
     for child in folders:
@@ -81,20 +214,84 @@ def walk_levels(client, system, path, bottom_up=False, ignore_hidden=False, path
             client,
             system,
             child.path,
-            bottom_up=bottom_up
+            bottom_up=bottom_up,
+            ignore_hidden=ignore_hidden,
+            paths_to_ignore=paths_to_ignore,
+            backend=backend
         ):
             yield (child_path, child_folders, child_files)
 
     if bottom_up:
         yield (path, folders, files)
 
+
+def _walk_levels_concurrent(executor, client, system, path, listing_future, bottom_up=False,
+                            ignore_hidden=False, paths_to_ignore=[], backend=tapis_listing):
+    """Walk a path using the listing already submitted for it.
+
+    The listings of every child folder are submitted together once the
+    parent level has been yielded (so in-place changes to ``folders`` are
+    respected), and are consumed depth first. ``ignore_hidden`` and
+    ``paths_to_ignore`` apply at every level, as in :func:`walk_levels`.
+    """
+    folders, files = listing_future.result()
+    if not bottom_up:
+        yield (path, folders, files)
+
+    child_futures = [(child.path, executor.submit(_list_level, client, system, child.path,
+                                                  ignore_hidden=ignore_hidden,
+                                                  paths_to_ignore=paths_to_ignore,
+                                                  backend=backend))
+                     for child in folders]
+    for child_path, child_future in child_futures:
+        for level in _walk_levels_concurrent(executor, client, system, child_path,
+                                             child_future, bottom_up=bottom_up,
+                                             ignore_hidden=ignore_hidden,
+                                             paths_to_ignore=paths_to_ignore,
+                                             backend=backend):
+            yield level
+
+    if bottom_up:
+        yield (path, folders, files)
+
 @python_2_unicode_compatible
-def index_level(client, path, folders, files, systemId, username, reindex=False, update_pems=True):
+def index_level(client, path, folders, files, systemId, username, reindex=False, update_pems=True,
+                bulk=False, chunk_size=500, refresh=False, incremental=False,
+                skip_unchanged_folders=False):
     """
     Index a set of folders and files corresponding to the output from one 
     iteration of walk_levels
+
+    :param bool bulk: if ``True`` write the whole level using the bulk API.
+        See :func:`bulk_index_level`.
+    :param int chunk_size: number of docs per bulk request when ``bulk=True``.
+    :param refresh: refresh policy for the writes, e.g. ``'wait_for'`` when
+        the caller needs to search for the level right after indexing it.
+    :param bool incremental: only write entries whose ``lastModified`` or
+        ``length`` differ from the indexed doc. Implies ``bulk=True``.
+    :param bool skip_unchanged_folders: with ``incremental=True``, remove
+        unchanged folders from ``folders`` in place so callers do not
+        descend into them.
     """
     from designsafe.libs.elasticsearch.docs.files import BaseESFile
+    if bulk or incremental:
+        return bulk_index_level(client, path, folders, files, systemId, username,
+                                reindex=reindex, update_pems=update_pems,
+                                chunk_size=chunk_size, refresh=refresh,
+                                incremental=incremental,
+                                skip_unchanged_folders=skip_unchanged_folders)
+    from designsafe.apps.data.models.elasticsearch import IndexedFile
+    search = IndexedFile.search()
+    search = search.filter('term', **{'basePath._exact': path})
+    search = search.filter('term', **{'system._exact': systemId})
+    search = search.source(['path', 'length', 'format'])
+    indexed = list(search.scan())
+
+    children_paths = set(obj.path for obj in folders + files)
+    record_level_usage(systemId, files, [hit for hit in indexed if hit.path in children_paths])
+
+    if update_pems:
+        permissions = level_permissions(client, systemId, path, folders + files)
     for obj in folders + files:
             obj_dict = obj.to_dict()
             obj_dict.pop('permissions')
@@ -102,20 +299,218 @@ def index_level(client, path, folders, files, systemId, username, reindex=False,
             obj_dict.pop('_links')
             obj_dict['basePath'] = os.path.dirname(obj.path)
             doc = BaseESFile(username, reindex=reindex, **obj_dict)
-            
-            saved = doc.save()
-            
             if update_pems:
-                permissions = client.files.listPermissions(systemId=systemId, filePath=obj.path)
-                for pem in permissions:
-                    pem.pop('_links')
-                doc.update(**{'permissions': permissions})
+                # An indexed doc is loaded as is, without the kwargs above.
+                doc.permissions = permissions[obj.path]
+
+            saved = doc.save(refresh=refresh)
+
+    prune_level(systemId, path, folders + files, indexed_paths=set(hit.path for hit in indexed))
+
+def _list_permissions(client, systemId, path):
+    permissions = client.files.listPermissions(systemId=systemId, filePath=path)
+    for pem in permissions:
+        pem.pop('_links', None)
+    return permissions
+
+
+@python_2_unicode_compatible
+def level_permissions(client, systemId, path, children):
+    """
+    Resolve the permissions of every folder/file in one level.
+
+    Tapis does not tell whether a child's ACL differs from its directory's,
+    so ACLs cannot be inherited and each child still costs one
+    ``listPermissions`` call, as before. What is saved is the ES side: the
+    result is written with the file metadata instead of in a separate
+    update per doc. The requests are made concurrently, and count against
+    ``settings.INDEXER_LISTING_CONCURRENCY`` like listings of the system.
+
+    :param list children: the folders and files in ``path``.
+
+    :returns: a dict mapping each child path to its list of permissions.
+    :rtype: dict
+    """
+    def _child_permissions(obj):
+        with _listing_semaphore(systemId):
+            return obj.path, _list_permissions(client, systemId, obj.path)
+
+    if not children:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(len(children), _listing_cap(systemId))) as executor:
+        return dict(executor.map(_child_permissions, children))
 
-    children_paths = [_file.path for _file in folders + files]
-    es_root = BaseESFile(username, systemId, path, reindex=reindex)
-    for doc in es_root.children():
-        if doc is not None and doc.path not in children_paths and doc.path != path:
-            doc.delete()
+
+@python_2_unicode_compatible
+def prune_level(systemId, path, children, indexed_paths=None):
+    """
+    Remove docs indexed under ``path`` that are no longer in its listing,
+    along with everything below them.
+
+    :param list children: the folders and files currently in ``path``.
+    :param set indexed_paths: the paths of the docs indexed under ``path``,
+        if the caller already fetched them.
+    """
+    from designsafe.apps.data.models.elasticsearch import IndexedFile
+    children_paths = set(_file.path for _file in children)
+    if indexed_paths is None:
+        search = IndexedFile.search()
+        search = search.filter('term', **{'basePath._exact': path})
+        search = search.filter('term', **{'system._exact': systemId})
+        search = search.source(['path'])
+        indexed_paths = set(hit.path for hit in search.scan())
+    stale_paths = indexed_paths - children_paths - set([path])
+    if stale_paths:
+        IndexedFile.delete_subtrees(systemId, stale_paths)
+
+@python_2_unicode_compatible
+def bulk_index_level(client, path, folders, files, systemId, username, reindex=False,
+                     update_pems=True, chunk_size=500, refresh=False, incremental=False,
+                     skip_unchanged_folders=False):
+    """
+    Index one iteration of walk_levels using the bulk API.
+
+    Every folder/file in the level is upserted with
+    :func:`elasticsearch.helpers.streaming_bulk` under the id derived from its
+    system and path, instead of one ``from_path`` lookup and one ``save`` per
+    object. The docs already indexed under ``path`` are fetched with a single
+    scan so that docs stored under legacy ids are dropped in the same bulk
+    request and stale subtrees can be pruned with a single delete by query.
+
+    :param int chunk_size: number of docs per bulk request.
+    :param refresh: refresh policy for the bulk requests.
+    :param bool incremental: skip entries whose ``lastModified`` and
+        ``length`` match the indexed doc. Permission-only changes are not
+        picked up in this mode.
+    :param bool skip_unchanged_folders: with ``incremental=True``, remove
+        unchanged folders from ``folders`` in place. Only use this where a
+        folder's ``lastModified`` changes whenever anything below it does.
+
+    :returns: a list of the per-item errors returned by Elasticsearch.
+    :rtype: list
+    """
+    from designsafe.apps.data.models.elasticsearch import IndexedFile
+    from elasticsearch.helpers import streaming_bulk
+
+    children_paths = set(_file.path for _file in folders + files)
+    stale_paths = set()
+    legacy_ids = []
+    fingerprints = {}
+    search = IndexedFile.search()
+    search = search.filter('term', **{'basePath._exact': path})
+    search = search.filter('term', **{'system._exact': systemId})
+    search = search.source(['path', 'lastModified', 'length', 'format'])
+    indexed = []
+    for hit in search.scan():
+        if hit.path in children_paths or hit.path == path:
+            indexed.append(hit)
+            if hit.meta.id != IndexedFile.doc_id(systemId, hit.path):
+                legacy_ids.append(hit.meta.id)
+            else:
+                fingerprints[hit.path] = _fingerprint(hit.lastModified, hit.length)
+        else:
+            stale_paths.add(hit.path)
+
+    unchanged = set()
+    if incremental:
+        unchanged = set(obj.path for obj in folders + files
+                        if obj.path in fingerprints and
+                        fingerprints[obj.path] == _fingerprint(obj.lastModified, obj.length))
+
+    if update_pems:
+        permissions = level_permissions(client, systemId, path,
+                                        [obj for obj in folders + files
+                                         if obj.path not in unchanged])
+
+    def _actions():
+        for obj in folders + files:
+            if obj.path in unchanged:
+                continue
+            obj_dict = obj.to_dict()
+            obj_dict.pop('permissions')
+            obj_dict.pop('trail')
+            obj_dict.pop('_links')
+            obj_dict['basePath'] = os.path.dirname(obj.path)
+            obj_dict['depth'] = IndexedFile.path_depth(obj.path)
+            doc = IndexedFile(**obj_dict).to_dict()
+            if update_pems:
+                # Set after to_dict(), which drops empty lists, so a cleared
+                # ACL overwrites the old permissions and readers.
+                doc['permissions'] = permissions[obj.path]
+                doc['readers'] = IndexedFile.readers_of(permissions[obj.path])
+            # A partial update keeps the fields that are not set here,
+            # e.g. permissions and readers when update_pems is off.
+            yield {'_op_type': 'update',
+                   '_index': IndexedFile._index._name,
+                   '_id': IndexedFile.doc_id(systemId, obj.path),
+                   'doc': doc,
+                   'doc_as_upsert': True}
+
+        for doc_id in legacy_ids:
+            yield {'_op_type': 'delete',
+                   '_index': IndexedFile._index._name,
+                   '_id': doc_id}
+
+    record_level_usage(systemId, files, indexed)
+
+    errors = []
+    for ok, item in streaming_bulk(IndexedFile._get_connection(),
+                                   _actions(),
+                                   chunk_size=chunk_size,
+                                   refresh=refresh,
+                                   raise_on_error=False,
+                                   raise_on_exception=False):
+        if not ok:
+            errors.append(item)
+            logger.error('Bulk indexing error in %s/%s: %s', systemId, path, item)
+
+    if stale_paths:
+        IndexedFile.delete_subtrees(systemId, stale_paths)
+
+    if skip_unchanged_folders:
+        folders[:] = [obj for obj in folders if obj.path not in unchanged]
+
+    return errors
+
+
+def _level_usage(systemId, entries):
+    """Bytes and files per usage owner of the non-folder ``entries``."""
+    from designsafe.apps.data.models.usage import StorageUsage
+    usage = {}
+    for entry in entries:
+        owner = StorageUsage.owner_of(systemId, entry.path)
+        if owner is None or entry.format == 'folder':
+            continue
+        total_bytes, file_count = usage.get(owner, (0, 0))
+        usage[owner] = (total_bytes + (entry.length or 0), file_count + 1)
+    return usage
+
+
+def record_level_usage(systemId, files, indexed):
+    """
+    Apply the storage usage change of one indexed level to the rollups.
+
+    :param list files: the files now listed in the level.
+    :param list indexed: the docs indexed for those same entries. Call
+        this before the level is written. Docs of entries that are gone are
+        accounted for by :meth:`IndexedFile.delete_subtrees`.
+    """
+    from designsafe.apps.data.models.usage import StorageUsage
+    new = _level_usage(systemId, files)
+    old = _level_usage(systemId, indexed)
+    deltas = {}
+    for owner in set(new) | set(old):
+        new_bytes, new_files = new.get(owner, (0, 0))
+        old_bytes, old_files = old.get(owner, (0, 0))
+        deltas[owner] = (new_bytes - old_bytes, new_files - old_files)
+    StorageUsage.objects.record(systemId, deltas)
+
+
+def _fingerprint(last_modified, length):
+    """Value compared by incremental indexing to detect changed entries."""
+    if isinstance(last_modified, six.string_types):
+        last_modified = dateutil.parser.parse(last_modified)
+    return (last_modified, length)
 
 @python_2_unicode_compatible
 def repair_path(name, path):
@@ -124,75 +519,198 @@ def repair_path(name, path):
     path = path.strip('/')
     return '/{path}'.format(path=path)
 
+def _repair_path_action(hit):
+    """Update action fixing the path and basePath of one doc, if needed."""
+    if hit.name is None or hit.path is None:
+        return None
+    new_path = repair_path(hit.name, hit.path)
+    if new_path == hit.path:
+        return None
+    return {
+        '_op_type': 'update',
+        '_index': hit.meta.index,
+        '_id': hit.meta.id,
+        'doc': {
+            'path': new_path,
+            'basePath': os.path.dirname(new_path)
+        }
+    }
+
+
 @python_2_unicode_compatible
-def repair_paths(limit=1000):
+def repair_paths(limit=1000, **kwargs):
+    """
+    Make every doc's path end with its name, and fix its basePath to match.
+
+    Extra kwargs are passed on to
+    :func:`designsafe.libs.elasticsearch.maintenance.run`, e.g.
+    ``resume=True`` to continue an interrupted run.
+    """
     from designsafe.apps.data.models.elasticsearch import IndexedFile
-    from elasticsearch import Elasticsearch
-    from elasticsearch.helpers import bulk
+    from designsafe.libs.elasticsearch import maintenance
 
-    files_alias = settings.ES_INDICES['files']['alias']
-    HOSTS = settings.ES_CONNECTIONS[settings.DESIGNSAFE_ENVIRONMENT]['hosts']
-    es_client = Elasticsearch(hosts=HOSTS)
-    file_search = IndexedFile.search().sort('_id').extra(size=limit)
-    res = file_search.execute()
-
-    while res.hits:
-        update_ops = []
-        for hit in res.hits:
-            
-            if hit.name is None or hit.path is None:
-                continue
+    search = IndexedFile.search().source(['name', 'path'])
+    return maintenance.run(search, _repair_path_action, name='repair_paths',
+                           batch_size=limit, **kwargs)
 
-            new_path = repair_path(hit.name, hit.path)
-            new_basepath = os.path.dirname(new_path)
-
-            update_ops.append({
-                '_op_type': 'update',
-                '_index': files_alias,
-                '_type': 'file',
-                '_id': hit.meta.id,
-                'doc': {
-                    'path': new_path,
-                    'basePath': new_basepath
-                }
-            })
-            
-            # use from_path to remove any duplicates.
-            # IndexedFile.from_path(hit.system, hit.path)
-        
-        bulk(es_client, update_ops)
-        search_after = res.hits.hits[-1]['sort']
-        file_search = IndexedFile.search().sort('_id').extra(size=limit, search_after=search_after)
-        res = file_search.execute()
+
+def _depth_action(hit):
+    """Update action setting the depth of a doc indexed before the field existed."""
+    from designsafe.apps.data.models.elasticsearch import IndexedFile
+    if hit.path is None:
+        return None
+    return {
+        '_op_type': 'update',
+        '_index': hit.meta.index,
+        '_id': hit.meta.id,
+        'doc': {'depth': IndexedFile.path_depth(hit.path)}
+    }
 
 
 @python_2_unicode_compatible
-def full_dedup(limit=1000):
+def backfill_depth(**kwargs):
+    """
+    Add ``depth`` to the files mapping and set it on every doc that does
+    not have it yet.
+
+    Extra kwargs are passed on to
+    :func:`designsafe.libs.elasticsearch.maintenance.run`.
+    """
     from designsafe.apps.data.models.elasticsearch import IndexedFile
-    from elasticsearch import Elasticsearch
-    from elasticsearch.helpers import bulk
+    from designsafe.libs.elasticsearch import maintenance
+    from designsafe.libs.elasticsearch.client import get_client
 
-    files_alias = settings.ES_INDICES['files']['alias']
-    HOSTS = settings.ES_CONNECTIONS[settings.DESIGNSAFE_ENVIRONMENT]['hosts']
-    es_client = Elasticsearch(hosts=HOSTS)
-    file_search = IndexedFile.search().sort('_id').extra(size=limit)
-    res = file_search.execute()
-
-    while res.hits:
-        for hit in res.hits:
-            
-            if hit.name is None or hit.path is None:
-                continue
+    get_client().indices.put_mapping(
+        index=settings.ES_INDICES['files']['alias'],
+        body={'properties': {'depth': IndexedFile._doc_type.mapping['depth'].to_dict()}})
+    search = IndexedFile.search().exclude('exists', field='depth').source(['path'])
+    return maintenance.run(search, _depth_action, name='backfill_depth', **kwargs)
+
+
+def _readers_action(hit):
+    """Update action setting the readers of a doc indexed before the field existed."""
+    from designsafe.apps.data.models.elasticsearch import IndexedFile
+    return {
+        '_op_type': 'update',
+        '_index': hit.meta.index,
+        '_id': hit.meta.id,
+        'doc': {'readers': IndexedFile.readers_of(hit.to_dict().get('permissions'))}
+    }
+
+
+@python_2_unicode_compatible
+def backfill_readers(**kwargs):
+    """
+    Add ``readers`` to the files mapping and set it on every doc that does
+    not have it yet, from the doc's ``permissions``.
+
+    Extra kwargs are passed on to
+    :func:`designsafe.libs.elasticsearch.maintenance.run`.
+    """
+    from designsafe.apps.data.models.elasticsearch import IndexedFile
+    from designsafe.libs.elasticsearch import maintenance
+    from designsafe.libs.elasticsearch.client import get_client
 
-            print((hit.meta.id))
-            try:
-                IndexedFile.from_path(hit.system, hit.path)
-            except Exception as e:
-                print(e)
-        
-        search_after = res.hits.hits[-1]['sort']
-        logger.debug(search_after)
-        file_search = IndexedFile.search().sort('_id').extra(size=limit, search_after=search_after)
-        res = file_search.execute()
+    get_client().indices.put_mapping(
+        index=settings.ES_INDICES['files']['alias'],
+        body={'properties': {'readers': IndexedFile._doc_type.mapping['readers'].to_dict()}})
+    search = IndexedFile.search().exclude('exists', field='readers').source(['permissions'])
+    return maintenance.run(search, _readers_action, name='backfill_readers', **kwargs)
 
 
+def _duplicate_ids(hits):
+    """Ids of the docs to delete among docs sharing a system and path.
+
+    The doc stored under its derived id is kept, or the most recently
+    modified one if no doc has that id.
+    """
+    from designsafe.apps.data.models.elasticsearch import IndexedFile
+    docs = {}
+    for hit in hits:
+        docs.setdefault((hit.system, hit.path), []).append(hit)
+    duplicate_ids = []
+    for (system, path), group in docs.items():
+        if len(group) < 2:
+            continue
+        doc_id = IndexedFile.doc_id(system, path)
+        group.sort(key=lambda hit: (hit.meta.id == doc_id, str(hit.lastModified or '')),
+                   reverse=True)
+        duplicate_ids.extend(hit.meta.id for hit in group[1:])
+    return duplicate_ids
+
+
+@python_2_unicode_compatible
+def full_dedup(page_size=1000, dry_run=False, chunk_size=500, progress=None):
+    """
+    Remove docs that share their system and path with another doc in the
+    files index.
+
+    Paths with more than one doc are found with a ``composite`` aggregation
+    on ``system._exact`` and ``path._exact``, paged with ``after_key``.
+    Composite aggregations do not support ``min_doc_count``, so buckets
+    holding a single doc are skipped here. The docs of each page's
+    duplicated paths are fetched with one search and the extras are removed
+    with bulk deletes. See :func:`_duplicate_ids` for which doc is kept.
+
+    :param int page_size: composite buckets per request.
+    :param bool dry_run: only count the docs that would be deleted.
+    :param int chunk_size: number of deletes per bulk request.
+    :param progress: called with the report after every page.
+
+    :returns: the number of paths scanned, paths with duplicates, duplicate
+        docs found and docs deleted, and the per-item bulk errors.
+    :rtype: dict
+    """
+    from designsafe.apps.data.models.elasticsearch import IndexedFile
+    from designsafe.libs.elasticsearch.client import get_client
+    from elasticsearch.helpers import streaming_bulk
+    from elasticsearch_dsl import A, Q
+
+    files_alias = settings.ES_INDICES['files']['alias']
+    report = {'paths': 0, 'duplicated_paths': 0, 'duplicates': 0, 'deleted': 0, 'errors': []}
+    sources = [{'system': {'terms': {'field': 'system._exact'}}},
+               {'path': {'terms': {'field': 'path._exact'}}}]
+    after_key = None
+    while True:
+        search = IndexedFile.search().extra(size=0)
+        composite = {'size': page_size, 'sources': sources}
+        if after_key:
+            composite['after'] = after_key
+        search.aggs.bucket('paths', A('composite', **composite))
+        res = search.execute()
+        buckets = res.aggregations.paths.buckets
+        if not buckets:
+            break
+        report['paths'] += len(buckets)
+
+        duplicated = [bucket.key for bucket in buckets if bucket.doc_count > 1]
+        report['duplicated_paths'] += len(duplicated)
+        # Keep the bool query well under the default max_clause_count.
+        for i in range(0, len(duplicated), 200):
+            query = Q('bool', minimum_should_match=1, should=[
+                Q('term', **{'system._exact': key.system}) & Q('term', **{'path._exact': key.path})
+                for key in duplicated[i:i + 200]])
+            hits = IndexedFile.search().filter(query).source(['system', 'path', 'lastModified']).scan()
+            duplicate_ids = _duplicate_ids(hits)
+            report['duplicates'] += len(duplicate_ids)
+            if dry_run or not duplicate_ids:
+                continue
+            actions = ({'_op_type': 'delete', '_index': files_alias, '_id': doc_id}
+                       for doc_id in duplicate_ids)
+            for ok, item in streaming_bulk(get_client(), actions, chunk_size=chunk_size,
+                                           raise_on_error=False, raise_on_exception=False):
+                if ok or item.get('delete', {}).get('status') == 404:
+                    report['deleted'] += 1
+                else:
+                    report['errors'].append(item)
+                    logger.error('Unable to delete duplicate document: %s', item)
+
+        logger.info('Dedup progress: %(paths)s paths, %(duplicated_paths)s duplicated, '
+                    '%(duplicates)s duplicates, %(deleted)s deleted', report)
+        if progress:
+            progress(report)
+        after_key = getattr(res.aggregations.paths, 'after_key', None)
+        if after_key is None:
+            break
+        after_key = after_key.to_dict()
+    return report
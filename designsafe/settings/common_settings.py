@@ -122,6 +122,10 @@ CACHES = {
   },
 }
 
+# Seconds that user display names ("Last, First") resolved for publication
+# listings are cached.
+USER_DISPLAY_NAME_CACHE_TTL = 60 * 60
+
 MIDDLEWARE_CLASSES = (
     'designsafe.middleware.RequestProfilingMiddleware',
     'djng.middleware.AngularUrlMiddleware',
@@ -487,6 +491,9 @@ AGAVE_JWT_USER_CLAIM_FIELD = os.environ.get('AGAVE_JWT_USER_CLAIM_FIELD')
 AGAVE_USER_STORE_ID = os.environ.get('AGAVE_USER_STORE_ID', 'TACC')
 AGAVE_USE_SANDBOX = os.environ.get('AGAVE_USE_SANDBOX', 'False').lower() == 'true'
 
+# Entries per request when paging through Tapis file listings.
+AGAVE_LISTING_PAGE_SIZE = int(os.environ.get('AGAVE_LISTING_PAGE_SIZE', 100))
+
 DS_ADMIN_USERNAME = os.environ.get('DS_ADMIN_USERNAME')
 DS_ADMIN_PASSWORD = os.environ.get('DS_ADMIN_PASSWORD')
 
@@ -516,6 +523,10 @@ PROJECT_STORAGE_SYSTEM_TEMPLATE = {
 
 PUBLISHED_SYSTEM = 'designsafe.storage.published'
 
+# Systems whose file names are suggested to every user by
+# designsafe.apps.api.datafiles.views.SuggestFilesView.
+DATAFILES_SUGGEST_PUBLIC_SYSTEMS = ['designsafe.storage.community', PUBLISHED_SYSTEM]
+
 # RECAPTCHA SETTINGS FOR LESS SPAMMO
 DJANGOCMS_FORMS_RECAPTCHA_PUBLIC_KEY = os.environ.get('DJANGOCMS_FORMS_RECAPTCHA_PUBLIC_KEY')
 DJANGOCMS_FORMS_RECAPTCHA_SECRET_KEY = os.environ.get('DJANGOCMS_FORMS_RECAPTCHA_SECRET_KEY')
@@ -568,6 +579,51 @@ PORTAL_DATA_DEPOT_SEARCH_MANAGERS = {
 
 COMMUNITY_INDEX_SCHEDULE = os.environ.get('COMMUNITY_INDEX_SCHEDULE', {})
 
+# Max number of concurrent Tapis listings per storage system when walking
+# a system with walk_levels(max_workers=N). Systems not listed use 'default'.
+INDEXER_LISTING_CONCURRENCY = {
+    'default': int(os.environ.get('INDEXER_LISTING_CONCURRENCY', 4)),
+}
+
+# Seconds an agave_indexer request waits in the queue so that duplicate
+# requests for the same path made in the meantime can be coalesced.
+INDEXER_DEBOUNCE_SECONDS = int(os.environ.get('INDEXER_DEBOUNCE_SECONDS', 5))
+
+# Storage systems where a folder's lastModified changes whenever anything
+# below it changes. Incremental crawls do not descend into unchanged folders
+# on these systems.
+INDEXER_FOLDER_FINGERPRINT_SYSTEMS = []
+
+# Mount point of the storage systems below. When set, the indexer lists
+# these systems with os.scandir instead of paginated Tapis listings.
+# e.g. '/corral-repl/tacc/NHERI'
+INDEXER_POSIX_ROOT = os.environ.get('INDEXER_POSIX_ROOT', '')
+INDEXER_POSIX_SYSTEMS = {
+    'designsafe.storage.default': 'shared',
+    'designsafe.storage.published': 'published',
+    'designsafe.storage.community': 'community',
+}
+
+# Crawl frontier (see designsafe.apps.data.tasks.crawl_frontier): number of
+# directories indexed per task, attempts before a directory is marked
+# failed, seconds after which a running directory is claimed again, the
+# longest delay in seconds before retrying a batch with failures,
+# seconds without progress after which a crawl is considered abandoned, and
+# days finished crawls are kept.
+INDEXER_CRAWL_BATCH_SIZE = int(os.environ.get('INDEXER_CRAWL_BATCH_SIZE', 50))
+INDEXER_CRAWL_MAX_ATTEMPTS = 3
+INDEXER_CRAWL_LEASE_SECONDS = 60 * 60
+INDEXER_CRAWL_RETRY_BACKOFF_MAX = 10 * 60
+INDEXER_CRAWL_ABANDON_SECONDS = 6 * 60 * 60
+INDEXER_CRAWL_RETENTION_DAYS = 7
+# Index settings while a crawl started with bulk=True writes to the files
+# index (see designsafe.libs.elasticsearch.indices.bulk_load).
+INDEXER_CRAWL_BULK_LOAD = {
+    'refresh_interval': '30s',
+    'number_of_replicas': None,
+    'translog_durability': 'async',
+}
+
 
 SUPPORTED_MS_WORD = [
     '.doc', '.dot', '.docx', '.docm', '.dotx', '.dotm', '.docb',
@@ -4,6 +4,33 @@ import os
 ES_INDEX_PREFIX = os.environ.get('ES_INDEX_PREFIX', 'designsafe-dev-{}')
 ES_AUTH = os.environ.get('ES_AUTH', 'username:password')
 
+# Seconds a process caches the concrete index name behind an alias.
+ES_ALIAS_CACHE_TTL = int(os.environ.get('ES_ALIAS_CACHE_TTL', 60))
+
+# Seconds after which designsafe.libs.elasticsearch.indices.bulk_load stops
+# waiting on holders that never left, e.g. a killed worker. Crawls hold
+# the bulk load mode until they finish, so this outlasts a full crawl.
+ES_BULK_LOAD_TIMEOUT = 3 * 24 * 60 * 60
+
+# Options of the shared clients in designsafe.libs.elasticsearch.client.
+# ``maxsize`` is the number of connections kept open to each node, and
+# ``timeout`` the default per-request timeout in seconds. Sniffing is
+# opt-in since it only helps when the nodes' publish addresses are
+# reachable from the portal.
+ES_SNIFF = os.environ.get('ES_SNIFF', 'False') == 'True'
+ES_CLIENT_OPTIONS = {
+    'maxsize': int(os.environ.get('ES_POOL_MAXSIZE', 25)),
+    'timeout': int(os.environ.get('ES_TIMEOUT', 30)),
+    'http_compress': True,
+    'max_retries': 3,
+    'retry_on_timeout': True,
+    'retry_backoff': 0.5,
+    'retry_backoff_max': 10,
+    'sniff_on_start': ES_SNIFF,
+    'sniff_on_connection_fail': ES_SNIFF,
+    'sniffer_timeout': 60 if ES_SNIFF else None,
+}
+
 ES_CONNECTIONS = {
     'default': {
         'hosts': [
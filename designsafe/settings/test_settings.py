@@ -121,6 +121,10 @@ CACHES = {
   },
 }
 
+# Seconds that user display names ("Last, First") resolved for publication
+# listings are cached.
+USER_DISPLAY_NAME_CACHE_TTL = 60 * 60
+
 MIDDLEWARE_CLASSES = (
     'designsafe.middleware.RequestProfilingMiddleware',
     'djng.middleware.AngularUrlMiddleware',
@@ -455,6 +459,9 @@ AGAVE_JWT_ISSUER = os.environ.get('AGAVE_JWT_ISSUER')
 AGAVE_JWT_HEADER = os.environ.get('AGAVE_JWT_HEADER')
 AGAVE_JWT_USER_CLAIM_FIELD = os.environ.get('AGAVE_JWT_USER_CLAIM_FIELD')
 
+# Entries per request when paging through Tapis file listings.
+AGAVE_LISTING_PAGE_SIZE = int(os.environ.get('AGAVE_LISTING_PAGE_SIZE', 100))
+
 PROJECT_STORAGE_SYSTEM_TEMPLATE = {
     'id': 'project-{}',
     'site': 'tacc.utexas.edu',
@@ -481,6 +488,10 @@ PROJECT_STORAGE_SYSTEM_TEMPLATE = {
 
 PUBLISHED_SYSTEM = 'designsafe.storage.published'
 
+# Systems whose file names are suggested to every user by
+# designsafe.apps.api.datafiles.views.SuggestFilesView.
+DATAFILES_SUGGEST_PUBLIC_SYSTEMS = ['designsafe.storage.community', PUBLISHED_SYSTEM]
+
 # RECAPTCHA SETTINGS FOR LESS SPAMMO
 DJANGOCMS_FORMS_RECAPTCHA_PUBLIC_KEY = os.environ.get('DJANGOCMS_FORMS_RECAPTCHA_PUBLIC_KEY')
 DJANGOCMS_FORMS_RECAPTCHA_SECRET_KEY = os.environ.get('DJANGOCMS_FORMS_RECAPTCHA_SECRET_KEY')
@@ -629,10 +640,57 @@ PORTAL_DATA_DEPOT_SEARCH_MANAGERS = {
 }
 
 COMMUNITY_INDEX_SCHEDULE = {}
+INDEXER_LISTING_CONCURRENCY = {'default': 4}
+INDEXER_DEBOUNCE_SECONDS = 5
+INDEXER_FOLDER_FINGERPRINT_SYSTEMS = []
+INDEXER_POSIX_ROOT = ''
+INDEXER_POSIX_SYSTEMS = {
+    'designsafe.storage.default': 'shared',
+    'designsafe.storage.published': 'published',
+    'designsafe.storage.community': 'community',
+}
+
+# Crawl frontier (see designsafe.apps.data.tasks.crawl_frontier): number of
+# directories indexed per task, attempts before a directory is marked
+# failed, seconds after which a running directory is claimed again, the
+# longest delay in seconds before retrying a batch with failures,
+# seconds without progress after which a crawl is considered abandoned, and
+# days finished crawls are kept.
+INDEXER_CRAWL_BATCH_SIZE = int(os.environ.get('INDEXER_CRAWL_BATCH_SIZE', 50))
+INDEXER_CRAWL_MAX_ATTEMPTS = 3
+INDEXER_CRAWL_LEASE_SECONDS = 60 * 60
+INDEXER_CRAWL_RETRY_BACKOFF_MAX = 10 * 60
+INDEXER_CRAWL_ABANDON_SECONDS = 6 * 60 * 60
+INDEXER_CRAWL_RETENTION_DAYS = 7
+# Index settings while a crawl started with bulk=True writes to the files
+# index (see designsafe.libs.elasticsearch.indices.bulk_load).
+INDEXER_CRAWL_BULK_LOAD = {
+    'refresh_interval': '30s',
+    'number_of_replicas': None,
+    'translog_durability': 'async',
+}
 
 ES_INDEX_PREFIX = 'designsafe-dev-{}'
 ES_AUTH = 'username:password'
 
+# Seconds a process caches the concrete index name behind an alias.
+ES_ALIAS_CACHE_TTL = 60
+
+# Seconds after which designsafe.libs.elasticsearch.indices.bulk_load stops
+# waiting on holders that never left, e.g. a killed worker. Crawls hold
+# the bulk load mode until they finish, so this outlasts a full crawl.
+ES_BULK_LOAD_TIMEOUT = 3 * 24 * 60 * 60
+
+ES_CLIENT_OPTIONS = {
+    'maxsize': 25,
+    'timeout': 30,
+    'http_compress': True,
+    'max_retries': 3,
+    'retry_on_timeout': True,
+    'retry_backoff': 0.5,
+    'retry_backoff_max': 10,
+}
+
 ES_CONNECTIONS = {
     'default': {
         'hosts': [